@@ -9,6 +9,7 @@ import matplotlib.pyplot as plt
 import mplhep as hep
 import ROOT
 from root_numpy import hist2array
+from haddHDF5 import hadd
 from binning import ptBins, etaBins, isoBins, chargeBins, metBins, mTBins, yBins, qtBins, qtBins_syst
 # from binning import mTBinsFull as mTBins
 plt.style.use([hep.style.ROOT])
@@ -23,15 +24,17 @@ TopFiles = ["ST_t-channel_muDecays.hdf5", "ST_t-channel_tauDecays.hdf5","ST_s-ch
 DibosonFiles = ["WW.hdf5","WZ.hdf5"]
 dataFiles = ["data.hdf5"]
 
+# the sums are written to <folder><fname>_hadd.hdf5, the histograms split among worker
+# processes, and each one is read back once with its shape
 def haddFiles(fileList, fname, histonames, shapes, folder, era):
-    dict={}
-    for i,name in enumerate(histonames):
-        tmp = np.zeros(shapes[i],dtype='float64')
-        print(name, shapes[i])
-        for file in fileList:
-            ftmp = h5py.File(folder+file, mode='r+')
-            tmp += ftmp[name][:]
-        dict[name]=tmp
+    print(fname, fileList)
+    outputFile = '{}{}_hadd.hdf5'.format(folder, fname)
+    hadd(fileList, histonames, folder, outputFile=outputFile, nproc=min(len(histonames), os.cpu_count()))
+    dict = {}
+    with h5py.File(outputFile, mode='r') as fin:
+        for i,name in enumerate(histonames):
+            print(name, shapes[i])
+            dict[name] = fin[name][...].reshape(shapes[i])
     return dict
 
 threshold_y = np.digitize(2.4,yBins)-1
@@ -0,0 +1,43 @@
+import re
+import numpy as np
+import scipy.linalg
+
+# impacts of groups of fit parameters on the POIs from the postfit covariance:
+# for a POI p and a group g, impact = sqrt(v^T C_g^-1 v), with v = cov[g, p] the
+# covariance between the POI and the parameters of the group and C_g = cov[g, g].
+# Every group is factorised once (Cholesky) and solved for all the POIs at once,
+# no inverse is ever built, so that groups of thousands of nuisances are cheap.
+
+def axisLabels(h):
+    # bin labels of the x axis of a ROOT histogram (the parameter names of a combinetf covariance)
+    return [h.GetXaxis().GetBinLabel(i) for i in range(1, h.GetNbinsX()+1)]
+
+def groupIndices(labels, groups):
+    """groups: name -> regular expression on the labels; returns name -> indices (in label order)"""
+    indices = {}
+    for name, pattern in groups.items():
+        regex = re.compile(pattern)
+        idx = np.array([i for i, label in enumerate(labels) if regex.search(label)], dtype='int64')
+        if len(idx) == 0:
+            raise ValueError("no parameter matches group {} ({})".format(name, pattern))
+        indices[name] = idx
+    return indices
+
+def groupImpacts(cov, pois, groups):
+    """impacts[poi, group] for the POI indices pois and the groups name -> indices (in the order of groups)"""
+    pois = np.asarray(pois)
+    impacts = np.zeros((len(pois), len(groups)), dtype=cov.dtype)
+    for igroup, idx in enumerate(groups.values()):
+        cgroup = cov[np.ix_(idx, idx)]
+        v = cov[np.ix_(idx, pois)]
+        # v^T C_g^-1 v for every POI, as the column norms of L^-1 v with C_g = L L^T
+        w = scipy.linalg.solve_triangular(scipy.linalg.cholesky(cgroup, lower=True), v, lower=True, check_finite=False)
+        impacts[:, igroup] = np.sqrt(np.sum(np.square(w), axis=0))
+    return impacts
+
+def impactReport(impacts, rowNames, colNames, fmt='{:.4g}'):
+    """table of impacts[row, col] as text, one row per line"""
+    impacts = np.atleast_2d(impacts)
+    cells = [[''] + list(colNames)] + [[row] + [fmt.format(x) for x in values] for row, values in zip(rowNames, impacts)]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(cells[0]))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in cells)
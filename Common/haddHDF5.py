@@ -0,0 +1,104 @@
+import os
+os.environ["HDF5_USE_FILE_LOCKING"] = "FALSE"
+import h5py
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# sum of the same histograms over several hdf5 files: every file is opened once
+# and the datasets are streamed in blocks along the first axis, aligned to the
+# hdf5 chunks, into a preallocated output (numpy arrays or an hdf5 file)
+
+def blockRows(dset, blockBytes):
+    rowBytes = max(1, int(np.prod(dset.shape[1:], dtype=np.int64)) * dset.dtype.itemsize)
+    rows = max(1, blockBytes // rowBytes)
+    if dset.chunks is not None and rows > dset.chunks[0]:
+        rows -= rows % dset.chunks[0]
+    return min(rows, max(1, dset.shape[0]))
+
+def blocks(dset, blockBytes):
+    if dset.ndim == 0:
+        yield (), ()
+        return
+    rows = blockRows(dset, blockBytes)
+    for start in range(0, dset.shape[0], rows):
+        stop = min(start+rows, dset.shape[0])
+        yield np.s_[start:stop], np.s_[0:stop-start]
+
+def accumulate(fins, name, blockBytes, out):
+    # out[sel] += sum over files of fin[name][sel], through a single scratch buffer
+    ref = fins[0][name]
+    buf = np.empty((blockRows(ref, blockBytes),)+ref.shape[1:] if ref.ndim else (), dtype='float64')
+    for sel, bufsel in blocks(ref, blockBytes):
+        acc = np.zeros(buf[bufsel].shape, dtype='float64')
+        for fin in fins:
+            dset = fin[name]
+            if dset.shape != ref.shape:
+                raise ValueError("{}: shape {} in {} differs from {} in {}".format(name, dset.shape, fin.filename, ref.shape, fins[0].filename))
+            dset.read_direct(buf, sel, bufsel)
+            acc += buf[bufsel]
+        if isinstance(out, np.ndarray):
+            out[sel] += acc
+        else:
+            out[sel] = acc
+
+def haddToMemory(fileList, histonames, blockBytes):
+    fins = [h5py.File(f, mode='r') for f in fileList]
+    out = {name: np.zeros(fins[0][name].shape, dtype='float64') for name in histonames}
+    for name in histonames:
+        accumulate(fins, name, blockBytes, out[name])
+    for fin in fins:
+        fin.close()
+    return out
+
+def haddToFile(fileList, histonames, outputFile, blockBytes):
+    fins = [h5py.File(f, mode='r') for f in fileList]
+    fout = h5py.File(outputFile, mode='w')
+    for name in histonames:
+        ref = fins[0][name]
+        dset = fout.create_dataset(name, shape=ref.shape, dtype='float64', chunks=ref.chunks)
+        accumulate(fins, name, blockBytes, dset)
+    fout.close()
+    for fin in fins:
+        fin.close()
+
+def balance(fileList, histonames, nproc):
+    # largest first onto the least loaded worker
+    with h5py.File(fileList[0], mode='r') as f:
+        sizes = {name: f[name].size for name in histonames}
+    groups = [[] for i in range(nproc)]
+    loads = [0]*nproc
+    for name in sorted(histonames, key=lambda n: -sizes[n]):
+        i = int(np.argmin(loads))
+        groups[i].append(name)
+        loads[i] += sizes[name]
+    return [g for g in groups if len(g) > 0]
+
+def hadd(fileList, histonames, folder='', outputFile=None, nproc=1, blockBytes=1<<27):
+    """Sum histonames over fileList (relative to folder).
+
+    Returns a dict name -> numpy array, or, if outputFile is given, writes the sums
+    there and returns None. In file mode, with nproc > 1, the histograms are split
+    among worker processes, each writing its own part file, linked into outputFile
+    so that the merged data is never copied a second time. The memory mode always
+    runs in the calling process: arrays summed by workers would be pickled back,
+    holding every histogram twice.
+    """
+    fileList = [folder+f for f in fileList]
+    if outputFile is None:
+        return haddToMemory(fileList, histonames, blockBytes)
+    if nproc <= 1 or len(histonames) <= 1:
+        return haddToFile(fileList, histonames, outputFile, blockBytes)
+
+    groups = balance(fileList, histonames, nproc)
+    # fork: the calling scripts run at import time, so they cannot be spawned
+    ctx = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=len(groups), mp_context=ctx) as pool:
+        parts = ['{}.part{}'.format(outputFile, i) for i in range(len(groups))]
+        list(pool.map(haddToFile, [fileList]*len(groups), groups, parts, [blockBytes]*len(groups)))
+
+    fout = h5py.File(outputFile, mode='w')
+    for part, group in zip(parts, groups):
+        for name in group:
+            fout[name] = h5py.ExternalLink(os.path.basename(part), name)
+    fout.close()
@@ -10,6 +10,8 @@ import matplotlib.pyplot as plt
 import mplhep as hep
 sys.path.append('data/')
 from binning import yBins, qtBins, ptBins, etaBins, mTBins, isoBins, chargeBins
+from root_numpy import hist2array
+from groupImpacts import axisLabels, groupIndices, groupImpacts, impactReport
 import argparse
 
 # matplotlib stuff
@@ -43,37 +45,32 @@ for hel in helXsecs:
             processes.append(proc)
 
 hcov = f.Get('covariance_matrix_channelmu')
-cov = np.asarray(hcov).reshape(289+2,289+2)[1:-1,1:-1]
-for i in range(1,hcov.GetNbinsX()+1):
-    print(i, hcov.GetXaxis().GetBinLabel(i))
-
-#289-1 is mass index
+cov = hist2array(hcov)
+labels = axisLabels(hcov)
+for i,label in enumerate(labels):
+    print(i+1, label)
 
 hcov_noBBB = f_noBBB.Get('covariance_matrix_channelmu')
-cov_noBBB = np.asarray(hcov_noBBB).reshape(289+2,289+2)[1:-1,1:-1]
-
-
-impacts = []
+cov_noBBB = hist2array(hcov_noBBB)
+
+#impact is generalization of per-nuisance impacts above v^T C^-1 v
+#where v is the matrix of poi x nuisance correlations within the group
+#and C is is the subset of the covariance matrix corresponding to the nuisances in the group
+#groups of POI: one per helicity, and all of them for the stat term
+imass = labels.index('mass')
+groups = groupIndices(labels, {hel: '^helXsecs{}_'.format(hel.split()[-1]) for hel in helXsecs})
+groups['stat'] = np.concatenate(list(groups.values()))
+poiImpacts = groupImpacts(cov, [imass], groups)[0]*50. # 50 MeV is input variation
+
+impacts = list(poiImpacts[:len(helXsecs)])
+stat = poiImpacts[-1]
 impact_names = []
-# retrieve impacts per group of POI
-for i,hel in enumerate(helXsecs):
-    #impact is generalization of per-nuisance impacts above v^T C^-1 v
-    #where v is the matrix of poi x nuisance correlations within the group
-    #and C is is the subset of the covariance matrix corresponding to the nuisances in the group
-    vcovreduced = cov[-1,i*nBins:(i+1)*nBins]
-    groupmcov = np.linalg.inv(cov[i*nBins:(i+1)*nBins,i*nBins:(i+1)*nBins])
-    vimpact = np.sqrt(np.matmul(np.matmul(vcovreduced.T,groupmcov),vcovreduced))
-    impacts.append(vimpact*50.) # 50 MeV is input variation
-
-vcovreduced = cov[289-1,0:6*nBins]
-groupmcov = np.linalg.inv(cov[0:6*nBins,0:6*nBins])
-stat = np.sqrt(np.matmul(np.matmul(vcovreduced.T,groupmcov),vcovreduced))*50
 
 # get stat impact
 impact_names.extend(helXsecs)
 # retrieve impacts per group of nuisance
 hgroupimp = f.Get('nuisance_group_impact_nois')
-groupimp = np.asarray(hgroupimp).reshape(1+2,3+2)[1:-1,1:-1]
+groupimp = hist2array(hgroupimp)
 for i in range(groupimp.shape[1]):
     if 'mass' in hgroupimp.GetYaxis().GetBinLabel(i+1): 
         idx=i
@@ -90,6 +87,11 @@ print(np.sqrt(np.sum(np.dot(impacts,impacts))), 'total error summing impacts in
 impacts.append(groupimp[0,idx]*50.) # 50 MeV is input variation
 impact_names.append('total')
 
+report = impactReport(np.array(impacts)[:,np.newaxis], impact_names, ['impact on mass (MeV)'], fmt='{:.2f}')
+print(report)
+with open('impactsOnMassZ_{}.txt'.format("asimov" if asimov else "data"), 'w') as freport:
+    freport.write(report+'\n')
+
 plt.rcdefaults()
 fig, ax = plt.subplots(figsize=(5, 5))
 hep.cms.text('work in progress', loc=0, ax=ax)
@@ -11,6 +11,7 @@ import mplhep as hep
 sys.path.append('data/')
 from binning import yBins, qtBins, ptBins, etaBins, mTBins, isoBins, chargeBins
 from root_numpy import hist2array
+from groupImpacts import axisLabels, groupIndices, groupImpacts, impactReport
 import argparse
 
 # matplotlib stuff
@@ -85,20 +86,16 @@ hcov = f.Get('covariance_matrix_channelhelpois')
 cov = hist2array(hcov)[:,:]
 print(cov.shape)
 
-impacts = []
 # retrieve impacts per group of POI
-
-for i in range(1,6):
-    for j in range(nBins):
-        #impact is generalization of per-nuisance impacts above v^T C^-1 v
-        #where v is the matrix of poi x nuisance correlations within the group
-        #and C is is the subset of the covariance matrix corresponding to the nuisances in the group
-        vcovreduced = cov[j,i*nBins:(i+1)*nBins]
-        groupmcov = np.linalg.inv(cov[i*nBins:(i+1)*nBins,i*nBins:(i+1)*nBins])
-        # print(hcov.GetXaxis().GetBinLabel(i*nBins+1),hcov.GetXaxis().GetBinLabel((i+1)*nBins+1))
-        vimpact = np.sqrt(np.matmul(np.matmul(vcovreduced.T,groupmcov),vcovreduced))
-        impacts.append(vimpact)
-impacts =np.stack(impacts).reshape(nBins,5)/hcoeff.ravel()[:,np.newaxis]
+#impact is generalization of per-nuisance impacts above v^T C^-1 v
+#where v is the matrix of poi x nuisance correlations within the group
+#and C is is the subset of the covariance matrix corresponding to the nuisances in the group
+#the POIs are the unpolarized cross sections, the groups the other coefficients
+labels = axisLabels(hcov)
+groups = groupIndices(labels, {c: '(^|_){}(_|$)'.format(c) for c in coefficients})
+impacts = groupImpacts(cov, groups['unpolarizedxsec'], {c: groups[c] for c in coefficients[1:]})
+print(impactReport(impacts, [labels[i] for i in groups['unpolarizedxsec']], coefficients[1:]))
+impacts = impacts/hcoeff.ravel()[:,np.newaxis]
 print(impacts.shape)
 # impacts per POI
 plt.rcdefaults()
@@ -4,25 +4,45 @@ import sys
 import h5py
 import math
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 # import jax
 # import jax.numpy as jnp
 import matplotlib.pyplot as plt
 import mplhep as hep
+from plotPipeline import arrayStore, figureJob, render
 sys.path.append('data/')
 from binning import yBins, qtBins, ptBins, etaBins, mTBins, isoBins, chargeBins
 from root_numpy import hist2array
 import argparse
 
+def plotCorr(outputs, cov, first, last, text=None, ticks=None):
+    vcovreduced = cov[first:last,first:last]
+    bins=np.linspace(0,last-first+1,last-first+1)
+    fig, ax1 = plt.subplots()
+    if text is not None:
+        plt. text(0.1, 0.9,"{}".format(text), ha='center', va='center', transform=ax1.transAxes, color="k", weight="bold")
+    hep.hist2dplot(vcovreduced,bins,bins, cmap ='jet', vmin =-1, vmax=1)
+    if ticks is not None:
+        plt.xticks(np.arange(min(bins), max(bins)+1, ticks))
+        plt.yticks(np.arange(min(bins), max(bins)+1, ticks))
+        # Turn off tick labels
+        ax1.set_yticklabels([])
+        ax1.set_xticklabels([])
+    plt.tight_layout()
+    for output in outputs: plt.savefig(output)
+
 # matplotlib stuff
 plt.style.use([hep.style.CMS])
 
 parser = argparse.ArgumentParser('')
 parser.add_argument('-asimov', '--asimov', default=False, action='store_true', help='plot asimov result')
+parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes drawing the figures (default: all cores)')
 
 args = parser.parse_args()
 asimov = args.asimov
 # file with fit results
-f = ROOT.TFile.Open('../Fit/FitRes/fit_WPlus_{}.root'.format('asimov' if asimov else 'data'))
+fitFile = '../Fit/FitRes/fit_WPlus_{}.root'.format('asimov' if asimov else 'data')
 
 threshold_y = np.digitize(2.4,yBins)-1
 threshold_qt = np.digitize(60.,qtBins)-1
@@ -32,26 +52,23 @@ yBinsC = 0.5*(yBins_red[1:]+yBins_red[:-1])
 qtBinsC = 0.5*(qtBins_red[1:]+qtBins_red[:-1])
 
 nBins=len(yBinsC)*len(qtBinsC)
-bins=np.linspace(0,nBins+1,nBins+1)
 yticks = np.round(qtBins[:threshold_qt+1],0)
 
 # helXsecs = ['helicity L', 'helicity I', 'helicity T', 'helicity A', 'helicity P','helicity UL']
 helXsecs = ['unpolarised cross section','A0','A1','A2','A3','A4']
 
-hcov = f.Get('correlation_matrix_channelhelpois')
-cov = hist2array(hcov)[:,:]
+def extract(names):
+    f = ROOT.TFile.Open(fitFile)
+    hcov = f.Get('correlation_matrix_channelhelpois')
+    return {'corr': hist2array(hcov)[:,:]}
+
+store = arrayStore('.store_cov_{}'.format('asimov' if asimov else 'data'), fitFile)
+store.fill(['corr'], extract)
 
 # retrieve impacts per group of POI
+jobs = []
 for i,hel in enumerate(helXsecs):
-    vcovreduced = cov[i*nBins:(i+1)*nBins,i*nBins:(i+1)*nBins]
-
-    fig, ax1 = plt.subplots()
-    plt. text(0.1, 0.9,"{}".format(hel), ha='center', va='center', transform=ax1.transAxes, color="k", weight="bold")
-    hep.hist2dplot(vcovreduced,bins,bins, cmap ='jet', vmin =-1, vmax=1)
-    plt.tight_layout()
-    plt.savefig("cov{}.png".format(hel))
-    plt.savefig("cov{}.pdf".format(hel))
-    plt.clf()
+    jobs.append(figureJob(plotCorr, ["cov{}.png".format(hel), "cov{}.pdf".format(hel)], {'cov': 'corr'}, first=i*nBins, last=(i+1)*nBins, text=hel))
 
 # hcov = f.Get('correlation_matrix_channelhelmetapois')
 # cov = hist2array(hcov)[:,:]
@@ -76,17 +93,6 @@ for i,hel in enumerate(helXsecs):
 # plt.savefig("covqt.pdf")
 # plt.clf()
 
-vcovreduced = cov[0:48*6,0:48*6]
-bins=np.linspace(0,48*6+1,48*6+1)
-
-fig, ax1 = plt.subplots()
-hep.hist2dplot(vcovreduced,bins,bins, cmap ='jet', vmin =-1, vmax=1)
-plt.xticks(np.arange(min(bins), max(bins)+1, 48))
-plt.yticks(np.arange(min(bins), max(bins)+1, 48))
-# Turn off tick labels
-ax1.set_yticklabels([])
-ax1.set_xticklabels([])
-plt.tight_layout()
-plt.savefig("covtot.png")
-plt.savefig("covtot.pdf")
-plt.clf()
\ No newline at end of file
+jobs.append(figureJob(plotCorr, ["covtot.png", "covtot.pdf"], {'cov': 'corr'}, first=0, last=48*6, ticks=48))
+
+render(jobs, store, processes=args.jobs)
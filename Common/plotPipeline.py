@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import inspect
+import multiprocessing
+import numpy as np
+
+# figures rendered as independent jobs in a process pool: the arrays they need are
+# extracted once into an arrayStore (one .npy per array, opened memory-mapped by the
+# workers), and every job is tagged with a hash of its inputs, its arguments and the
+# source of its plotting function, so that figures whose inputs did not change since
+# the last run are not drawn again
+
+def fileStamp(fileName):
+    st = os.stat(fileName)
+    return [st.st_size, st.st_mtime_ns]
+
+class arrayStore:
+    """Arrays derived from `source`, as storeDir/<name>.npy; the store is emptied
+    when the source file changes."""
+    def __init__(self, storeDir, source):
+        self.storeDir = storeDir
+        os.makedirs(storeDir, exist_ok=True)
+        self.manifestFile = os.path.join(storeDir, 'manifest.json')
+        stamp = fileStamp(source)
+        self.manifest = {'source': os.path.abspath(source), 'stamp': stamp, 'digests': {}}
+        if os.path.exists(self.manifestFile):
+            with open(self.manifestFile) as f:
+                manifest = json.load(f)
+            if manifest['source'] == self.manifest['source'] and manifest['stamp'] == stamp:
+                self.manifest = manifest
+
+    def path(self, name):
+        return os.path.join(self.storeDir, name+'.npy')
+
+    def __contains__(self, name):
+        return name in self.manifest['digests'] and os.path.exists(self.path(name))
+
+    def __setitem__(self, name, array):
+        array = np.ascontiguousarray(array)
+        np.save(self.path(name), array)
+        self.manifest['digests'][name] = hashlib.sha1(array.tobytes()+str((array.dtype, array.shape)).encode()).hexdigest()
+        with open(self.manifestFile, 'w') as f:
+            json.dump(self.manifest, f)
+
+    def __getitem__(self, name):
+        return np.load(self.path(name), mmap_mode='r')
+
+    def digest(self, name):
+        return self.manifest['digests'][name]
+
+    def fill(self, names, extract):
+        """store extract(missing) -> {name: array} for the names not in the store yet"""
+        missing = [name for name in names if not name in self]
+        if len(missing) > 0:
+            for name, array in extract(missing).items():
+                self[name] = array
+        return missing
+
+def figureJob(fn, outputs, inputs={}, **kwargs):
+    """fn(outputs, **arrays, **kwargs) draws one figure and saves it to all the outputs;
+    inputs maps the argument names of fn to array names in the store"""
+    return {'fn': fn, 'outputs': list(outputs), 'inputs': dict(inputs), 'kwargs': kwargs}
+
+def jobHash(job, store):
+    h = hashlib.sha1()
+    h.update('{}.{}'.format(job['fn'].__module__, job['fn'].__name__).encode())
+    try:
+        h.update(inspect.getsource(job['fn']).encode())
+    except (OSError, TypeError):
+        pass
+    h.update(repr(sorted(job['kwargs'].items())).encode())
+    for arg, name in sorted(job['inputs'].items()):
+        h.update('{}={}'.format(arg, store.digest(name)).encode())
+    return h.hexdigest()
+
+def initWorker():
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+
+def runJob(job, storeDir):
+    import matplotlib.pyplot as plt
+    for output in job['outputs']:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    arrays = {arg: np.load(os.path.join(storeDir, name+'.npy'), mmap_mode='r') for arg, name in job['inputs'].items()}
+    job['fn'](job['outputs'], **arrays, **job['kwargs'])
+    plt.close('all')
+    return job['outputs']
+
+def render(jobs, store, hashFile='.plotHashes.json', processes=None, force=False):
+    """Draw the jobs whose outputs are missing or out of date, in parallel."""
+    hashes = {}
+    if os.path.exists(hashFile):
+        with open(hashFile) as f:
+            hashes = json.load(f)
+    todo = []
+    for job in jobs:
+        digest = jobHash(job, store)
+        if force or not all(hashes.get(output) == digest and os.path.exists(output) for output in job['outputs']):
+            todo.append((job, digest))
+    print('rendering {} of {} figures'.format(len(todo), len(jobs)))
+    if len(todo) > 0:
+        # fork: the figure functions and the matplotlib style of the caller are inherited
+        with multiprocessing.get_context('fork').Pool(processes=processes, initializer=initWorker) as pool:
+            results = [pool.apply_async(runJob, (job, store.storeDir)) for job, digest in todo]
+            for (job, digest), result in zip(todo, results):
+                for output in result.get():
+                    hashes[output] = digest
+                with open(hashFile, 'w') as f:
+                    json.dump(hashes, f, indent=1)
+    return len(todo)
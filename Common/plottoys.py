@@ -66,25 +66,24 @@ for k,c in enumerate(coefficients):
             canv = ROOT.TCanvas('pull_y_{i}_qt_{j}_{c}'.format(c=c, j=j, i=i))
             hists['y_{i}_qt_{j}_{c}'.format(c=c, j=j, i=i)]=hpull
             canvs['y_{i}_qt_{j}_{c}'.format(c=c, j=j, i=i)]=canv
-for ifile in range(40):
-    fIntoy = ROOT.TFile.Open('../Fit/FitRes/fit_WPlus_data_{}.root'.format(ifile))
-    fitresultstoy = fIntoy.Get('fitresults')
-    for ev in fitresultstoy:
-        for key, hist in hists.items():
-            if 'mass' in key: 
-                par=(eval('ev.{}'.format(key)))
-            else:
-                i = int(key.split('_')[1])
-                j = int(key.split('_')[3])
-                coeff = coefficients.index(key.split('_')[4])
-                print(key, i,j,coeff)
-                if not 'unpol' in key:
-                    par=(eval('ev.{}'.format(key)))-h[i,j,coeff]
-                else:
-                    par=eval('ev.{}'.format(key))-h[i,j,-1]
-                    print(par/par_err)
-            par_err=(eval('ev.{}_err'.format(key)))
-            hist.Fill(par/par_err)
+# fit results of all the toys, collected by Fit/runToys.py
+ftoys = h5py.File('../Fit/FitRes/toys_WPlus.hdf5', mode='r')
+fitresultstoy = ftoys['fitresults']
+for key, hist in hists.items():
+    if 'mass' in key: 
+        par=fitresultstoy[key][:]
+    else:
+        i = int(key.split('_')[1])
+        j = int(key.split('_')[3])
+        coeff = coefficients.index(key.split('_')[4])
+        print(key, i,j,coeff)
+        if not 'unpol' in key:
+            par=fitresultstoy[key][:]-h[i,j,coeff]
+        else:
+            par=fitresultstoy[key][:]-h[i,j,-1]
+    par_err=fitresultstoy['{}_err'.format(key)][:]
+    for pull in par/par_err:
+        hist.Fill(pull)
 
 ROOT.gStyle.SetOptFit(1)
 for i,c in canvs.items():
@@ -5,6 +5,8 @@ import sys
 import h5py
 import math
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 from scipy import stats
 # import jax
 # import jax.numpy as jnp
@@ -13,20 +15,21 @@ from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle
 import matplotlib.patches as mpatches
 import mplhep as hep
+from plotPipeline import arrayStore, figureJob, render
 sys.path.append('data/')
 from binning import yBins, qtBins, ptBins, etaBins, mTBins, isoBins, chargeBins, yBins_val, qtBins_val
 import argparse
 
 parser = argparse.ArgumentParser('')
 parser.add_argument('-asimov', '--asimov', default=False, action='store_true', help='plot asimov result')
+parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes drawing the figures (default: all cores)')
 
 args = parser.parse_args()
 asimov = args.asimov
 
 label_data = "asimov dataset" if asimov else "data"
 # file with fit results
-fIn = ROOT.TFile.Open('../Fit/FitRes/fit_Z_asimov_.root')
-fitresults = fIn.Get('fitresults')
+fitFile = '../Fit/FitRes/fit_Z_asimov_.root'
 
 
 # matplotlib stuff
@@ -43,40 +46,76 @@ qtBinsC = 0.5*(qtBins[1:]+qtBins[:-1])
 yBinsS = yBins[1:]-yBins[:-1]
 qtBinsS = qtBins[1:]-qtBins[:-1]
 
-
-for k,c in enumerate(coefficients):
-    hcoeff = np.zeros([len(yBinsC),len(qtBinsC)])
-    hcoeff_gen = np.zeros([len(yBinsC),len(qtBinsC)])
-    hcoeff_err = np.zeros([len(yBinsC),len(qtBinsC)])
-    hcoeff_hel = np.zeros([len(yBinsC),len(qtBinsC)])
-    hcoeff_hel_gen = np.zeros([len(yBinsC),len(qtBinsC)])
-    hcoeff_hel_err = np.zeros([len(yBinsC),len(qtBinsC)])
-    bins=np.append(np.tile(qtBins[:-1],len(yBinsC)),60.)
-    x=np.array(range(len(bins)))
-    binsC = 0.5*(x[1:]+x[:-1])
-    print('analysing', c, helicities[k])
-    for ev in fitresults: #dummy because there's one event only
-        for i in range(len(yBinsC)):
+def extract(names):
+    # all the POIs of the fitresults tree, read in one pass
+    fIn = ROOT.TFile.Open(fitFile)
+    fitresults = fIn.Get('fitresults')
+    arrays = {}
+    for k,c in enumerate(coefficients):
+        print('analysing', c, helicities[k])
+        for name in ['coeff', 'coeff_gen', 'coeff_err', 'coeff_hel', 'coeff_hel_gen', 'coeff_hel_err']:
+            arrays[name+'_'+c] = np.zeros([len(yBinsC),len(qtBinsC)])
+        for name in ['coeff_qt', 'coeff_gen_qt', 'coeff_err_qt']:
+            arrays[name+'_'+c] = np.zeros([len(qtBinsC)])
+        for name in ['coeff_y', 'coeff_gen_y', 'coeff_err_y']:
+            arrays[name+'_'+c] = np.zeros([len(yBinsC)])
+        for ev in fitresults: #dummy because there's one event only
+            for i in range(len(yBinsC)):
+                for j in range(len(qtBinsC)):
+                    try:
+                        coeff = eval('ev.y_{i}_qt_{j}_{c}'.format(c=c, j=j, i=i))
+                        coeff_gen = eval('ev.y_{i}_qt_{j}_{c}_gen'.format(c=c, j=j, i=i))
+                        coeff_err = eval('ev.y_{i}_qt_{j}_{c}_err'.format(c=c, j=j, i=i))
+                        coeff_hel = eval('ev.helXsecs{c}_y_{i}_qt_{j}_pmaskedexp'.format(c=helicities[k], j=j, i=i))
+                        coeff_hel_err = eval('ev.helXsecs{c}_y_{i}_qt_{j}_pmaskedexp_err'.format(c=helicities[k], j=j, i=i))
+                        coeff_hel_gen = eval('ev.helXsecs{c}_y_{i}_qt_{j}_pmaskedexp_gen'.format(c=helicities[k], j=j, i=i))
+                        if 'unpolarizedxsec' in c:
+                            coeff = coeff/(3./16./math.pi)/16.8/yBinsS[i]/qtBinsS[j]
+                            coeff_gen = coeff_gen/(3./16./math.pi)/16.8/yBinsS[i]/qtBinsS[j]
+                            coeff_err = coeff_err/(3./16./math.pi)/16.8/yBinsS[i]/qtBinsS[j]
+                        arrays['coeff_'+c][i,j]=coeff
+                        arrays['coeff_gen_'+c][i,j]=coeff_gen
+                        arrays['coeff_err_'+c][i,j]=coeff_err
+                        arrays['coeff_hel_'+c][i,j]=coeff_hel
+                        arrays['coeff_hel_gen_'+c][i,j]=coeff_hel_gen
+                        arrays['coeff_hel_err_'+c][i,j]=coeff_hel_err
+                    except AttributeError:
+                        pass
+            # integrated coefficients
             for j in range(len(qtBinsC)):
                 try:
-                    coeff = eval('ev.y_{i}_qt_{j}_{c}'.format(c=c, j=j, i=i))
-                    coeff_gen = eval('ev.y_{i}_qt_{j}_{c}_gen'.format(c=c, j=j, i=i))
-                    coeff_err = eval('ev.y_{i}_qt_{j}_{c}_err'.format(c=c, j=j, i=i))
-                    coeff_hel = eval('ev.helXsecs{c}_y_{i}_qt_{j}_pmaskedexp'.format(c=helicities[k], j=j, i=i))
-                    coeff_hel_err = eval('ev.helXsecs{c}_y_{i}_qt_{j}_pmaskedexp_err'.format(c=helicities[k], j=j, i=i))
-                    coeff_hel_gen = eval('ev.helXsecs{c}_y_{i}_qt_{j}_pmaskedexp_gen'.format(c=helicities[k], j=j, i=i))
-                    if 'unpolarizedxsec' in c:
-                        coeff = coeff/(3./16./math.pi)/16.8/yBinsS[i]/qtBinsS[j]
-                        coeff_gen = coeff_gen/(3./16./math.pi)/16.8/yBinsS[i]/qtBinsS[j]
-                        coeff_err = coeff_err/(3./16./math.pi)/16.8/yBinsS[i]/qtBinsS[j]
-                    hcoeff[i,j]=coeff
-                    hcoeff_gen[i,j]=coeff_gen
-                    hcoeff_err[i,j]=coeff_err
-                    hcoeff_hel[i,j]=coeff_hel
-                    hcoeff_hel_gen[i,j]=coeff_hel_gen
-                    hcoeff_hel_err[i,j]=coeff_hel_err
+                    coeff = eval('ev.qt_{j}_helmeta_{c}'.format(c=c, j=j))
+                    coeff_gen = eval('ev.qt_{j}_helmeta_{c}_gen'.format(c=c, j=j))
+                    coeff_err = eval('ev.qt_{j}_helmeta_{c}_err'.format(c=c, j=j))
+                    if 'unpol' in c:
+                        coeff = coeff/(3./16./math.pi)/16.8/qtBinsS[j]
+                        coeff_gen = coeff_gen/(3./16./math.pi)/16.8/qtBinsS[j]
+                        coeff_err = coeff_err/(3./16./math.pi)/16.8/qtBinsS[j]
+                    arrays['coeff_qt_'+c][j]=coeff
+                    arrays['coeff_gen_qt_'+c][j]=coeff_gen
+                    arrays['coeff_err_qt_'+c][j]=coeff_err
+                except AttributeError:
+                    pass
+            for i in range(len(yBinsC)):
+                try:
+                    coeff_y = eval('ev.y_{i}_helmeta_{c}'.format(c=c, i=i))
+                    coeff_gen_y = eval('ev.y_{i}_helmeta_{c}_gen'.format(c=c, i=i))
+                    coeff_err_y = eval('ev.y_{i}_helmeta_{c}_err'.format(c=c, i=i))
+                    if 'unpol' in c:
+                        coeff_y = coeff_y/(3./16./math.pi)/16.8/yBinsS[i]
+                        coeff_gen_y = coeff_gen_y/(3./16./math.pi)/16.8/yBinsS[i]
+                        coeff_err_y = coeff_err_y/(3./16./math.pi)/16.8/yBinsS[i]
+                    arrays['coeff_y_'+c][i]=coeff_y
+                    arrays['coeff_gen_y_'+c][i]=coeff_gen_y
+                    arrays['coeff_err_y_'+c][i]=coeff_err_y
                 except AttributeError:
                     pass
+    fIn.Close()
+    return {name: arrays[name] for name in names}
+
+def plotCoeff(outputs, hcoeff, hcoeff_gen, hcoeff_err, c, k, label_data):
+    bins=np.append(np.tile(qtBins[:-1],len(yBinsC)),60.)
+    x=np.array(range(len(bins)))
     fig, (ax1, ax2) = plt.subplots(nrows=2,figsize=(12, 10),gridspec_kw={'height_ratios': [3, 1]})
     # fig, ax1 = plt.subplots(figsize=(48, 10))
     hep.cms.text('work in progress', loc=1, ax=ax1)
@@ -84,14 +123,6 @@ for k,c in enumerate(coefficients):
         ax1.set_ylabel(r'$\frac{d\sigma^{U+L}}{dq_Td|y|} (fb/GeV)$', fontsize=30)
     else:
         ax1.set_ylabel(r'$A_{}$'.format(k-1))
-    # ax1.set_xlabel('$q_T$ (GeV)')
-    # ax1.set_xticks(x) # set tick positions
-    # ticks = ["{:d}".format(int(v)) for v in bins]
-    # for itick,tick in enumerate(ticks):
-    #     if not itick==1:
-    #         if tick=="0": ticks[itick] = "60_0"
-    # ax1.set_xticklabels(ticks)
-    # print(hcoeff.ravel(), "+/-", hcoeff_err.ravel())
     hep.histplot(hcoeff.ravel(),bins = x, yerr = hcoeff_err.ravel(),histtype = 'errorbar', color = "k", stack = False, ax=ax1, label=label_data)
     hep.histplot(hcoeff_gen.ravel(),bins =x, color = "r", stack = False, ax=ax1, label="prediction")
 
@@ -110,102 +141,48 @@ for k,c in enumerate(coefficients):
     ax2.set_xlabel('unrolled $q_T$-y bins')
     ax1.legend(loc='upper right', frameon=False)
     plt.tight_layout()
-    plt.savefig('POIplots/fit{}.png'.format(c),dpi=300)
-    plt.savefig('POIplots/fit{}.pdf'.format(c),dpi=300)
-    plt.clf()
+    for output in outputs: plt.savefig(output,dpi=300)
+
+def plotHel(outputs, hcoeff_hel, hcoeff_hel_gen, hcoeff_hel_err, hel, label_data):
     # plot helicity cross sections
+    bins=np.append(np.tile(qtBins[:-1],len(yBinsC)),60.)
+    x=np.array(range(len(bins)))
     fig, (ax1, ax2) = plt.subplots(nrows=2,figsize=(48, 10),gridspec_kw={'height_ratios': [3, 1]})
-    ax1.set_title("fitted {}".format(helicities[k]), fontsize=18)
+    ax1.set_title("fitted {}".format(hel), fontsize=18)
     ax1.set_ylabel('')
     ax1.set_xlabel('a.u.')
     ax1.set_xticks(x) # set tick positions
-    # ax1.set_xticklabels(ticks)
-    # print(hcoeff.ravel(), "+/-", hcoeff_err.ravel())
-    # print(hcoeff_hel.ravel(), "+/-", hcoeff_hel_err.ravel())
-    
     hep.histplot(hcoeff_hel.ravel(),bins = x, yerr = hcoeff_hel_err.ravel(),histtype = 'errorbar', color = "k", stack = False, ax=ax1, label=label_data)
     hep.histplot(hcoeff_hel_gen.ravel(),bins =x, color = "r", stack = False, ax=ax1, label="prediction")
 
     ax1.legend(loc='upper right', frameon=False)
     plt.tight_layout()
-    plt.savefig('POIplots/fit{}.png'.format(helicities[k]),dpi=300)
-    plt.savefig('POIplots/fit{}.pdf'.format(helicities[k]),dpi=300)
-    plt.clf()
+    for output in outputs: plt.savefig(output,dpi=300)
 
-# integrated coefficients
-for k,c in enumerate(coefficients):
-    print('analysing', c, helicities[k])
-    hcoeff = np.zeros([len(qtBinsC)])
-    hcoeff_gen = np.zeros([len(qtBinsC)])
-    hcoeff_err = np.zeros([len(qtBinsC)])
-    hcoeff_y = np.zeros([len(yBinsC)])
-    hcoeff_gen_y = np.zeros([len(yBinsC)])
-    hcoeff_err_y = np.zeros([len(yBinsC)])
-    hcoeff_hel = np.zeros([len(qtBinsC)])
-    hcoeff_hel_gen = np.zeros([len(qtBinsC)])
-    hcoeff_hel_err = np.zeros([len(qtBinsC)])
-    for ev in fitresults: #dummy because there's one event only
-        for j in range(len(qtBinsC)):
-            try:
-                coeff = eval('ev.qt_{j}_helmeta_{c}'.format(c=c, j=j))
-                coeff_gen = eval('ev.qt_{j}_helmeta_{c}_gen'.format(c=c, j=j))
-                coeff_err = eval('ev.qt_{j}_helmeta_{c}_err'.format(c=c, j=j))
-                coeff_hel = eval('ev.helXsecs{c}_qt_{j}_sumxsec'.format(c=helicities[k], j=j))
-                coeff_hel_gen = eval('ev.helXsecs{c}_qt_{j}_sumxsec_gen'.format(c=helicities[k], j=j))
-                coeff_hel_err = eval('ev.helXsecs{c}_qt_{j}_sumxsec_err'.format(c=helicities[k], j=j))
-                if 'unpol' in c:
-                    coeff = coeff/(3./16./math.pi)/16.8/qtBinsS[j]
-                    coeff_gen = coeff_gen/(3./16./math.pi)/16.8/qtBinsS[j]
-                    coeff_err = coeff_err/(3./16./math.pi)/16.8/qtBinsS[j]
-                hcoeff[j]=coeff
-                hcoeff_gen[j]=coeff_gen
-                hcoeff_err[j]=coeff_err
-                hcoeff_hel[j]=coeff_hel
-                hcoeff_hel_gen[j]=coeff_hel_gen
-                hcoeff_hel_err[j]=coeff_hel_err
-            except AttributeError:
-                pass
-        for i in range(len(yBinsC)):
-            try:
-                coeff_y = eval('ev.y_{i}_helmeta_{c}'.format(c=c, j=j, i=i))
-                coeff_gen_y = eval('ev.y_{i}_helmeta_{c}_gen'.format(c=c, j=j, i=i))
-                coeff_err_y = eval('ev.y_{i}_helmeta_{c}_err'.format(c=c, j=j, i=i))
-                if 'unpol' in c:
-                    coeff_y = coeff_y/(3./16./math.pi)/16.8/yBinsS[i]
-                    coeff_gen_y = coeff_gen_y/(3./16./math.pi)/16.8/yBinsS[i]
-                    coeff_err_y = coeff_err_y/(3./16./math.pi)/16.8/yBinsS[i]
-                hcoeff_y[i]=coeff_y
-                hcoeff_gen_y[i]=coeff_gen_y
-                hcoeff_err_y[i]=coeff_err_y
-            except AttributeError:
-                pass
+def plotIntegrated(outputs, hcoeff, hcoeff_gen, hcoeff_err, c, k, binsC, binsS, xlabel, ylabel, label_data):
     fig, (ax1, ax2) = plt.subplots(nrows=2,gridspec_kw={'height_ratios': [3, 1]})
     hep.cms.text('work in progress', loc=1, ax=ax1)
     if 'unpol' in c:
-        ax1.set_ylabel(r'$\frac{d\sigma^{U+L}}{dq_T} (fb/GeV)$', fontsize=30)
+        ax1.set_ylabel(ylabel, fontsize=30)
     else:
         ax1.set_ylabel(r'$A_{}$'.format(k-1))
-    ax2.set_xlabel('$q_T$ (GeV)')
-    ax1.errorbar(qtBinsC,hcoeff.ravel(), xerr=qtBinsS/2, yerr = hcoeff_err.ravel(),marker = 'o',color = "k", label=label_data, fmt='o')
-    ax1.errorbar(qtBinsC,hcoeff_gen.ravel(), xerr=qtBinsS/2)
-
+    ax2.set_xlabel(xlabel)
+    ax1.errorbar(binsC,hcoeff.ravel(), xerr=binsS/2, yerr = hcoeff_err.ravel(),marker = 'o',color = "k", label=label_data, fmt='o')
+    ax1.errorbar(binsC,hcoeff_gen.ravel(), xerr=binsS/2)
     plt.tight_layout()
-    plt.savefig('POIplots/fitintegratedZ{}.png'.format(c),dpi=300)
-    plt.savefig('POIplots/fitintegratedZ{}.pdf'.format(c),dpi=300)
-    plt.clf()
+    for output in outputs: plt.savefig(output,dpi=300)
 
+store = arrayStore('POIplots/.store_Z', fitFile)
+names = ['{}_{}'.format(name, c) for c in coefficients for name in ['coeff', 'coeff_gen', 'coeff_err', 'coeff_hel', 'coeff_hel_gen', 'coeff_hel_err', 'coeff_qt', 'coeff_gen_qt', 'coeff_err_qt', 'coeff_y', 'coeff_gen_y', 'coeff_err_y']]
+store.fill(names, extract)
+
+jobs = []
+for k,c in enumerate(coefficients):
+    jobs.append(figureJob(plotCoeff, ['POIplots/fit{}.png'.format(c), 'POIplots/fit{}.pdf'.format(c)], {'hcoeff': 'coeff_'+c, 'hcoeff_gen': 'coeff_gen_'+c, 'hcoeff_err': 'coeff_err_'+c}, c=c, k=k, label_data=label_data))
+    jobs.append(figureJob(plotHel, ['POIplots/fit{}.png'.format(helicities[k]), 'POIplots/fit{}.pdf'.format(helicities[k])], {'hcoeff_hel': 'coeff_hel_'+c, 'hcoeff_hel_gen': 'coeff_hel_gen_'+c, 'hcoeff_hel_err': 'coeff_hel_err_'+c}, hel=helicities[k], label_data=label_data))
+    # integrated coefficients
+    jobs.append(figureJob(plotIntegrated, ['POIplots/fitintegratedZ{}.png'.format(c), 'POIplots/fitintegratedZ{}.pdf'.format(c)], {'hcoeff': 'coeff_qt_'+c, 'hcoeff_gen': 'coeff_gen_qt_'+c, 'hcoeff_err': 'coeff_err_qt_'+c}, c=c, k=k, binsC=qtBinsC, binsS=qtBinsS, xlabel='$q_T$ (GeV)', ylabel=r'$\frac{d\sigma^{U+L}}{dq_T} (fb/GeV)$', label_data=label_data))
     # plots y-integrated
-    fig, (ax1, ax2) = plt.subplots(nrows=2,gridspec_kw={'height_ratios': [3, 1]})
-    hep.cms.text('work in progress', loc=1, ax=ax1)
-    if 'unpol' in c:
-        ax1.set_ylabel(r'$\frac{d\sigma^{U+L}}{dy} (fb)$', fontsize=30)
-    else:
-        ax1.set_ylabel(r'$A_{}$'.format(k-1))
-    ax2.set_xlabel('$y$')
-    print(yBinsC,'bin centers')
-    ax1.errorbar(yBinsC,hcoeff_y.ravel(), xerr=yBinsS/2, yerr = hcoeff_err_y.ravel(),marker = 'o',color = "k", label=label_data, fmt='o')
-    ax1.errorbar(yBinsC,hcoeff_gen_y.ravel(), xerr=yBinsS/2)
-    plt.tight_layout()
-    plt.savefig('POIplots/fityintegratedZ{}.png'.format(c),dpi=300)
-    plt.savefig('POIplots/fityintegratedZ{}.pdf'.format(c),dpi=300)
-    plt.clf()
+    jobs.append(figureJob(plotIntegrated, ['POIplots/fityintegratedZ{}.png'.format(c), 'POIplots/fityintegratedZ{}.pdf'.format(c)], {'hcoeff': 'coeff_y_'+c, 'hcoeff_gen': 'coeff_gen_y_'+c, 'hcoeff_err': 'coeff_err_y_'+c}, c=c, k=k, binsC=yBinsC, binsS=yBinsS, xlabel='$y$', ylabel=r'$\frac{d\sigma^{U+L}}{dy} (fb)$', label_data=label_data))
+
+render(jobs, store, hashFile='POIplots/.plotHashes.json', processes=args.jobs)
@@ -32,8 +32,9 @@ helicities = ['UL','I', 'T', 'A', 'P']
 coefficients = ['A0']
 
 
-fIntoy = ROOT.TFile.Open('../Fit/FitRes/fit_WPlus_toy.root')
-fitresultstoy = fIntoy.Get('fitresults')
+# fit results of all the toys, collected by Fit/runToys.py
+ftoys = h5py.File('../Fit/FitRes/toys_WPlus.hdf5', mode='r')
+fitresultstoy = ftoys['fitresults']
 
 charge = "WPlus"
 f_aMC = ROOT.TFile.Open('/scratchnvme/wmass/REWEIGHT/genInfo_syst.root')
@@ -48,7 +49,11 @@ coeffs_aMC = np.stack(hists_aMC,axis=-1)
 
 htot = hist2array(f_aMC.Get('angularCoefficients_{}/mapTot'.format("Wminus" if charge=="WMinus" else "Wplus")))
 
-d = ROOT.RDataFrame('fitresults', '../Fit/FitRes/fit_WPlus_toy.root')
+# only the columns used below are read from the store
+columns = ['status', 'mass', 'mass_err']
+for c in coefficients:
+    columns.extend([name for name in fitresultstoy if name.endswith('_'+c) or name.endswith('_{}_err'.format(c))])
+d = ROOT.RDF.MakeNumpyDataFrame({name: np.ascontiguousarray(fitresultstoy[name][:]) for name in columns})
 
 threshold_y = np.digitize(2.4,yBins)-1
 threshold_qt = np.digitize(60.,qtBins)-1
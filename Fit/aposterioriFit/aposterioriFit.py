@@ -5,10 +5,11 @@ import copy
 import argparse
 import os
 import numpy as np 
-from obsminimization import pmin
+from obsminimization import pmin, lmin, glsmin
 import root_numpy as rootnp
 import ctypes
 import scipy
+import scipy.linalg
 ROOT.gROOT.SetBatch(True)
 ROOT.TH1.AddDirectory(False)
 ROOT.TH2.AddDirectory(False)
@@ -65,110 +66,64 @@ def getRegFunc(inFile, coeffList) :
     return outDict
 
      
-def chi2PostReg(modelPars,npFitRes, npCovMatInv, coeffList, npBinCenters,parNum) :#NOT USED, for now 
-    
-    # interPars = modelPars.copy()
-    interPars = np.split(modelPars,parNum)
-    
-    fitModelList = []
+def chebyshev(x, n) :
+    # T_0(x)...T_{n-1}(x), by recurrence, as columns
+    T = [np.ones_like(x), x]
+    for k in range(2, n) :
+        T.append(2*x*T[-1]-T[-2])
+    return np.stack(T[:n], axis=-1)
+
+def edgeMap(n, constrained, flat=False) :
+    # full Chebyshev coefficients (n) from the free ones: each constraint fixes one of the
+    # last coefficients, so that the model vanishes at the lower edge, sum_k c_k T_k(-1) = 0,
+    # and (flat, the "constrain C1" of polyFit) has no slope there, sum_k c_k T'_k(-1) = 0
+    rows = []
+    if constrained :
+        rows.append(chebyshev(np.array([-1.]), n)[0])
+    if flat :
+        rows.append(np.power(-1., np.arange(n)+1)*np.arange(n)**2) # T'_k(-1) = (-1)^(k+1) k^2
+    if len(rows)==0 :
+        return np.identity(n)
+    C = np.stack(rows, 0)
+    m = len(rows)
+    if n<=m :
+        raise ValueError("edgeMap: {} Chebyshev coefficients cannot satisfy {} edge constraints".format(n, m))
+    E = np.zeros((n, n-m))
+    E[:n-m,:] = np.identity(n-m)
+    E[n-m:,:] = -np.linalg.solve(C[:,n-m:], C[:,:n-m])
+    return E
+
+def postRegDesign(coeffList, npBinCenters, dimQt) :
+    # design matrix A of the post-fit regularisation model, npFitRes.flatten() = A*modelPars:
+    # for each coefficient sum_{iy,iqt} c[iqt,iy] T_iy(y) T_iqt(qt), with the y=0 (li[5]) and
+    # qt=0 (li[6]) constraints and the zero slope at qt=0 (li[7]) folded in, and for the unpolarized
+    # cross section one even polynomial in y per qt bin. npBinCenters (y,qt) in [-1,1], ordered as npFitRes[coeff].flatten()
+    valY = npBinCenters[:,0]
+    valQt = npBinCenters[:,1]
+    blocks = []
+    parNum = []
     for li in coeffList :
-        
-        fitModelList.append(np.zeros(np.shape(npBinCenters)[0])) # list of  (y,qt), with lenght (Ny*Nqt) 
-
-        if li[0]!=5 : #not unpol
-            parsCoeffList = [] #last element must be used
-            parsCoeffList.append(interPars[li[0]+np.shape(npFitRes)[2]])
-            
-            #rebuilt parsCoeffList with "holes"
-            # parsCoeffList.append(np.zeros(li[1]*li[2]))
-            # if not li[5] and not li[6] :
-            #     for iy in range(li[1]) :
-            #         for iqt in range(li[2]) :
-            #             itot = iqt*(li[1])+iy
-            #             parsCoeffList.append(jax.ops.index_update(parsCoeffList[-1], jax.ops.index[itot],parsCoeffList[-1]))
-                        
-            # if not li[5] and not li[6] :
-            #     clist = list(parsCoeffList[-1])
-            #     for iy in range(li[1]) :
-            #             for iqt in range(li[2]) :
-            #                 itot = iqt*(li[1])+iy
-            #                 clist[itot] = parsCoeffList[itot]
-            if li[5] :
-                ylist = list(parsCoeffList[-1])
-                for iy in range(li[1]) :
-                    for iqt in range(li[2]) :
-                        itot = iqt*(li[1])+iy
-                        if iy==li[1]-1 :
-                            ylist.insert(itot, 0.)
-                parsCoeffList.append(jnp.asarray(ylist))
-                
-            if li[6] :
-                qtlist = list(parsCoeffList[-1])
-                for iy in range(li[1]) :
-                    for iqt in range(li[2]) :
-                        itot = iqt*(li[1])+iy
-                        if iy==li[2]-1 :
-                            qtlist.insert(itot, 0.)
-                parsCoeffList.append(jnp.asarray(qtlist))
-                        
-                    
-            if li[5] : #contraint on y=0
-                for iqt in range(li[2]) :
-                    itot = iqt*(li[1])+li[1]
-                    constr = 0.0
-                    for k in range(0, li[1]-1): 
-                        constr += np.power(-1., li[1]+k+1)*parsCoeffList[-1][iqt*li[1]+k]
-                    parsCoeffList.append(jax.ops.index_update(parsCoeffList[-1], jax.ops.index[itot],constr))
-                    
-            if li[6] : #costraint on qt=0
-                for iy in range(li[1]):
-                    itot = li[2]*(li[1])+iy
-                    constr = 0.0
-                    for k in range(0, li[2]-1): 
-                        constr += np.power(-1., li[2]+k+1)*parsCoeffList[-1][ k*li[1]+iy]
-                    parsCoeffList.append(jax.ops.index_update(parsCoeffList[-1], jax.ops.index[itot],constr))
-            
-            for iy in range(li[1]) :
-                for iqt in range(li[2]) :
-                    itot = iqt*(li[1])+iy
-                    fitModelList[-1] += parsCoeffList[-1][itot]*scipy.special.eval_chebyt(iy, npBinCenters[:,0])*scipy.special.eval_chebyt(iqt,npBinCenters[:,1]) 
-        
-        else : #unpol
-            parsCoeffList = []
-            # parsCoeffList.append(interPars[li[0]:])
-            parsCoeffList.append(interPars[:np.shape(npFitRes)[2]])
-            
-            qtList_of_interPars = []
-            for iqt in range(np.shape(npFitRes)[2]) :
-                clist = list(parsCoeffList[-1][iqt])
-                for iy in range(li[1]) :
-                    if iy%2!=0 :
-                        clist.insert(iy, 0.)       
-                qtList_of_interPars.append(jnp.asarray(clist))
-            parsCoeffList.append(qtList_of_interPars)
-            
-            for iy in range(li[1]) : #contraint on odd degrees
-                if iy%2!=0 :
-                    for iqt in range(np.shape(npFitRes)[2]) : #binQt
-                        parsCoeffList.append(jax.ops.index_update(parsCoeffList[-1], jax.ops.index[iqt,iy],0))
-                        
-            for iy in range(li[1]) :
-                for iqt in range(np.shape(npFitRes)[2]) : #binQt
-                    fitModelList[-1] += parsCoeffList[-1][iqt][iy]*scipy.special.eval_chebyt(iy,(npBinCenters[:,0]+1)/2.)#because the limits are 0,1
-
-        fitModelList[-1] = fitModelList[-1].reshape((jnp.shape(npFitRes)[1],jnp.shape(npFitRes)[2])) # reshape to (Ny x Nqt), like the fitRes histogram
-        
-    fitModel = jnp.stack(fitModelList,0)
-    print("this is wrong in the list there are all the not-required element ovewritten")
-
- 
-    diff = npFitRes-fitModel
-    diff = diff.flatten() 
-    chi2 = jnp.matmul(diff.T, jnp.matmul(npCovMatInv, diff) )
+        if li[0]!='unpolarizedxsec' :
+            X = (chebyshev(valQt, li[2])[:,:,np.newaxis]*chebyshev(valY, li[1])[:,np.newaxis,:]).reshape(len(valY), -1) # [bin, iqt*ny+iy]
+            A = np.matmul(X, np.kron(edgeMap(li[2], li[6], len(li)>7 and li[7]), edgeMap(li[1], li[5])))
+        else :
+            if len(li)>7 and li[7] :
+                raise ValueError("postRegDesign: constrain C1 is not defined for the unpolarized cross section")
+            Ty = chebyshev((valY+1)/2., li[1])[:,0::2] #because the limits are 0,1, odd degrees constrained to 0
+            qtMask = np.equal(np.arange(len(valY))[:,np.newaxis] % dimQt, np.arange(dimQt)[np.newaxis,:])
+            A = (qtMask[:,:,np.newaxis]*Ty[:,np.newaxis,:]).reshape(len(valY), -1) # [bin, iqt*ny_even+iy]
+        blocks.append(A)
+        parNum.append(A.shape[1])
+    return scipy.linalg.block_diag(*blocks), parNum
+
+def chi2PostReg(modelPars, npFitRes, npCovMatInv, design) :
+    # a single quadratic form: jittable, and vmappable over a batch of fits (e.g. toys)
+    diff = npFitRes.flatten() - jnp.matmul(design, modelPars)
+    chi2 = jnp.matmul(diff, jnp.matmul(npCovMatInv, diff))
     return chi2
     
     
-def fitPostReg(fitRes,regFunc, coeffList) :#NOT USED, for now 
+def fitPostReg(fitRes,regFunc, coeffList, solver='linear') :
     
     #prepare fitRes
     dimY = fitRes['A0'].GetNbinsX()
@@ -179,119 +134,46 @@ def fitPostReg(fitRes,regFunc, coeffList) :#NOT USED, for now
     npCovMatInv = np.linalg.inv(npCovMat)
     
     
-    #build the bin centers list
+    #build the bin centers list, ordered as npFitRes[coeff].flatten()
 
     binY,binQt = [], []
     for i in range(1, dimY+1):  binY.append( 2*(fitRes['A0'].GetXaxis().GetBinCenter(i)- 0.)/(fitRes['A0'].GetXaxis().GetBinLowEdge(dimY+1)-0.) - 1.) #range between -1,1
     for i in range(1, dimQt+1): binQt.append( 2*(fitRes['A0'].GetYaxis().GetBinCenter(i)- 0.)/(fitRes['A0'].GetYaxis().GetBinLowEdge(dimQt+1)-0.) - 1.) #range between -1,1 
-    xx = array('f', binY)
-    yy = array('f', binQt)
     
     npBinCenters = np.zeros((dimY*dimQt,2))
-            
-    hreb = ROOT.TH2F('hreb', 'hreb', len(xx)-1, xx, len(yy)-1, yy)
-    for i in range(1, hreb.GetXaxis().GetNbins()+1): #y
-        for j in range(1, hreb.GetYaxis().GetNbins()+1):#qt
-            npBinCenters[(i-1)*(j-1)] = hreb.GetXaxis().GetBinCenter(i), hreb.GetYaxis().GetBinCenter(j)
-            
+    for iy in range(0, dimY): #y
+        for iqt in range(0, dimQt):#qt
+            npBinCenters[iy*dimQt+iqt] = binY[iy], binQt[iqt]
     
     npFitResList = []
     for li in coeffList :           
         npFitResList.append(rootnp.hist2array(fitRes[li[0]])) #consider that the bin edges --> xx,yy
     npFitRes = np.stack(npFitResList,0)  #dimensions: coeff, y, qt = (6,6,8). if flatten--> q0y0a0...qNy0a0, q0y1a0....qNy1a0, ....
     
-    
-    
-    #model init
-    modelParsList = []
-    parNum = []
-    for li in coeffList :
-        if li[0]!='unpolarizedxsec' : 
-            func = regFunc[li[0]].GetFunction('fit_WtoMuP_'+li[0])
-            # modelParsC=np.zeros(func.GetNpar())
-            # for i in range(func.GetNpar()) :
-            #     modelParsC[i] = func.GetParameter(i)
-            # modelParsList.append(modelParsC.copy())
-            # parNum.append(li[1]*li[2]+parNum[-1])
-            modelParsC=np.zeros(li[7])
-            iset=0
-            for iqt in range(li[2]) :
-                for iy in range(li[1]) :
-                    itot = iqt*li[1]+iy #depend not on this loop but on the ROOT par number assigment
-                    if li[5] and iy==li[1]-1 : continue
-                    if li[6] and iqt==li[2]-1 : continue     
-                    modelParsC[iset] = func.GetParameter(itot)
-                    iset+=1
-            modelParsList.append(modelParsC.copy())            
-            parNum.append(li[7]+parNum[-1])
-
-        else :
-            for qt in range(1, regFunc['A0'].GetNbinsY()+1) :
-                if qt%2==0 : continue # to allign skipped one bin every two the binning: quite bad approach, but it's relevant for init. val. only
-                func = regFunc[li[0]+str(qt)].GetFunction('fit_WtoMuP_unpol')
-                modelParsC=np.zeros(li[3])
-                # modelParsC=np.zeros(func.GetNpar())
-                iset=0
-                for i in range(func.GetNpar()) :
-                    if i%2!=0 : continue 
-                    modelParsC[iset] = func.GetParameter(i)
-                    iset+=1
-                modelParsList.append(modelParsC.copy())
-                
-                if len(parNum) >0 :
-                    parNum.append(li[3]+parNum[-1])
-                else :
-                    parNum.append(li[3])
-                    
-                # if len(parNum) >0 :
-                #     parNum.append(li[1]+parNum[-1])
-                # else :
-                #     parNum.append(li[1])
-
-    # modelPars = np.stack(modelParsList,0) 
-    parNum = parNum[:-1]
-    modelPars = np.concatenate(modelParsList) #already flattened, otherwise YOU HAVE TO FLATTEN before pass it to the fit
-    
-    coeffListJAX = copy.deepcopy(coeffList)
-    for li in coeffListJAX :
-        if li[0] != 'unpolarizedxsec' : 
-            li[0] = coeffListJAX.index(li)-1
-        else :
-            li[0] = 5
-    
-    # # DEBUGG---------------------------------------------------
-    # print coeffListJAX
-    # print "PAR NUM=",parNum
-    # print "------------------------------------------------------"
-    # print "not splitted=", modelPars
-    # print "------------------------------------------------------"
-    # interPars= np.split(modelPars,parNum)
-    # print "ALL SPLITTED=", interPars
-    # print "------------------------------------------------------"
-
-    # print "not unpol=", 0+np.shape(npFitRes)[2], interPars[0+np.shape(npFitRes)[2]]
-    # print "------------------------------------------------------"
-    # print "UNPOL=", interPars[:np.shape(npFitRes)[2]]
-    # # END OF DEBUGG---------------------------------------------------
+    #model: the design matrix is computed once, the fit only sees arrays
+    design, parNum = postRegDesign(coeffList, npBinCenters, dimQt)
+    modelPars = np.zeros(design.shape[1])
 
     print("everything initialized, minimizer call...")
-    print("initial x=", modelPars)
-    modelPars = pmin(chi2PostReg, modelPars, args=(npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum), doParallel=False)
+    print("par num", parNum)
+    if solver=='linear' :
+        modelPars, modelCov, modelChi2 = glsmin(design, npFitRes.flatten(), npCovMatInv)
+    else :
+        modelPars = pmin(chi2PostReg, modelPars, args=(npFitRes, npCovMatInv, design), doParallel=False, staticArgs=False)
     
         
     # after fit results
-    static_argnumsPF = (1,2,3,4,5)
-    modelChi2Grad_eval = jax.jit(jax.value_and_grad(chi2PostReg), static_argnums=static_argnumsPF)
-    modelHess_eval = jax.jit(jax.hessian(chi2PostReg), static_argnums=static_argnumsPF)
-    
-    modelChi2,modelGrad = modelChi2Grad_eval(modelPars, npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum)
-    modelHess = modelHess_eval(modelPars, npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum)
+    modelChi2Grad_eval = jax.jit(jax.value_and_grad(chi2PostReg))
+    modelChi2,modelGrad = modelChi2Grad_eval(modelPars, npFitRes, npCovMatInv, design)
     
-    modelCov = 0.5*np.linalg.inv(modelHess)
+    if solver!='linear' :
+        modelHess_eval = jax.jit(jax.hessian(chi2PostReg))
+        modelHess = modelHess_eval(modelPars, npFitRes, npCovMatInv, design)
+        modelCov = 0.5*np.linalg.inv(modelHess)
     modelErr = np.sqrt(np.diag(modelCov))
 
-    modelEDM = 0.5*np.matmul(np.matmul(fitGrad.T,modelCov),fitGrad)
-    modelNDOF = dimY*dimQt - np.size(modelPars)
+    modelEDM = 0.5*np.matmul(np.matmul(modelGrad.T,modelCov),modelGrad)
+    modelNDOF = np.size(npFitRes) - np.size(modelPars)
     
     print("*-------------------------------------------*")
     print("FIT RESULTS")
@@ -306,13 +188,25 @@ def fitPostReg(fitRes,regFunc, coeffList) :#NOT USED, for now
         'binY' : binY,
         'binQt' : binQt,
         'binCent' : npBinCenters,
-        'npFitRes' : npFitRes
+        'npFitRes' : npFitRes,
+        'design' : design,
+        'parNum' : parNum
     }
 
     outFit = (modelPars,modelCov,extraInfoDict)
     
     return outFit
 
+def fitPostRegToys(npFitResToys, npCovMatInv, design, solver='linear') :
+    # all the toys (npFitResToys: toy, coeff, y, qt) in one batched minimisation, returns parameters, covariance, chi2 per toy
+    ntoys = np.shape(npFitResToys)[0]
+    if solver=='linear' :
+        return glsmin(design, npFitResToys.reshape(ntoys,-1), npCovMatInv)
+    npCovMatInvToys = np.broadcast_to(npCovMatInv, (ntoys,)+np.shape(npCovMatInv))
+    designToys = np.broadcast_to(design, (ntoys,)+np.shape(design))
+    modelPars = np.zeros((ntoys, design.shape[1]))
+    return lmin(chi2PostReg, modelPars, args=(npFitResToys, npCovMatInvToys, designToys), doParallel=True, staticArgs=False)
+
 
 
 
@@ -410,7 +304,7 @@ def chi2PolyFit(modelPars,npFitRes, npCovMatInv, coeffList, npBinCenters,parNum)
     return chi2
     
 
-def polyFit(fitRes,regFunc, coeffList) :
+def polyFit(fitRes,regFunc, coeffList, solver='linear') :
     
     # unpolMult = 1000
     dimY = fitRes[coeffList[0][0]].GetNbinsX()
@@ -477,18 +371,21 @@ def polyFit(fitRes,regFunc, coeffList) :
     print("everything initialized, minimizer call...")
     # print "initial x=", modelPars
     print("par num", parNum)
-    modelPars = pmin(chi2PolyFit, modelPars, args=(npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum), doParallel=False)
+    if solver=='linear' : #the model is linear in the parameters: one Cholesky solve (lmin falls back to pmin otherwise)
+        modelPars, modelCov, modelChi2 = lmin(chi2PolyFit, modelPars, args=(npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum), doParallel=False)
+    else :
+        modelPars = pmin(chi2PolyFit, modelPars, args=(npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum), doParallel=False)
 
         
     # after fit results
     static_argnumsPF = (1,2,3,4,5)
     modelChi2Grad_eval = jax.jit(jax.value_and_grad(chi2PolyFit), static_argnums=static_argnumsPF)
-    modelHess_eval = jax.jit(jax.hessian(chi2PolyFit), static_argnums=static_argnumsPF)
-    
     modelChi2,modelGrad = modelChi2Grad_eval(modelPars, npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum)
-    modelHess = modelHess_eval(modelPars, npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum)
     
-    modelCov = 0.5*np.linalg.inv(modelHess)
+    if solver!='linear' :
+        modelHess_eval = jax.jit(jax.hessian(chi2PolyFit), static_argnums=static_argnumsPF)
+        modelHess = modelHess_eval(modelPars, npFitRes, npCovMatInv, coeffListJAX, npBinCenters,parNum)
+        modelCov = 0.5*np.linalg.inv(modelHess)
     modelErr = np.sqrt(np.diag(modelCov))
 
     modelEDM = 0.5*np.matmul(np.matmul(modelGrad.T,modelCov),modelGrad)
@@ -743,12 +640,14 @@ parser.add_argument('-o','--output', type=str, default='aposterioriFit',help="na
 parser.add_argument('-f','--fitInput', type=str, default='fitResult.root',help="name of the fit result root file, after plotter_fitResult")
 parser.add_argument('-r','--regInput', type=str, default='../../regularization/OUTPUT_poly/regularizationFit_range11_rebuild____nom_nom.root',help="name of the regularization study result root file")
 parser.add_argument('-s','--save', type=int, default=False,help="save .png and .pdf canvas")
+parser.add_argument('--solver', type=str, default='linear', choices=['linear','iterative'],help="closed form solution for the (linear) polynomial models, or the iterative minimizer")
 
 args = parser.parse_args()
 OUTPUT = args.output
 FITINPUT = args.fitInput
 REGINPUT = args.regInput
 SAVE= args.save
+SOLVER = args.solver
 
 coeffList = []#y plus, qt plus, y minus, qt minus, constraint y, constraint qt,constrain C1
 # coeffList.append(['unpolarizedxsec', 3,3])
@@ -768,8 +667,8 @@ coeffList.append(['A4', 4,5,4,6, 1,0,0]) #5-->7 but no convergence! and last num
 # parPerCoeff(coeffList=coeffList) #add number of free par per coeff to coeffList
 fitResDict = getFitRes(inFile=FITINPUT, coeffList=coeffList)
 regFuncDict = getRegFunc(inFile=REGINPUT, coeffList=coeffList)
-# fitPostRegResult = fitPostReg(fitRes=fitResDict, regFunc=regFuncDict, coeffList=coeffList)
-fitPostRegResult = polyFit(fitRes=fitResDict, regFunc=regFuncDict, coeffList=coeffList)
+# fitPostRegResult = fitPostReg(fitRes=fitResDict, regFunc=regFuncDict, coeffList=coeffList, solver=SOLVER)
+fitPostRegResult = polyFit(fitRes=fitResDict, regFunc=regFuncDict, coeffList=coeffList, solver=SOLVER)
 plotterPostReg(fitResult = fitPostRegResult, output=OUTPUT,save=SAVE, coeffList=coeffList,histo=fitResDict)
 
 
@@ -1,4 +1,5 @@
 import os
+import time
 import multiprocessing
 
 ncpu = multiprocessing.cpu_count()
@@ -11,6 +12,7 @@ os.environ["NUMEXPR_NUM_THREADS"] = str(ncpu)
 
 import jax
 import jax.numpy as np
+import jax.scipy.linalg
 import numpy as onp
 from jax import grad, hessian, jacobian, config
 from jax.scipy.special import erf
@@ -29,48 +31,205 @@ config.update('jax_enable_x64', True)
 
 #if doParallel is False this can be used as a standard minimizer, where x is just the parameter vector as usual
 
-def pmin(f, x, args = [], doParallel=True):
-    
-    tol = np.sqrt(np.finfo('float64').eps)
-    #tol = np.finfo('float64').eps
-    #edmtol = np.sqrt(np.finfo('float64').eps)
-    maxiter = int(100e3)
+#args are treated as static by the jit (hashable python objects such as the coefficient lists),
+#with staticArgs=False they are traced instead, as needed for array arguments or a batch of them
+
+#the whole minimisation runs on the device in a lax.while_loop: fits of the batch which have converged
+#are masked (their parameters are frozen) while the others keep iterating, until all of them converged or maxiter.
+#method='trust' is the trust region with explicit hessian+eigen-decomposition below, method='lbfgs' is hessian-free
+#(limited memory BFGS with `history` pairs and a backtracking line search), for larger numbers of parameters
+
+#with returnInfo=True a dict with per-fit iterations, edm, chi2 (val) and convergence flag is returned as well,
+#together with the wall time of the whole batch (the fits run together, so the time per fit is not separable)
+
+def pmin(f, x, args = [], doParallel=True, staticArgs=True, method='trust', maxiter=int(100e3), tol=None, history=10, returnInfo=False):
     
-    trust_radius = np.ones(shape=x.shape[:-1], dtype=x.dtype)
+    if tol is None:
+        tol = np.sqrt(np.finfo('float64').eps)
+        #tol = np.finfo('float64').eps
     
-    def fiter(x, trust_radius, args):
-        return piter(f, x, trust_radius, args)
+    if method=='trust':
+        finit = lambda x, args: (x, np.ones(shape=(), dtype=x.dtype))
+        fstep = lambda state, args: piter(f, *state, args)
+    elif method=='lbfgs':
+        finit = lambda x, args: lbfgsinit(f, x, args, history)
+        fstep = lambda state, args: lbfgsiter(f, state, args)
+    else:
+        raise ValueError("unknown method {}, use trust or lbfgs".format(method))
         
     #sufficiently advanced technology is indistinguishable from magic
     if doParallel:
-        fiter = jax.vmap(fiter)
-    # fiter = jax.jit(fiter)
-    static_argnums = (2,)
-    fiter = jax.jit(fiter,static_argnums=static_argnums)
+        finit = jax.vmap(finit)
+        fstep = jax.vmap(fstep)
     
-    #jit compile function where arguments not varying between iterations treated as static
-    #this possibly leads to excessive memory consumption
-    #static_argnums = (2,)
-    #vfiter = jax.jit(vfiter, static_argnums=static_argnums)
-    
-    for i in range(maxiter):
-        x,trust_radius,val,gradmag,edm, e0 = fiter(x,trust_radius,args)
-        #x,trust_radius, actual_reduction, predicted_reduction, rho, val, gradmag = vfiter(x,trust_radius,args)
-        #maxidx = np.argmax(trust_radius)
-        #print(i, val, trust_radius, gradmag, np.max(trust_radius), np.max(gradmag), actual_reduction[maxidx],predicted_reduction[maxidx])
-        # print("iter", i, np.sum(val), np.max(trust_radius), np.max(gradmag), np.sum(edm), np.max(edm), np.min(e0))
-        print("iter", i, ", gradmag=",gradmag ,", edm=",edm, "e0=", e0)
-        # print ", parametri:", x[0], x[1], x[2], x[3],x[4],x[5],x[6],x[7],x[8],x[9],x[10]
-        # print x
-        #for iparm in range(4):
-            #print(iparm, np.min(x[...,iparm]), np.max(x[...,iparm]))
-        #if np.all(trust_radius<tol):
-        #convergence when estimated distance to minimum is below the tolerance AND hessian is positive definite for all bins
-        if np.all(np.logical_and(e0>0, edm<tol)):
-            break
+    def minimize(x, args):
+        
+        def cond(carry):
+            state, converged, niter, val, edm, i = carry
+            return np.logical_and(np.logical_not(np.all(converged)), i<maxiter)
         
+        def body(carry):
+            state, converged, niter, val, edm, i = carry
+            stateout = fstep(state, args)
+            #x,trust_radius,val,gradmag,edm, e0 for the trust region
+            valout, edmout, e0 = stateout[-4], stateout[-2], stateout[-1]
+            state = jax.tree_util.tree_map(lambda old, new: np.where(mask(converged, old), old, new), state, stateout[0] if method=='lbfgs' else stateout[:2])
+            niter = niter + np.logical_not(converged)
+            val = np.where(converged, val, valout)
+            edm = np.where(converged, edm, edmout)
+            #convergence when estimated distance to minimum is below the tolerance AND hessian is positive definite
+            converged = np.logical_or(converged, np.logical_and(e0>0, edmout<tol))
+            return state, converged, niter, val, edm, i+1
+        
+        state = finit(x, args)
+        batch = x.shape[:-1]
+        carry = (state, np.zeros(batch, dtype=np.bool_), np.zeros(batch, dtype=np.int32), np.full(batch, np.inf, dtype=x.dtype), np.full(batch, np.inf, dtype=x.dtype), 0)
+        state, converged, niter, val, edm, i = jax.lax.while_loop(cond, body, carry)
+        return state[0], converged, niter, val, edm
+    
+    #jit compile function where arguments not varying between iterations treated as static
+    static_argnums = (1,) if staticArgs else ()
+    minimize = jax.jit(minimize,static_argnums=static_argnums)
+    
+    start = time.time()
+    x, converged, niter, val, edm = minimize(np.asarray(x), args)
+    x.block_until_ready()
+    walltime = time.time()-start
+    
+    print("pmin ({}): {}/{} fits converged, iterations max={}, edm max={}, wall time={:.2f} s".format(method, onp.sum(converged), onp.size(converged), onp.max(niter), onp.max(edm), walltime))
+    
+    if returnInfo:
+        info = {'iterations': niter, 'edm': edm, 'val': val, 'converged': converged, 'time': walltime}
+        return x, info
     return x
 
+def mask(converged, a):
+    #broadcast the per-fit flag over the parameter dimensions of a
+    return np.reshape(converged, converged.shape + (1,)*(a.ndim-converged.ndim))
+
+def lbfgsinit(f, x, args, history):
+    val, grad = jax.value_and_grad(f)(x, *args)
+    S = np.zeros((history,)+x.shape, dtype=x.dtype)
+    Y = np.zeros((history,)+x.shape, dtype=x.dtype)
+    rho = np.zeros((history,), dtype=x.dtype)
+    return (x, val, grad, S, Y, rho)
+
+def lbfgsiter(f, state, args):
+    
+    x, val, grad, S, Y, rho = state
+    fg = jax.value_and_grad(f)
+    history = rho.shape[0]
+    
+    #two-loop recursion, most recent pair first, empty pairs have rho=0 and do not contribute
+    q = grad
+    alpha = []
+    for i in range(history):
+        alpha.append(rho[i]*np.dot(S[i], q))
+        q = q - alpha[i]*Y[i]
+    yy = np.dot(Y[0], Y[0])
+    gamma = np.where(rho[0]>0., 1./np.where(rho[0]>0., rho[0]*yy, 1.), 1.)
+    r = gamma*q
+    for i in reversed(range(history)):
+        beta = rho[i]*np.dot(Y[i], r)
+        r = r + (alpha[i]-beta)*S[i]
+    
+    #estimated distance to minimum from the approximate inverse hessian, only meaningful once there is curvature information
+    edm = 0.5*np.dot(grad, r)
+    e0 = np.where(rho[0]>0., 1., -1.)
+    
+    p = -r
+    slope = np.dot(grad, p)
+    p = np.where(slope<0., p, -grad)
+    slope = np.where(slope<0., slope, -np.dot(grad, grad))
+    
+    #backtracking line search (Armijo condition)
+    c1 = 1e-4
+    def cond(vals):
+        t, val_new, j = vals
+        return np.logical_and(np.logical_not(val_new <= val + c1*t*slope), j<50)
+    def body(vals):
+        t, val_new, j = vals
+        t = 0.5*t
+        return t, f(x + t*p, *args), j+1
+    t, val_new, j = jax.lax.while_loop(cond, body, (np.ones((), dtype=x.dtype), f(x + p, *args), 0))
+    
+    accept = val_new <= val + c1*t*slope
+    x_new = np.where(accept, x + t*p, x)
+    val_new, grad_new = fg(x_new, *args)
+    
+    #update the history, skipping pairs without positive curvature
+    s = x_new - x
+    y = grad_new - grad
+    sy = np.dot(s, y)
+    update = sy > np.finfo(x.dtype).eps*np.dot(y, y)
+    S = np.where(update, np.roll(S, 1, axis=0).at[0].set(s), S)
+    Y = np.where(update, np.roll(Y, 1, axis=0).at[0].set(y), Y)
+    rho = np.where(update, np.roll(rho, 1, axis=0).at[0].set(1./np.where(update, sy, 1.)), rho)
+    
+    gradmag = np.linalg.norm(grad,axis=-1)
+    return (x_new, val_new, grad_new, S, Y, rho), val, gradmag, edm, e0
+
+#closed form minimisation for models linear in the parameters, where the chi2 is exactly quadratic:
+#a single Newton step solved with a Cholesky decomposition of the hessian lands on the minimum.
+#returns the parameters, their covariance (0.5*inverse hessian, as for a chi2) and the chi2 at the minimum,
+#batched as pmin. Linearity is checked by comparing the hessian at the starting point and at the solution,
+#if any fit of the batch is not quadratic the iterative pmin is used instead
+
+def lmin(f, x, args = [], doParallel=True, staticArgs=True, rtol=1e-6):
+    
+    def fstep(x, args):
+        return lstep(f, x, args)
+    
+    if doParallel:
+        fstep = jax.vmap(fstep)
+    static_argnums = (1,) if staticArgs else ()
+    fstep = jax.jit(fstep,static_argnums=static_argnums)
+    
+    x_out, cov, chi2, hess, hess_out = fstep(x,args)
+    
+    linear = np.all(np.abs(hess_out-hess) <= rtol*np.max(np.abs(hess)))
+    if not linear:
+        print("lmin: the chi2 is not quadratic in the parameters, falling back to pmin")
+        x_out = pmin(f, x, args, doParallel=doParallel, staticArgs=staticArgs)
+        x_out, cov, chi2, hess, hess_out = fstep(x_out,args)
+    
+    return x_out, cov, chi2
+
+def lstep(f, x, args):
+    
+    g = jax.grad(f)
+    h = jax.jacfwd(g)
+    
+    grad = g(x,*args)
+    hess = h(x,*args)
+    
+    chol = jax.scipy.linalg.cho_factor(hess)
+    x_out = x - jax.scipy.linalg.cho_solve(chol, grad)
+    cov = 0.5*jax.scipy.linalg.cho_solve(chol, np.eye(x.shape[-1], dtype=x.dtype))
+    
+    chi2 = f(x_out,*args)
+    hess_out = h(x_out,*args)
+    
+    return x_out, cov, chi2, hess, hess_out
+
+#generalised least squares with an explicit design matrix, chi2 = (y-A*x)^T covinv (y-A*x),
+#any leading dimensions of A, y and covinv are a batch (e.g. toys); same outputs as lmin
+
+def glsmin(A, y, covinv):
+    
+    At = np.swapaxes(A, -1, -2)
+    AtCinv = np.matmul(At, covinv)
+    chol = jax.scipy.linalg.cho_factor(np.matmul(AtCinv, A))
+    b = np.matmul(AtCinv, y[...,np.newaxis])
+    x = np.squeeze(jax.scipy.linalg.cho_solve(chol, b), axis=-1)
+    #hessian of the chi2 = 2*A^T covinv A, the covariance follows the 0.5*inverse hessian convention of lmin
+    cov = 0.25*jax.scipy.linalg.cho_solve(chol, np.broadcast_to(np.eye(A.shape[-1], dtype=A.dtype), chol[0].shape))
+    
+    diff = y - np.squeeze(np.matmul(A, x[...,np.newaxis]), axis=-1)
+    chi2 = np.sum(diff*np.squeeze(np.matmul(covinv, diff[...,np.newaxis]), axis=-1), axis=-1)
+    
+    return x, cov, chi2
+
 def piter(f, x, trust_radius, args):
 
         fg = jax.value_and_grad(f)
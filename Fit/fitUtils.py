@@ -14,9 +14,16 @@ from root_numpy import hist2array
 import sys
 sys.path.append('../Common/data')
 import h5py
+import os
+import json
+import hashlib
+from templateStore import templateStore
+from shapeWriter import shapeWriter, compressionFilter
+from sparseExport import writeSparseInput
+from systMap import systMap
 
 class fitUtils:
-    def __init__(self, channels =["WPlus_preVFP","WPlus_postVFP"], doSyst=False, idx=10):
+    def __init__(self, channels =["WPlus_preVFP","WPlus_postVFP"], doSyst=False, idx=10, maxBytes=1<<31):
         
         self.doSyst = doSyst
         self.processes = []
@@ -47,8 +54,8 @@ class fitUtils:
         self.qtBinsC = 0.5*(self.qtBins[1:]+self.qtBins[:-1])
         print(len(self.yBinsC),len(self.qtBinsC))
 
-        # load files
-        self.ftempl = {}
+        # open files: the templates are read lazily, slice by slice, through the store
+        self.ftempl = templateStore(maxBytes)
         self.data = {}
         self.templ = {}
         self.templw2 = {}
@@ -71,35 +78,37 @@ class fitUtils:
         self.fakeshigh = {}
         self.fakeshighw2 = {}
         self.templSFStat ={} 
+        acc = {-3: self.threshold_y, -2: self.threshold_qt}
+        accVars = {-4: self.threshold_y, -3: self.threshold_qt}
         for chan in self.channels:
-            self.ftempl[chan] = h5py.File('../Common/shapes{}.hdf5'.format(chan), mode='r+')
-            self.data[chan] = self.ftempl[chan]['data_obs'][:]
+            self.ftempl.open(chan, '../Common/shapes{}.hdf5'.format(chan))
+            self.data[chan] = self.ftempl.histo(chan, 'data_obs')
             print(chan,'events in data:', np.sum(self.data[chan][:,:,-1,0,...]))
-            self.templ[chan] = self.ftempl[chan]['template'][...,:self.threshold_y,:self.threshold_qt,:]
+            self.templ[chan] = self.ftempl.histo(chan, 'template', acc)
             print(chan,'events in signal templ:', np.sum(self.templ[chan][:,:,-1,0,...]))
-            self.templw2[chan] = self.ftempl[chan]['template_sumw2'][...,:self.threshold_y,:self.threshold_qt,:]
-            self.gen[chan] = self.ftempl[chan]['helicity'][:]
-            self.lowacc[chan] = self.ftempl[chan]['lowacc'][:]
+            self.templw2[chan] = self.ftempl.histo(chan, 'template_sumw2', acc)
+            self.gen[chan] = self.ftempl.histo(chan, 'helicity')
+            self.lowacc[chan] = self.ftempl.histo(chan, 'lowacc')
             print(chan,'events in low acc templ:', np.sum(self.lowacc[chan][:,:,-1,0,...]))
-            self.lowaccw2[chan] = self.ftempl[chan]['lowacc_sumw2'][:]
-            self.Wtau[chan] = self.ftempl[chan]['Wtau'][:]
+            self.lowaccw2[chan] = self.ftempl.histo(chan, 'lowacc_sumw2')
+            self.Wtau[chan] = self.ftempl.histo(chan, 'Wtau')
             print(chan,'events in tau templ:', np.sum(self.Wtau[chan][:,:,-1,0,...]))
-            self.Wtauw2[chan] = self.ftempl[chan]['Wtau_sumw2'][:]
-            self.DY[chan] = self.ftempl[chan]['DY'][:]
+            self.Wtauw2[chan] = self.ftempl.histo(chan, 'Wtau_sumw2')
+            self.DY[chan] = self.ftempl.histo(chan, 'DY')
             print(chan,'events in dy templ:', np.sum(self.DY[chan][:,:,-1,0,...]))
-            self.DYw2[chan] = self.ftempl[chan]['DY_sumw2'][:]
-            self.Top[chan] = self.ftempl[chan]['Top'][:]
+            self.DYw2[chan] = self.ftempl.histo(chan, 'DY_sumw2')
+            self.Top[chan] = self.ftempl.histo(chan, 'Top')
             print(chan,'events in top templ:', np.sum(self.Top[chan][:,:,-1,0,...]))
-            self.Topw2[chan] = self.ftempl[chan]['Top_sumw2'][:]
-            self.Diboson[chan] = self.ftempl[chan]['Diboson'][:]
+            self.Topw2[chan] = self.ftempl.histo(chan, 'Top_sumw2')
+            self.Diboson[chan] = self.ftempl.histo(chan, 'Diboson')
             print(chan,'events in diboson templ:', np.sum(self.Diboson[chan][:,:,-1,0,...]))
-            self.Dibosonw2[chan] = self.ftempl[chan]['Diboson_sumw2'][:]
-            self.fakeslow[chan] = self.ftempl[chan]['fakesLowMt'][:]
-            self.fakesloww2[chan] = self.ftempl[chan]['fakesLowMt_sumw2'][:]
-            self.fakeshigh[chan] = self.ftempl[chan]['fakesHighMt'][:]
+            self.Dibosonw2[chan] = self.ftempl.histo(chan, 'Diboson_sumw2')
+            self.fakeslow[chan] = self.ftempl.histo(chan, 'fakesLowMt')
+            self.fakesloww2[chan] = self.ftempl.histo(chan, 'fakesLowMt_sumw2')
+            self.fakeshigh[chan] = self.ftempl.histo(chan, 'fakesHighMt')
             # print(chan,'events in fakes templ:', np.sum(self.fakeshigh[chan][:,:,-1,0,...]))
-            self.fakeshighw2[chan] = self.ftempl[chan]['fakesHighMt_sumw2'][:]
-            self.templSFStat[chan]=self.ftempl[chan]['template_SFStatvar'][...,:self.threshold_y,:self.threshold_qt,:,:]
+            self.fakeshighw2[chan] = self.ftempl.histo(chan, 'fakesHighMt_sumw2')
+            self.templSFStat[chan]=self.ftempl.histo(chan, 'template_SFStatvar', accVars)
 
         
     # def fillProcessList(self):
@@ -142,172 +151,89 @@ class fitUtils:
         down*=np.reciprocal(ratio)
         return up,down
     
-    def decorrelateSFSyst(self, nominal, rawvarsUp, rawvarsDown):
-        ptBins_SF = np.array([25.0, 26.0, 28.0, 30.0, 32.0, 34.0, 36.0, 38.0, 40.0, 42.0, 44.0, 47.0, 50.0, 55.0])
-        # ptBins_SF = np.array([25.0, 55.0])
-        vars=np.zeros((48,60,2,2,6,8,9,624,2))
-        isyst=0
-        for j in range(48): # for each eta bin
-            for i in range(len(ptBins_SF)-1): #create one histogram per variation in each macro bin of SF
-                threshold1 = np.digitize(ptBins_SF[i],self.ptBins)-1
-                threshold2 = np.digitize(ptBins_SF[i+1],self.ptBins)-1
-                # print(threshold1,threshold2,self.ptBins[threshold1:threshold2+1])
-                tmpUp = np.zeros_like(nominal)
-                np.copyto(tmpUp,nominal) #numpy.copyto(dst, src)
-                tmpUp[j,threshold1:threshold2+1,...]=rawvarsUp[j,threshold1:threshold2+1,...]
-                # tmpUp[...]=rawvarsUp[...]
-                vars[...,isyst,0]=tmpUp
-                tmpDown = np.zeros_like(nominal)
-                np.copyto(tmpDown,nominal) #numpy.copyto(dst, src)
-                tmpDown[j,threshold1:threshold2+1,...]=rawvarsDown[j,threshold1:threshold2+1,...]
-                # tmpDown[...]=rawvarsDown[...]
-                vars[...,isyst,1]=tmpDown
-                isyst=isyst+1
-        print('end SF decorrelation')
-        return vars
-    
-    def decorrelateSFSystBkg(self, nominal, rawvarsUp, rawvarsDown):
+    def SFBlocks(self):
+        # (eta bin, pt range) of each SF nuisance: one per eta bin and SF pt bin
         ptBins_SF = np.array([25.0, 26.0, 28.0, 30.0, 32.0, 34.0, 36.0, 38.0, 40.0, 42.0, 44.0, 47.0, 50.0, 55.0])
         # ptBins_SF = np.array([25.0, 55.0])
-        vars=np.zeros((48,60,2,2,624,2))
-        isyst=0
+        blocks = []
         for j in range(48): # for each eta bin
-            for i in range(len(ptBins_SF)-1): #create one histogram per variation in each macro bin of SF
+            for i in range(len(ptBins_SF)-1):
                 threshold1 = np.digitize(ptBins_SF[i],self.ptBins)-1
                 threshold2 = np.digitize(ptBins_SF[i+1],self.ptBins)-1
-                # print(threshold1,threshold2,self.ptBins[threshold1:threshold2+1])
-                tmpUp = np.zeros_like(nominal)
-                np.copyto(tmpUp,nominal) #numpy.copyto(dst, src)
-                tmpUp[j,threshold1:threshold2+1,...]=rawvarsUp[j,threshold1:threshold2+1,...]
-                # tmpUp[...]=rawvarsUp[...]
-                vars[...,isyst,0]=tmpUp
-                tmpDown = np.zeros_like(nominal)
-                np.copyto(tmpDown,nominal) #numpy.copyto(dst, src)
-                tmpDown[j,threshold1:threshold2+1,...]=rawvarsDown[j,threshold1:threshold2+1,...]
-                # tmpDown[...]=rawvarsDown[...]
-                vars[...,isyst,1]=tmpDown
-                isyst=isyst+1
-        print('end SF decorrelation')
-        return vars
-
-    def shapeFile(self):
+                blocks.append((j, slice(threshold1,threshold2+1)))
+        return blocks
+
+    def decorrelateSFSyst(self, nominal, rawvarsUp, rawvarsDown):
+        # each variation differs from nominal only in its (eta, pt range) block:
+        # yield (isyst, up, down) with the block swapped into two reused buffers,
+        # which are overwritten at the next step and must be written out before
+        up = np.array(nominal, dtype='float64')
+        down = np.array(nominal, dtype='float64')
+        for isyst, (j, pt) in enumerate(self.SFBlocks()):
+            up[j,pt,...] = rawvarsUp[j,pt,...]
+            down[j,pt,...] = rawvarsDown[j,pt,...]
+            yield isyst, up, down
+            up[j,pt,...] = nominal[j,pt,...]
+            down[j,pt,...] = nominal[j,pt,...]
+
+    def writeSFStat(self, f, proc, nominal, SFStat, compression):
+        # SFall (stat. variations 0,1) and SFiso (2,3) decorrelated in (eta, pt)
+        for label, ivar in [('all',0),('iso',2)]:
+            for isyst, up, down in self.decorrelateSFSyst(nominal, SFStat[...,ivar], SFStat[...,ivar+1]):
+                dset_templ = f.create_dataset('{}_SF{}{}Up'.format(proc,label,isyst), up.ravel().shape, dtype='float64',compression=compression)
+                dset_templ[...] = up.ravel()
+                dset_templ = f.create_dataset('{}_SF{}{}Down'.format(proc,label,isyst), down.ravel().shape, dtype='float64',compression=compression)
+                dset_templ[...] = down.ravel()
+
+    def signalVariations(self, chan, iy, iqt, decorrelateSF=False):
+        # (suffix, (iy, iqt) hyperslab [..., coeff], stored with the sign flip) for each signal shape,
+        # read through the store so that each variation histogram is read once per (y, qt) bin
+        acc = {-3: self.threshold_y, -2: self.threshold_qt}
+        accVars = {-4: self.threshold_y, -3: self.threshold_qt}
+        templ = self.templ[chan][..., iy, iqt, :]
+        yield '', templ, True
+        yield '_sumw2', self.templw2[chan][..., iy, iqt, :], False
+        templ_mass = self.ftempl.histo(chan, 'template_mass', accVars)
+        yield '_massUp', templ_mass[..., iy, iqt, :, 0], True
+        yield '_massDown', templ_mass[..., iy, iqt, :, 1], True
+        templSFStat = self.templSFStat[chan]
+        yield '_SFallUp', templSFStat[..., iy, iqt, :, 0], False
+        yield '_SFallDown', templSFStat[..., iy, iqt, :, 1], False
+        yield '_SFisoUp', templSFStat[..., iy, iqt, :, 2], False
+        yield '_SFisoDown', templSFStat[..., iy, iqt, :, 3], False
+        up,down = self.mirrorShape(templ,self.ftempl.histo(chan, 'template_SFSystvar', acc)[..., iy, iqt, :])
+        yield '_SFSystUp', up, True
+        yield '_SFSystDown', down, True
+        del up,down
+        templ_prefire = self.ftempl.histo(chan, 'template_prefireVars', accVars)
+        yield '_prefireUp', templ_prefire[..., iy, iqt, :, 0], True
+        yield '_prefireDown', templ_prefire[..., iy, iqt, :, 1], True
+        for suffix,name in [('_jesUp','template_jesTotalUp'),('_jesDown','template_jesTotalDown'),('_unclUp','template_unclustEnUp'),('_unclDown','template_unclustEnDown')]:
+            yield suffix, self.ftempl.histo(chan, name, acc)[..., iy, iqt, :], True
+        if decorrelateSF:
+            for label, ivar in [('all',0),('iso',2)]:
+                for isyst, up, down in self.decorrelateSFSyst(templ, templSFStat[..., iy, iqt, :, ivar], templSFStat[..., iy, iqt, :, ivar+1]):
+                    yield '_SF{}{}Up'.format(label,isyst), up, True
+                    yield '_SF{}{}Down'.format(label,isyst), down, True
+
+    def shapeFile(self, compression="gzip", decorrelateSF=False, namedShapes=False):
+        # namedShapes: also write every signal shape as a dataset of its own (a virtual one
+        # on its packed row), for text2hdf5_npinput.py which reads the shapes by name
         dtype = 'float64'
-        compression = "gzip"
+        signals = [proc for proc in self.processes if "helXsecs" in proc]
+        # (y, qt, coeff) bin of each signal process
+        bins = [(int(proc.split('_')[2]), int(proc.split('_')[4]), self.helXsecs.index(proc.split('_')[0].replace('helXsecs',''))) for proc in signals]
+        compression = compressionFilter(compression)
         for chan in self.channels:
-            templ_mass = self.ftempl[chan]['template_mass'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            templ_SFSyst = self.ftempl[chan]['template_SFSystvar'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            templ_prefire = self.ftempl[chan]['template_prefireVars'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            templ_jesUp = self.ftempl[chan]['template_jesTotalUp'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            templ_jesDown = self.ftempl[chan]['template_jesTotalDown'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            templ_unclUp = self.ftempl[chan]['template_unclustEnUp'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            templ_unclDown = self.ftempl[chan]['template_unclustEnDown'][...,:self.threshold_y,:self.threshold_qt,:,:]
-            # shape_chan_SFStat = self.decorrelateSFSyst(self.templ[chan], self.templSFStat[chan][...,0], self.templSFStat[chan][...,1])
-            # shape_chan_SFStat_iso = self.decorrelateSFSyst(self.templ[chan], self.templSFStat[chan][...,2], self.templSFStat[chan][...,3])
+            flip = [proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan for proc in signals]
             with h5py.File('{}.hdf5'.format(chan), mode="w") as f:
-                for proc in self.processes:
-                    if "helXsecs" in proc:
-                        coeff = self.helXsecs.index(proc.split('_')[0].replace('helXsecs',''))
-                        iY = int(proc.split('_')[2])
-                        iQt = int(proc.split('_')[4])
-                        # print(chan,proc,self.templ[chan].shape)
-                        dset_templ = f.create_dataset(proc, self.templ[chan][...,iY,iQt,coeff].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*self.templ[chan][...,iY,iQt,coeff].ravel()
-                        else:
-                            dset_templ[...] = self.templ[chan][...,iY,iQt,coeff].ravel()
-                        dset_templw2 = f.create_dataset(proc+'_sumw2', self.templw2[chan][...,iY,iQt,coeff].ravel().shape, dtype=dtype,compression=compression)
-                        dset_templw2[...] = self.templw2[chan][...,iY,iQt,coeff].ravel()
-                        # mass
-                        dset_templ = f.create_dataset(proc+'_massUp', templ_mass[...,iY,iQt,coeff,0].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_mass[...,iY,iQt,coeff,0].ravel()
-                        else:
-                            dset_templ[...] = templ_mass[...,iY,iQt,coeff,0].ravel()
-                        dset_templ = f.create_dataset(proc+'_massDown', templ_mass[...,iY,iQt,coeff,1].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_mass[...,iY,iQt,coeff,1].ravel()
-                        else:
-                            dset_templ[...] = templ_mass[...,iY,iQt,coeff,1].ravel()
-                        # # SF
-                        # for iSF in range(shape_chan_SFStat.shape[-2]):
-                        #     dset_templ = f.create_dataset(proc+'_SFall{}Up'.format(iSF), shape_chan_SFStat[...,iY,iQt,coeff,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                        #     if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                        #         dset_templ[...] = -1*shape_chan_SFStat[...,iY,iQt,coeff,iSF,0].ravel()
-                        #     else:
-                        #         dset_templ[...] = shape_chan_SFStat[...,iY,iQt,coeff,iSF,0].ravel()
-                        #     dset_templ = f.create_dataset(proc+'_SFall{}Down'.format(iSF), shape_chan_SFStat[...,iY,iQt,coeff,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                        #     if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                        #         dset_templ[...] = -1*shape_chan_SFStat[...,iY,iQt,coeff,iSF,1].ravel()
-                        #     else:
-                        #         dset_templ[...] = shape_chan_SFStat[...,iY,iQt,coeff,iSF,1].ravel()
-                            
-                        #     dset_templ = f.create_dataset(proc+'_SFiso{}Up'.format(iSF), shape_chan_SFStat_iso[...,iY,iQt,coeff,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                        #     if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                        #         dset_templ[...] = -1*shape_chan_SFStat_iso[...,iY,iQt,coeff,iSF,0].ravel()
-                        #     else:
-                        #         dset_templ[...] = shape_chan_SFStat_iso[...,iY,iQt,coeff,iSF,0].ravel()
-                        #     dset_templ = f.create_dataset(proc+'_SFiso{}Down'.format(iSF), shape_chan_SFStat_iso[...,iY,iQt,coeff,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                        #     if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                        #         dset_templ[...] = -1*shape_chan_SFStat_iso[...,iY,iQt,coeff,iSF,1].ravel()
-                        #     else:
-                        #         dset_templ[...] = shape_chan_SFStat_iso[...,iY,iQt,coeff,iSF,1].ravel()
-                        # print(proc, self.templSFStat[chan].shape)
-                        dset_templ = f.create_dataset(proc+'_SFallUp', self.templSFStat[chan][...,iY,iQt,coeff,0].ravel().shape, dtype=dtype,compression=compression)
-                        dset_templ[...] = self.templSFStat[chan][...,iY,iQt,coeff,0].ravel()
-                        dset_templ = f.create_dataset(proc+'_SFallDown', self.templSFStat[chan][...,iY,iQt,coeff,1].ravel().shape, dtype=dtype,compression=compression)
-                        dset_templ[...] = self.templSFStat[chan][...,iY,iQt,coeff,1].ravel()
-                            
-                        dset_templ = f.create_dataset(proc+'_SFisoUp', self.templSFStat[chan][...,iY,iQt,coeff,2].ravel().shape, dtype=dtype,compression=compression)
-                        dset_templ[...] = self.templSFStat[chan][...,iY,iQt,coeff,2].ravel()
-                        dset_templ = f.create_dataset(proc+'_SFisoDown', self.templSFStat[chan][...,iY,iQt,coeff,3].ravel().shape, dtype=dtype,compression=compression)
-                        dset_templ[...] = self.templSFStat[chan][...,iY,iQt,coeff,3].ravel()
-                        # SFSyst
-                        nominal = self.templ[chan][...,iY,iQt,coeff][:].ravel()
-                        alternate = templ_SFSyst[...,iY,iQt,coeff].ravel()
-                        up,down = self.mirrorShape(nominal,alternate)
-                        dset_templ = f.create_dataset(proc+'_SFSystUp', alternate.ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*up.ravel()
-                        else:
-                            dset_templ[...] = up.ravel()
-                        dset_templ = f.create_dataset(proc+'_SFSystDown', down.shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*down
-                        else:
-                            dset_templ[...] = down
-                        # prefire
-                        dset_templ = f.create_dataset(proc+'_prefireUp', templ_prefire[...,iY,iQt,coeff,0].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_prefire[...,iY,iQt,coeff,0].ravel()
-                        else:
-                            dset_templ[...] = templ_prefire[...,iY,iQt,coeff,0].ravel()
-                        dset_templ = f.create_dataset(proc+'_prefireDown', templ_prefire[...,iY,iQt,coeff,1].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_prefire[...,iY,iQt,coeff,1].ravel()
-                        else:
-                            dset_templ[...] = templ_prefire[...,iY,iQt,coeff,1].ravel()
-                        # JEC
-                        dset_templ = f.create_dataset(proc+'_jesUp', templ_jesUp[...,iY,iQt,coeff].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_jesUp[...,iY,iQt,coeff].ravel()
-                        else:
-                            dset_templ[...] = templ_jesUp[...,iY,iQt,coeff].ravel()
-                        dset_templ = f.create_dataset(proc+'_jesDown', templ_jesDown[...,iY,iQt,coeff].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_jesDown[...,iY,iQt,coeff].ravel()
-                        else:
-                            dset_templ[...] = templ_jesDown[...,iY,iQt,coeff].ravel()
-                        
-                        dset_templ = f.create_dataset(proc+'_unclUp', templ_unclUp[...,iY,iQt,coeff].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_unclUp[...,iY,iQt,coeff].ravel()
-                        else:
-                            dset_templ[...] = templ_unclUp[...,iY,iQt,coeff].ravel()
-                        dset_templ = f.create_dataset(proc+'_unclDown', templ_unclDown[...,iY,iQt,coeff].ravel().shape, dtype=dtype,compression=compression)
-                        if proc=='helXsecsA_y_2_qt_5' and 'WPlus_preVFP' in chan:
-                            dset_templ[...] = -1*templ_unclDown[...,iY,iQt,coeff].ravel()
-                        else:
-                            dset_templ[...] = templ_unclDown[...,iY,iQt,coeff].ravel()
+                writer = shapeWriter(f, signals, bins, flip, compression, dtype, namedShapes)
+                for iy, iqt in writer.slabs():
+                    for suffix, slab, sign in self.signalVariations(chan, iy, iqt, decorrelateSF):
+                        writer.addSlab(suffix, iy, iqt, slab, sign)
+                    # the hyperslabs of this (y, qt) bin are not needed anymore
+                    self.ftempl.clear()
+                writer.writeIndex()
 
                 dset_data = f.create_dataset('data_obs', self.data[chan][...].ravel().shape, dtype=dtype,compression=compression)
                 dset_data[...] = self.data[chan][...].ravel()
@@ -317,9 +243,10 @@ class fitUtils:
                 dset_bkgw2 = f.create_dataset("DY_sumw2", self.DYw2[chan][...].ravel().shape, dtype=dtype,compression=compression)
                 dset_bkgw2[...] = self.DYw2[chan][...].ravel()
                 # pdf variations
+                pdf = self.ftempl.histo(chan, 'DY_LHEPdfWeight', trailing=1)
                 for k in range(1,103):
                     nominal = self.DY[chan][...]
-                    alternate = self.ftempl[chan]['DY_LHEPdfWeight'][...,k]
+                    alternate = pdf[...,k]
                     up,down = self.mirrorShape(nominal,alternate)
                     dset_templ = f.create_dataset("DY_pdf{}Up".format(k), up.ravel().shape, dtype=dtype,compression=compression)
                     dset_templ[...] = up.ravel()
@@ -329,19 +256,8 @@ class fitUtils:
                 for j,syst in self.qcdsyst.items():
                     dset_bkg = f.create_dataset(name='DY_{}'.format(syst), shape=self.ftempl[chan]['DY_LHEScaleWeight'][...,j].ravel().shape, dtype='float64')
                     dset_bkg[...] = self.ftempl[chan]['DY_LHEScaleWeight'][...,j].ravel()
-                # #SF
-                # shape_chan_SFStat = self.decorrelateSFSystBkg(self.DY[chan], self.ftempl[chan]['DY_SFStatvar'][...,0], self.ftempl[chan]['DY_SFStatvar'][...,1])
-                # shape_chan_SFStat_iso = self.decorrelateSFSystBkg(self.DY[chan], self.ftempl[chan]['DY_SFStatvar'][...,2], self.ftempl[chan]['DY_SFStatvar'][...,3])
-                # for iSF in range(shape_chan_SFStat.shape[-2]):
-                #     dset_templ = f.create_dataset('DY_SFall{}Up'.format(iSF), shape_chan_SFStat[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('DY_SFall{}Down'.format(iSF), shape_chan_SFStat[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,1].ravel()
-                                                
-                #     dset_templ = f.create_dataset('DY_SFiso{}Up'.format(iSF), shape_chan_SFStat_iso[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('DY_SFiso{}Down'.format(iSF), shape_chan_SFStat_iso[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,1].ravel()
+                if decorrelateSF:
+                    self.writeSFStat(f, 'DY', self.DY[chan][...], self.ftempl[chan]['DY_SFStatvar'][:], compression)
                 # SFSyst
                 nominal = self.DY[chan][...].ravel()
                 alternate = self.ftempl[chan]['DY_SFSystvar'][:].ravel()
@@ -369,19 +285,8 @@ class fitUtils:
                 dset_bkg[...] = self.Diboson[chan][...].ravel()
                 dset_bkgw2 = f.create_dataset("Diboson_sumw2", self.Dibosonw2[chan][...].ravel().shape, dtype=dtype,      compression=compression)
                 dset_bkgw2[...] = self.Dibosonw2[chan][...].ravel()
-                # #SF
-                # shape_chan_SFStat = self.decorrelateSFSystBkg(self.Diboson[chan], self.ftempl[chan]['Diboson_SFStatvar'][...,0], self.ftempl[chan]['Diboson_SFStatvar'][...,1])
-                # shape_chan_SFStat_iso = self.decorrelateSFSystBkg(self.Diboson[chan], self.ftempl[chan]['Diboson_SFStatvar'][...,2], self.ftempl[chan]['Diboson_SFStatvar'][...,3])
-                # for iSF in range(shape_chan_SFStat.shape[-2]):
-                #     dset_templ = f.create_dataset('Diboson_SFall{}Up'.format(iSF), shape_chan_SFStat[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('Diboson_SFall{}Down'.format(iSF), shape_chan_SFStat[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,1].ravel()
-                                                
-                #     dset_templ = f.create_dataset('Diboson_SFiso{}Up'.format(iSF), shape_chan_SFStat_iso[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('Diboson_SFiso{}Down'.format(iSF), shape_chan_SFStat_iso[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,1].ravel()
+                if decorrelateSF:
+                    self.writeSFStat(f, 'Diboson', self.Diboson[chan][...], self.ftempl[chan]['Diboson_SFStatvar'][:], compression)
                 # SFSyst
                 nominal = self.Diboson[chan][...].ravel()
                 alternate = self.ftempl[chan]['Diboson_SFSystvar'][:].ravel()
@@ -409,19 +314,8 @@ class fitUtils:
                 dset_bkg[...] = self.Top[chan][...].ravel()
                 dset_bkgw2 = f.create_dataset("Top_sumw2", self.Topw2[chan][...].ravel().shape, dtype=dtype,      compression=compression)
                 dset_bkgw2[...] = self.Topw2[chan][...].ravel()
-                # #SF
-                # shape_chan_SFStat = self.decorrelateSFSystBkg(self.Top[chan], self.ftempl[chan]['Top_SFStatvar'][...,0], self.ftempl[chan]['Top_SFStatvar'][...,1])
-                # shape_chan_SFStat_iso = self.decorrelateSFSystBkg(self.Top[chan], self.ftempl[chan]['Top_SFStatvar'][...,2], self.ftempl[chan]['Top_SFStatvar'][...,3])
-                # for iSF in range(shape_chan_SFStat.shape[-2]):
-                #     dset_templ = f.create_dataset('Top_SFall{}Up'.format(iSF), shape_chan_SFStat[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('Top_SFall{}Down'.format(iSF), shape_chan_SFStat[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,1].ravel()
-                                                
-                #     dset_templ = f.create_dataset('Top_SFiso{}Up'.format(iSF), shape_chan_SFStat_iso[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('Top_SFiso{}Down'.format(iSF), shape_chan_SFStat_iso[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,1].ravel()
+                if decorrelateSF:
+                    self.writeSFStat(f, 'Top', self.Top[chan][...], self.ftempl[chan]['Top_SFStatvar'][:], compression)
                 # SFSyst
                 nominal = self.Top[chan][...].ravel()
                 alternate = self.ftempl[chan]['Top_SFSystvar'][:].ravel()
@@ -450,9 +344,10 @@ class fitUtils:
                 dset_bkgw2 = f.create_dataset("Wtau_sumw2", self.Wtauw2[chan][...].ravel().shape, dtype=dtype,        compression=compression)
                 dset_bkgw2[...] = self.Wtauw2[chan][...].ravel()
                 # pdf variations
+                pdf = self.ftempl.histo(chan, 'Wtau_LHEPdfWeight', trailing=1)
                 for k in range(1,103):
                     nominal = self.Wtau[chan][...]
-                    alternate = self.ftempl[chan]['Wtau_LHEPdfWeight'][...,k]
+                    alternate = pdf[...,k]
                     up,down = self.mirrorShape(nominal,alternate)
                     dset_templ = f.create_dataset("Wtau_pdf{}Up".format(k), up.ravel().shape, dtype=dtype,compression=compression)
                     dset_templ[...] = up.ravel()
@@ -462,19 +357,8 @@ class fitUtils:
                 for j,syst in self.qcdsyst.items():
                     dset_bkg = f.create_dataset(name='Wtau_{}'.format(syst), shape=self.ftempl[chan]['Wtau_LHEScaleWeight'][...,j].ravel().shape, dtype='float64')
                     dset_bkg[...] = self.ftempl[chan]['Wtau_LHEScaleWeight'][...,j].ravel()
-                # #SF
-                # shape_chan_SFStat = self.decorrelateSFSystBkg(self.Wtau[chan], self.ftempl[chan]['Wtau_SFStatvar'][...,0], self.ftempl[chan]['Wtau_SFStatvar'][...,1])
-                # shape_chan_SFStat_iso = self.decorrelateSFSystBkg(self.Wtau[chan], self.ftempl[chan]['Wtau_SFStatvar'][...,2], self.ftempl[chan]['Wtau_SFStatvar'][...,3])
-                # for iSF in range(shape_chan_SFStat.shape[-2]):
-                #     dset_templ = f.create_dataset('Wtau_SFall{}Up'.format(iSF), shape_chan_SFStat[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('Wtau_SFall{}Down'.format(iSF), shape_chan_SFStat[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,1].ravel()
-                                                
-                #     dset_templ = f.create_dataset('Wtau_SFiso{}Up'.format(iSF), shape_chan_SFStat_iso[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('Wtau_SFiso{}Down'.format(iSF), shape_chan_SFStat_iso[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,1].ravel()
+                if decorrelateSF:
+                    self.writeSFStat(f, 'Wtau', self.Wtau[chan][...], self.ftempl[chan]['Wtau_SFStatvar'][:], compression)
                 # SFSyst
                 nominal = self.Wtau[chan][...].ravel()
                 alternate = self.ftempl[chan]['Wtau_SFSystvar'][:].ravel()
@@ -498,15 +382,15 @@ class fitUtils:
                 dset_bkg = f.create_dataset("Wtau_unclDown", self.ftempl[chan]['Wtau_unclustEnDown'][:].ravel().shape, dtype=dtype,compression=compression)
                 dset_bkg[...] = self.ftempl[chan]['Wtau_unclustEnDown'][:].ravel()
 
-                dset_bkg = f.create_dataset("fakesLowMt", self.fakeslow[chan].ravel().shape, dtype=dtype,     compression=compression)
-                dset_bkg[...] = self.fakeslow[chan].ravel()
-                dset_bkgw2 = f.create_dataset("fakesLowMt_sumw2", self.fakesloww2[chan].ravel().shape, dtype=dtype,       compression=compression)
-                dset_bkgw2[...] = self.fakesloww2[chan].ravel()
+                dset_bkg = f.create_dataset("fakesLowMt", self.fakeslow[chan][...].ravel().shape, dtype=dtype,     compression=compression)
+                dset_bkg[...] = self.fakeslow[chan][...].ravel()
+                dset_bkgw2 = f.create_dataset("fakesLowMt_sumw2", self.fakesloww2[chan][...].ravel().shape, dtype=dtype,       compression=compression)
+                dset_bkgw2[...] = self.fakesloww2[chan][...].ravel()
 
-                dset_bkg = f.create_dataset("fakesHighMt", self.fakeshigh[chan].ravel().shape, dtype=dtype,       compression=compression)
-                dset_bkg[...] = self.fakeshigh[chan].ravel()
-                dset_bkgw2 = f.create_dataset("fakesHighMt_sumw2", self.fakeshighw2[chan].ravel().shape, dtype=dtype,     compression=compression)
-                dset_bkgw2[...] = self.fakeshighw2[chan].ravel()
+                dset_bkg = f.create_dataset("fakesHighMt", self.fakeshigh[chan][...].ravel().shape, dtype=dtype,       compression=compression)
+                dset_bkg[...] = self.fakeshigh[chan][...].ravel()
+                dset_bkgw2 = f.create_dataset("fakesHighMt_sumw2", self.fakeshighw2[chan][...].ravel().shape, dtype=dtype,     compression=compression)
+                dset_bkgw2[...] = self.fakeshighw2[chan][...].ravel()
 
                 dset_bkg = f.create_dataset("LowAcc", self.lowacc[chan][...].ravel().shape, dtype=dtype,     compression=compression)
                 dset_bkg[...] = self.lowacc[chan][...].ravel()
@@ -553,19 +437,8 @@ class fitUtils:
                 dset_bkg[...] = np.sum(self.ftempl[chan]['lowacc_unclustEnUp'][:],axis=-1).ravel()
                 dset_bkg = f.create_dataset("LowAcc_unclDown", np.sum(self.ftempl[chan]['lowacc_unclustEnDown'][:],axis=-1).ravel().shape, dtype=dtype,compression=compression)
                 dset_bkg[...] = np.sum(self.ftempl[chan]['lowacc_unclustEnDown'][:],axis=-1).ravel()
-                # #SF
-                # shape_chan_SFStat = self.decorrelateSFSystBkg(self.lowacc[chan], self.ftempl[chan]['lowacc_SFStatvar'][...,0], self.ftempl[chan]['lowacc_SFStatvar'][...,1])
-                # shape_chan_SFStat_iso = self.decorrelateSFSystBkg(self.lowacc[chan], self.ftempl[chan]['lowacc_SFStatvar'][...,2], self.ftempl[chan]['lowacc_SFStatvar'][...,3])
-                # for iSF in range(shape_chan_SFStat.shape[-2]):
-                #     dset_templ = f.create_dataset('LowAcc_SFall{}Up'.format(iSF), shape_chan_SFStat[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('LowAcc_SFall{}Down'.format(iSF), shape_chan_SFStat[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat[...,iSF,1].ravel()
-                                                
-                #     dset_templ = f.create_dataset('LowAcc_SFiso{}Up'.format(iSF), shape_chan_SFStat_iso[...,iSF,0].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,0].ravel()
-                #     dset_templ = f.create_dataset('LowAcc_SFiso{}Down'.format(iSF), shape_chan_SFStat_iso[...,iSF,1].ravel().shape, dtype=dtype,compression=compression)
-                #     dset_templ[...] = shape_chan_SFStat_iso[...,iSF,1].ravel()
+                if decorrelateSF:
+                    self.writeSFStat(f, 'LowAcc', self.lowacc[chan][...], self.ftempl[chan]['lowacc_SFStatvar'][:], compression)
                 # SFSyst
                 nominal = self.lowacc[chan][...].ravel()
                 alternate = self.ftempl[chan]['lowacc_SFSystvar'][:].ravel()
@@ -590,6 +463,7 @@ class fitUtils:
                         histo = self.ftempl[chan]['fakesHighMt_fakeShapeBin{}{}'.format(i,type)][:]
                         dset = f.create_dataset(name='fakesHighMt_fakeShapeBin{}{}'.format(i,type), shape=histo.ravel ().shape, dtype=dtype,compression=compression)
                         dset[...] = histo.ravel()
+            self.ftempl.clear()
 
     def maskedChannels(self):
         dtype = 'float64'
@@ -614,19 +488,72 @@ class fitUtils:
                 dset_masked = f.create_dataset("data_obs", [1], dtype=dtype,compression=compression)
                 dset_masked[...] = 1.
 
-    def setPreconditionVec(self):
-        f=h5py.File('fitresults_WPlus_blockAi_260292.hdf5', 'r')
-        hessian = f['hess'][:]
-        eig, U = np.linalg.eigh(hessian)
-        M1 = np.matmul(np.diag(1./np.sqrt(eig)),U.T)
-        # print(M1,np.linalg.inv(np.linalg.inv(M1)))
+    def preconditionerKey(self, hessFile, mode):
+        # process list, shapes files and hessian the preconditioner is computed from
+        h = hashlib.sha1()
+        h.update(json.dumps([self.processes, self.signals, mode]).encode())
+        for chan in self.channels:
+            st = os.stat(self.ftempl[chan].filename)
+            h.update('{} {} {}'.format(chan, st.st_size, st.st_mtime).encode())
+        if os.path.exists(hessFile):
+            with open(hessFile, 'rb') as f:
+                for block in iter(lambda: f.read(1<<24), b''):
+                    h.update(block)
+        return h.hexdigest()[:16]
+
+    def signalBlocks(self):
+        # indices of the signals of each (y, qt) bin
+        blocks = OrderedDict()
+        for isig, proc in enumerate(self.signals):
+            blocks.setdefault('_'.join(proc.split('_')[1:5]), []).append(isig)
+        return list(blocks.values())
+
+    def setPreconditionVec(self, hessFile='fitresults_WPlus_blockAi_260292.hdf5', mode='full', cacheDir='.'):
+        # M1 = diag(1/sqrt(eig)) U^T from the eigendecomposition of the hessian of a
+        # previous fit, and its inverse U diag(sqrt(eig)) from the same decomposition.
+        # mode 'block' only uses the (y, qt) blocks of the hessian; without a hessian
+        # for these signals the preconditioner is the identity (block by block with
+        # 'block', for the signals the hessian does not have)
+        cacheFile = os.path.join(cacheDir, 'preconditioner_{}.hdf5'.format(self.preconditionerKey(hessFile, mode)))
+        if os.path.exists(cacheFile):
+            with h5py.File(cacheFile, mode='r') as f:
+                self.preconditioner = f['preconditioner'][:]
+                self.invpreconditioner = f['invpreconditioner'][:]
+            print('preconditioner from', cacheFile)
+            return
+        nsig = len(self.signals)
+        M1 = np.identity(nsig)
+        invM1 = np.identity(nsig)
+        hessian = None
+        if mode != 'identity' and os.path.exists(hessFile):
+            with h5py.File(hessFile, mode='r') as f:
+                hessian = f['hess'][:]
+                names = [n.decode() if isinstance(n, bytes) else n for n in f['parms'][:]] if 'parms' in f else None
+        if hessian is None:
+            if mode != 'identity':
+                print('no hessian in', hessFile, ', identity preconditioner')
+        else:
+            # position of each signal in the hessian
+            if names is not None:
+                pos = [names.index(s) if s in names else -1 for s in self.signals]
+            else:
+                pos = list(range(nsig)) if hessian.shape[0] == nsig else [-1]*nsig
+            blocks = [list(range(nsig))] if mode == 'full' else self.signalBlocks()
+            for block in blocks:
+                if any(pos[i] < 0 for i in block):
+                    print('signals', block[0], '-', block[-1], 'not in', hessFile, ', identity preconditioner for them')
+                    continue
+                idx = np.array([pos[i] for i in block])
+                eig, U = np.linalg.eigh(hessian[np.ix_(idx, idx)])
+                M1[np.ix_(block, block)] = np.matmul(np.diag(1./np.sqrt(eig)),U.T)
+                invM1[np.ix_(block, block)] = np.matmul(U,np.diag(np.sqrt(eig)))
         self.preconditioner = M1
-        self.invpreconditioner = np.linalg.inv(self.preconditioner)
-        # print(np.matmul(self.preconditioner,np.linalg.inv(self.preconditioner)))
-        # test = np.matmul(self.preconditioner,np.linalg.inv(self.preconditioner)) - np.identity(M1.shape[0])
-        # print(np.max(np.abs(test)))
-        # self.preconditioner = np.identity(len(self.signals))
-        # self.invpreconditioner = np.identity(len(self.signals))
+        self.invpreconditioner = invM1
+        with h5py.File(cacheFile, mode='w') as f:
+            f.create_dataset('preconditioner', data=M1)
+            f.create_dataset('invpreconditioner', data=invM1)
+            f.attrs['hessFile'] = hessFile
+            f.attrs['mode'] = mode
 
     def fillHelGroup(self):
 
@@ -686,7 +613,7 @@ class fitUtils:
                             #print 'append', 'helXsecs'+hel+'_y_{i}_'.format(i=i)+s, 'to', 'helXsecs'+hel+'_'+s
                             self.sumGroups['helXsecs'+hel+'_'+s].append('helXsecs'+hel+'_y_{i}_'.format(i=i)+s)
         
-    def makeDatacard(self):
+    def makeDatacard(self, pickleDatacard=True):
 
         self.DC = Datacard()
 
@@ -710,38 +637,13 @@ class fitUtils:
             for proc in self.processes:
                 self.DC.exp[chan][proc] = -1.00
                 self.DC.exp[chan+'_xsec'][proc] = -1.00
-        self.DC.systs =  [] # <type 'list'>
-        aux = {} #each sys will have a separate aux dict
+        # only the non-zero (syst, chan, proc) couplings are stored, the dense
+        # Datacard.systs is built from them when the datacard is pickled
+        self.systMap = systMap(self.DC.bins, self.processes)
         for i in range(48*30):
-            for chan in self.channels:
-                aux[chan] = {}
-                aux[chan+'_xsec'] = {}
-                for proc in self.processes:
-                    aux[chan][proc] = 0.
-                    aux[chan+'_xsec'][proc] = 0.
-                aux[chan]['fakesLowMt'] = 1.
-                aux[chan]['fakesHighMt'] = 1.
-            self.DC.systs.append(('fakeShapeBin{}'.format(i), False, 'shapeNoConstraint', [], aux))
-        aux = {} #each sys will have a separate aux dict
-        for chan in self.channels:
-            aux[chan] = {}
-            aux[chan+'_xsec'] = {}
-            for proc in self.processes:
-                    aux[chan][proc] = 0.
-                    aux[chan+'_xsec'][proc] = 0.
-            aux[chan]['fakesLowMt'] = 1.5
-            aux[chan]['fakesHighMt'] = 0
-        self.DC.systs.append(('fakesNormLowMt', False, 'lnNNoConstraint', [], aux))
-        aux = {} #each sys will have a separate aux dict
-        for chan in self.channels:
-            aux[chan] = {}
-            aux[chan+'_xsec'] = {}
-            for proc in self.processes:
-                aux[chan][proc] = 0.
-                aux[chan+'_xsec'][proc] = 0.
-            aux[chan]['fakesLowMt'] = 0.
-            aux[chan]['fakesHighMt'] = 1.5
-        self.DC.systs.append(('fakesNormHighMt', False, 'lnNNoConstraint', [], aux))
+            self.systMap.add('fakeShapeBin{}'.format(i), 'shapeNoConstraint', ['fakesLowMt','fakesHighMt'], 1., self.channels)
+        self.systMap.add('fakesNormLowMt', 'lnNNoConstraint', ['fakesLowMt'], 1.5, self.channels)
+        self.systMap.add('fakesNormHighMt', 'lnNNoConstraint', ['fakesHighMt'], 1.5, self.channels)
         # aux = {} #each sys will have a separate aux dict
         # aux[chan] = {}
         # aux[chan+'_xsec'] = {}
@@ -765,23 +667,11 @@ class fitUtils:
         # list of [{bin : {process : [input file, path to shape, path to shape for uncertainty]}}]
         if self.doSyst:
             for syst in self.templSystematics: #loop over systematics
+                procs = [proc for proc in self.processes if proc in self.templSystematics[syst]["procs"] or ("Signal" in self.templSystematics[syst]["procs"] and proc in self.signals)]
                 for var in self.templSystematics[syst]["vars"]:
-                    aux = {} #each sys will have a separate aux dict
-                    for chan in self.channels:
-                        aux[chan] = {}
-                        aux[chan+'_xsec'] = {}
-                        for proc in self.processes: 
-                            if proc in self.templSystematics[syst]["procs"]:
-                                aux[chan][proc] = self.templSystematics[syst]["weight"]
-                                aux[chan+'_xsec'][proc] = 0.0
-                            else:
-                                if "Signal" in self.templSystematics[syst]["procs"] and proc in self.signals:
-                                    aux[chan][proc] = self.templSystematics[syst]["weight"]
-                                    aux[chan+'_xsec'][proc] = 0.0
-                                else:
-                                    aux[chan][proc] = 0.0
-                                    aux[chan+'_xsec'][proc] = 0.0
-                    self.DC.systs.append((var, False, self.templSystematics[syst]["type"], [], aux))
+                    self.systMap.add(var, self.templSystematics[syst]["type"], procs, self.templSystematics[syst]["weight"], self.channels)
+        self.systMap.freeze()
+        self.DC.systs = self.systMap.datacardSysts(self.DC.bins) if pickleDatacard else [] # <type 'list'>
         self.DC.groups = {
                         'mass': ['mass'],
                         'pdfs': set(["pdf{}".format(i) for i in range(1,103)]),
@@ -813,5 +703,13 @@ class fitUtils:
         self.DC.preconditioner  = self.preconditioner 
         self.DC.invpreconditioner  = self.invpreconditioner 
         
-        filehandler = open('{}.pkl'.format(chan.split("_")[0]), 'w')
-        pickle.dump(self.DC, filehandler)
+        if pickleDatacard:
+            filehandler = open('{}.pkl'.format(chan.split("_")[0]), 'w')
+            pickle.dump(self.DC, filehandler)
+
+    def sparseInput(self, outputFile, binByBinStat=True):
+        # combinetf input written directly from the datacard and the shape files,
+        # in place of text2hdf5_npinput.py --sparse on the pickled datacard
+        maskedChans = [c+'_xsec' for c in self.channels]
+        shapeFiles = {c: '{}.hdf5'.format(c) for c in self.DC.bins}
+        writeSparseInput(self.DC, self.systMap, outputFile, maskedChans, shapeFiles, binByBinStat)
@@ -0,0 +1,59 @@
+import os
+import hashlib
+import numpy as np
+
+# numpy copies of the histograms of root files: all the objects requested from a file
+# are converted in one pass (bin contents, no under/overflow, [x] or [x, y]) and kept
+# in memory and in one npz per file on disk, stamped with the size and modification
+# time of the file, so that an unchanged file is not opened again
+
+class histoCache:
+    def __init__(self, cacheDir='.histoCache'):
+        self.cacheDir = cacheDir
+        self.arrays = {}
+
+    def stamp(self, fileName):
+        st = os.stat(fileName)
+        return np.array([st.st_size, st.st_mtime_ns], dtype='int64')
+
+    def cacheFile(self, fileName):
+        key = hashlib.sha1(os.path.abspath(fileName).encode()).hexdigest()
+        return os.path.join(self.cacheDir, key+'.npz')
+
+    def fromDisk(self, fileName, stamp):
+        cacheFile = self.cacheFile(fileName)
+        if not os.path.exists(cacheFile):
+            return {}
+        with np.load(cacheFile) as cached:
+            if not np.array_equal(cached['__stamp__'], stamp):
+                return {}
+            return {name: cached[name] for name in cached.files if name != '__stamp__'}
+
+    def toDisk(self, fileName, stamp, arrays):
+        os.makedirs(self.cacheDir, exist_ok=True)
+        cacheFile = self.cacheFile(fileName)
+        tmpFile = cacheFile.replace('.npz', '.tmp.npz')
+        np.savez(tmpFile, __stamp__=stamp, **arrays)
+        os.replace(tmpFile, cacheFile)
+
+    def load(self, fileName, names):
+        """name -> bin contents for the histograms `names` of fileName (missing objects are skipped)"""
+        stamp = self.stamp(fileName)
+        if not fileName in self.arrays or not np.array_equal(self.arrays[fileName][0], stamp):
+            self.arrays[fileName] = (stamp, self.fromDisk(fileName, stamp))
+        arrays = self.arrays[fileName][1]
+        # the names of the objects not in the file are kept too, so they are not looked for again
+        missing = [name for name in names if not name in arrays and not name in arrays.get('__missing__', [])]
+        if len(missing) > 0:
+            import ROOT
+            from root_numpy import hist2array
+            f = ROOT.TFile.Open(fileName)
+            for name in missing:
+                h = f.Get(name)
+                if not h:
+                    arrays['__missing__'] = np.append(arrays.get('__missing__', np.zeros(0, dtype='U')), name)
+                    continue
+                arrays[name] = hist2array(h)
+            f.Close()
+            self.toDisk(fileName, stamp, arrays)
+        return {name: arrays[name] for name in names if name in arrays}
@@ -5,6 +5,8 @@ from termcolor import colored
 import copy
 import argparse
 import os
+import numpy as np
+from histoCache import histoCache
 
 
 ROOT.gROOT.SetBatch()
@@ -13,7 +15,7 @@ ROOT.TH2.AddDirectory(False)
 
 class plotter :
     
-    def __init__(self):
+    def __init__(self, cacheDir='.histoCache'):
             
         self.yArr = [0, 0.4, 0.8, 1.2 ,1.6, 2.0, 2.4]
         self.qtArr = [0., 4., 8., 12., 16., 20., 24., 28., 32.]
@@ -48,6 +50,8 @@ class plotter :
         #     self.coeffList.append(ind)
         
         self.histos = {}
+        self.arrays = {} #bin contents of the MC nominal and variations, only used for the bands
+        self.cache = histoCache(cacheDir)
         self.canvas = {}
         self.leg = {}
         
@@ -119,6 +123,15 @@ class plotter :
             self.histos[suff+'MC'+'y'+coeff] =  inFile.Get('angularCoefficients/harmonicsY'+coeff+'_nom_nom')
             self.histos[suff+'MC'+'qt'+coeff] =  inFile.Get('angularCoefficients/harmonicsPt'+coeff+'_nom_nom')
 
+        #MC nominal and variations, read from the file in one pass as arrays (cached)
+        varNames = {}
+        varNames[suff+'MC'+'mapTot'] = 'angularCoefficients/mapTot'
+        varNames[suff+'MC'+'y'+'mapTot'] = 'angularCoefficients/Y'
+        varNames[suff+'MC'+'qt'+'mapTot'] = 'angularCoefficients/Pt'
+        for coeff,div in self.coeffDict.items() :
+            varNames[suff+'MC'+coeff] = 'angularCoefficients/harmonics'+coeff+'_nom_nom'
+            varNames[suff+'MC'+'y'+coeff] = 'angularCoefficients/harmonicsY'+coeff+'_nom_nom'
+            varNames[suff+'MC'+'qt'+coeff] = 'angularCoefficients/harmonicsPt'+coeff+'_nom_nom'
         for sKind, sList in self.systDict.items():
 
             sListMod = copy.deepcopy(sList)
@@ -126,9 +139,9 @@ class plotter :
                 sListMod.append("_nom") #add nominal variation
             
             for sName in sListMod :
-                self.histos[suff+'MC'+sName+'mapTot'] =  inFile.Get('angularCoefficients'+sKind+'/mapTot'+sName)
-                self.histos[suff+'MCy'+sName+'mapTot'] =  inFile.Get('angularCoefficients'+sKind+'/Y'+sName)
-                self.histos[suff+'MCqt'+sName+'mapTot'] =  inFile.Get('angularCoefficients'+sKind+'/Pt'+sName)
+                varNames[suff+'MC'+sName+'mapTot'] = 'angularCoefficients'+sKind+'/mapTot'+sName
+                varNames[suff+'MCy'+sName+'mapTot'] = 'angularCoefficients'+sKind+'/Y'+sName
+                varNames[suff+'MCqt'+sName+'mapTot'] = 'angularCoefficients'+sKind+'/Pt'+sName
                 for sNameDen in sListMod :
                     if sNameDen!=sName and not (sKind=='_LHEScaleWeight' and UNCORR) : #PDF or correlated Scale
                         continue 
@@ -138,17 +151,20 @@ class plotter :
                         if "unpolarizedxsec" in coeff: continue
                         if UNCORR :
                             if sKind=='_LHEScaleWeight':
-                                self.histos[suff+'MC'+sName+sNameDen+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonics'+coeff+sName+sNameDen)
-                                self.histos[suff+'MCy'+sName+sNameDen+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonicsY'+coeff+sName+sNameDen)
-                                self.histos[suff+'MCqt'+sName+sNameDen+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonicsPt'+coeff+sName+sNameDen)
+                                key = sName+sNameDen+coeff
                             else :
-                                self.histos[suff+'MC'+sName+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonics'+coeff+sName+sNameDen)
-                                self.histos[suff+'MCy'+sName+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonicsY'+coeff+sName+sNameDen)
-                                self.histos[suff+'MCqt'+sName+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonicsPt'+coeff+sName+sNameDen)
+                                key = sName+coeff
+                            path = sName+sNameDen
                         else :
-                            self.histos[suff+'MC'+sName+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonics'+coeff+sName) 
-                            self.histos[suff+'MCy'+sName+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonicsY'+coeff+sName) 
-                            self.histos[suff+'MCqt'+sName+coeff] =  inFile.Get('angularCoefficients'+sKind+'/harmonicsPt'+coeff+sName) 
+                            key = sName+coeff
+                            path = sName
+                        varNames[suff+'MC'+key] = 'angularCoefficients'+sKind+'/harmonics'+coeff+path
+                        varNames[suff+'MCy'+key] = 'angularCoefficients'+sKind+'/harmonicsY'+coeff+path
+                        varNames[suff+'MCqt'+key] = 'angularCoefficients'+sKind+'/harmonicsPt'+coeff+path
+        varArrays = self.cache.load(inFile.GetName(), list(varNames.values()))
+        for key, name in varNames.items() :
+            if name in varArrays :
+                self.arrays[key] = varArrays[name]
         
          
         #fit - helicity xsecs histos 
@@ -232,6 +248,34 @@ class plotter :
                 self.histos[suff+'apo'+c] = apoFile.Get('post-fit-regularization_'+c)
               
         
+    def variationEnvelopes(self,suff,c,proj) :
+        #squared PDF (hessian, sum in quadrature) and scale (largest variation) uncertainties on the MC coefficient c,
+        #for the 2D map (proj='') or its 'y'/'qt' projection, reduced over [variation, y, qt] arrays
+        name = 'mapTot' if 'unpol' in c else c
+        norm = 1./self.lumi if 'unpol' in c else 1. #like FitBand, already lumi scaled
+        nominal = self.arrays[suff+'MC'+proj+name]*norm
+        
+        pdf = np.stack([self.arrays[suff+'MC'+proj+sName+name] for sName in self.systDict['_LHEPdfWeight']])*norm
+        errPDF = np.sum(np.square(nominal-pdf), axis=0)
+        
+        sListMod = copy.deepcopy(self.systDict['_LHEScaleWeight'])
+        if UNCORR :
+            sListMod.append("_nom") #add nominal variation
+        scale = []
+        for sName in sListMod:
+            for sNameDen in sListMod :
+                if sNameDen!=sName and not UNCORR : continue
+                if sNameDen!=sName and 'unpol' in c : continue
+                if sName=='_nom' and sNameDen=='_nom' : continue
+                if ([sName,sNameDen] in self.vetoScaleList) : continue  #extremal cases
+                if 'unpol' in c or not UNCORR :
+                    scale.append(self.arrays[suff+'MC'+proj+sName+name])
+                else :
+                    scale.append(self.arrays[suff+'MC'+proj+sName+sNameDen+name])
+        errScale = np.max(np.square(nominal-np.stack(scale)*norm), axis=0, initial=0.)
+        
+        return errPDF, errScale
+        
     def AngCoeffPlots(self,inputFile, fitFile, uncorrelate,suff,aposteriori) :
         
         FitFile = ROOT.TFile.Open(fitFile)
@@ -290,6 +334,9 @@ class plotter :
                 self.histos[suff+'FitBandPDFqt'+c].Scale(1/self.lumi)
                 self.histos[suff+'FitBandScaleqt'+c].Scale(1/self.lumi)
 
+            errPDF, errScale = self.variationEnvelopes(suff, c, '')
+            errPDFy, errScaley = self.variationEnvelopes(suff, c, 'y')
+            errPDFqt, errScaleqt = self.variationEnvelopes(suff, c, 'qt')
 
             for i in range(1, self.histos[suff+'FitAC'+c].GetNbinsX()+1): #loop over rapidity bins
                 for j in range(1, self.histos[suff+'FitAC'+c].GetNbinsY()+1): #loop over pt bins
@@ -304,75 +351,17 @@ class plotter :
                         if abs(self.histos[suff+'FitBandy'+c].GetBinContent(i)-self.histos[suff+'FitACy'+c].GetBinContent(i))/self.histos[suff+'FitBandqt'+c].GetBinContent(i)>0.0000001 :
                             print("not clousure of", c, i , "(y),   (fitted-mc)/fitted=", (self.histos[suff+'FitBandy'+c].GetBinContent(i)-self.histos[suff+'FitACy'+c].GetBinContent(i))/self.histos[suff+'FitBandy'+c].GetBinContent(i))
                     
-                    errPDF = 0.
-                    if i==1 : errPDFqt = 0.
-                    if j==1 : errPDFy = 0.
-                    MCVal = self.histos[suff+'FitBand'+c].GetBinContent(i,j) #like MC, but already lumi scaled
-                    # if 'unpol' in c:
-                    #     MCVal=MCVal/self.lumi
-                    if i==1 : MCValqt = self.histos[suff+'FitBandqt'+c].GetBinContent(j)
-                    if j==1 : MCValy = self.histos[suff+'FitBandy'+c].GetBinContent(i)
-                    
-                    for sName in self.systDict['_LHEPdfWeight']:
-                        if 'unpol' in c:
-                            systVal=self.histos[suff+'MC'+sName+'mapTot'].GetBinContent(i,j)/self.lumi
-                            if i==1 : systValqt=self.histos[suff+'MCqt'+sName+'mapTot'].GetBinContent(j)/self.lumi
-                            if j==1 : systValy=self.histos[suff+'MCy'+sName+'mapTot'].GetBinContent(i)/self.lumi
-                        else:
-                            systVal = self.histos[suff+'MC'+sName+c].GetBinContent(i,j)
-                            if i==1 : systValqt = self.histos[suff+'MCqt'+sName+c].GetBinContent(j)
-                            if j==1 : systValy = self.histos[suff+'MCy'+sName+c].GetBinContent(i)
-                        errPDF+= (MCVal - systVal)**2  
-                        if i==1 : errPDFqt+= (MCValqt - systValqt)**2  
-                        if j==1 : errPDFy+= (MCValy - systValy)**2  
-                    self.histos[suff+'FitBandPDF'+c].SetBinError(i,j,math.sqrt(errPDF)) 
-                    if i==1 : self.histos[suff+'FitBandPDFqt'+c].SetBinError(j,math.sqrt(errPDFqt)) 
-                    if j==1 : self.histos[suff+'FitBandPDFy'+c].SetBinError(i,math.sqrt(errPDFy)) 
+                    self.histos[suff+'FitBandPDF'+c].SetBinError(i,j,math.sqrt(errPDF[i-1,j-1])) 
+                    if i==1 : self.histos[suff+'FitBandPDFqt'+c].SetBinError(j,math.sqrt(errPDFqt[j-1])) 
+                    if j==1 : self.histos[suff+'FitBandPDFy'+c].SetBinError(i,math.sqrt(errPDFy[i-1])) 
                             
-                    sListMod = copy.deepcopy(self.systDict['_LHEScaleWeight'])
-                    if UNCORR :
-                        sListMod.append("_nom") #add nominal variation
-                    errScale = 0.
-                    if i==1 : errScaleqt = 0.
-                    if j==1 : errScaley = 0.
-                    for sName in sListMod:
-                        for sNameDen in sListMod :
-                            if sNameDen!=sName and not UNCORR : continue
-                            if sNameDen!=sName and 'unpol' in c : continue
-                            if sName=='_nom' and sNameDen=='_nom' : continue
-                            if ([sName,sNameDen] in self.vetoScaleList) : continue  #extremal cases
-                            if 'unpol' in c:
-                                systVal=self.histos[suff+'MC'+sName+'mapTot'].GetBinContent(i,j)/self.lumi
-                                if i==1 : systValqt =self.histos[suff+'MCqt'+sName+'mapTot'].GetBinContent(j)/self.lumi
-                                if j==1 : systValy =self.histos[suff+'MCy'+sName+'mapTot'].GetBinContent(i)/self.lumi
-                            else:
-                                if UNCORR :
-                                    systVal = self.histos[suff+'MC'+sName+sNameDen+c].GetBinContent(i,j)
-                                    if i==1 : systValqt = self.histos[suff+'MCqt'+sName+sNameDen+c].GetBinContent(j)
-                                    if j==1 : systValy = self.histos[suff+'MCy'+sName+sNameDen+c].GetBinContent(i)
-                                else : 
-                                    systVal = self.histos[suff+'MC'+sName+c].GetBinContent(i,j)
-                                    if i==1 : systValqt = self.histos[suff+'MCqt'+sName+c].GetBinContent(j)
-                                    if j==1 : systValy = self.histos[suff+'MCy'+sName+c].GetBinContent(i)
-                            err_temp= (MCVal - systVal)**2
-                            if i==1 : err_tempqt= (MCValqt - systValqt)**2
-                            if j==1 : err_tempy= (MCValy - systValy)**2
-                            if err_temp>errScale : 
-                                errScale = err_temp
-                            if i==1 and err_tempqt>errScaleqt : errScaleqt = err_tempqt
-                            if j==1 and err_tempy>errScaley : errScaley = err_tempy
-                                
-                    self.histos[suff+'FitBandScale'+c].SetBinError(i,j,math.sqrt(errScale)) 
-                    if i==1 : self.histos[suff+'FitBandScaleqt'+c].SetBinError(j,math.sqrt(errScaleqt)) 
-                    if j==1 : self.histos[suff+'FitBandScaley'+c].SetBinError(i,math.sqrt(errScaley)) 
-
-                    err=errPDF+errScale
-                    if i==1 : errqt=errPDFqt+errScaleqt
-                    if j==1 : erry=errPDFy+errScaley
+                    self.histos[suff+'FitBandScale'+c].SetBinError(i,j,math.sqrt(errScale[i-1,j-1])) 
+                    if i==1 : self.histos[suff+'FitBandScaleqt'+c].SetBinError(j,math.sqrt(errScaleqt[j-1])) 
+                    if j==1 : self.histos[suff+'FitBandScaley'+c].SetBinError(i,math.sqrt(errScaley[i-1])) 
                     
-                    self.histos[suff+'FitBand'+c].SetBinError(i,j,math.sqrt(err)) 
-                    if i==1 : self.histos[suff+'FitBandqt'+c].SetBinError(j,math.sqrt(errqt)) 
-                    if j==1 : self.histos[suff+'FitBandy'+c].SetBinError(i,math.sqrt(erry)) 
+                    self.histos[suff+'FitBand'+c].SetBinError(i,j,math.sqrt(errPDF[i-1,j-1]+errScale[i-1,j-1])) 
+                    if i==1 : self.histos[suff+'FitBandqt'+c].SetBinError(j,math.sqrt(errPDFqt[j-1]+errScaleqt[j-1])) 
+                    if j==1 : self.histos[suff+'FitBandy'+c].SetBinError(i,math.sqrt(errPDFy[i-1]+errScaley[i-1])) 
         
         #--------------- build the relative uncertainity breakdown plots -----------------------#
         for c in self.coeffDict:
@@ -2129,6 +2118,7 @@ parser.add_argument('-c','--comparison', type=int, default=True,help="comparison
 parser.add_argument('-s','--save', type=int, default=False,help="save .png and .pdf canvas")
 parser.add_argument('-l','--suffList', type=str, default='',nargs='*', help="list of suff to be processed in the form: gen,reco")
 parser.add_argument('-a','--aposteriori', type=str, default='',help="name of the aposteriori fit file, if empty not plotted")
+parser.add_argument('--cacheDir', type=str, default='.histoCache',help="directory of the numpy cache of the input histograms")
 
 
 args = parser.parse_args()
@@ -2142,7 +2132,7 @@ SUFFL =args.suffList
 APO = args.aposteriori
 
 
-p=plotter()
+p=plotter(cacheDir=args.cacheDir)
 p.AngCoeffPlots(inputFile=INPUT, fitFile=FITFILE, uncorrelate=UNCORR,suff=SUFFL[0],aposteriori=APO)
 if COMP :
     recoFit = FITFILE.replace('.root', '_'+str(SUFFL[1])+'.root')
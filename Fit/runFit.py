@@ -7,6 +7,7 @@ import argparse
 
 parser = argparse.ArgumentParser("")
 parser.add_argument('-t', '--t',type=int, default=0, help='run fit on data')
+parser.add_argument('--text2hdf5', action='store_true', help='build the fit input with text2hdf5_npinput.py instead of writing it directly')
 
 args = parser.parse_args()
 
@@ -21,16 +22,19 @@ charges = ["WPlus"]
 for charge in charges:
     f = fitUtils(doSyst=True,channels =["{}_preVFP".format(charge),"{}_postVFP".format(charge)])
     f.fillProcessList()
-    # f.shapeFile()
+    # f.shapeFile(namedShapes=args.text2hdf5)
     # f.maskedChannels()
     f.fillHelGroup()
     f.setPreconditionVec()
     f.fillSumGroup()
     f.fillHelMetaGroup()
-    f.makeDatacard()    
-    text2hd5f = 'text2hdf5_npinput.py --allowNegativeExpectation --sparse --maskedChan={}_preVFP_xsec --maskedChan={}_postVFP_xsec {}.pkl --out {}.pkl.root'.format(charge,charge,charge,charge)
-    print('executing', text2hd5f) 
-    os.system(text2hd5f)
+    f.makeDatacard(pickleDatacard=args.text2hdf5)
+    if args.text2hdf5:
+        text2hd5f = 'text2hdf5_npinput.py --allowNegativeExpectation --sparse --maskedChan={}_preVFP_xsec --maskedChan={}_postVFP_xsec {}.pkl --out {}.pkl.root'.format(charge,charge,charge,charge)
+        print('executing', text2hd5f) 
+        os.system(text2hd5f)
+    else:
+        f.sparseInput('{}.pkl_sparse.hdf5'.format(charge))
     #--yieldProtectionCutoff 100. --scan helXsecsA_y_5_qt_3_pmaskedexp --binByBinStat
     combinetf = 'combinetf.py --fitverbose 9 -t{} --seed 260292 --yieldProtectionCutoff 100. --allowNegativePOI --binByBinStat --doh5Output {}.pkl_sparse.hdf5 -o FitRes/fit_{}_{}_blockAi.root'.format(toy,charge, charge, "data" if data else type)
     print('executing', combinetf)
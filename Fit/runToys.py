@@ -5,10 +5,18 @@ from fitUtils import fitUtils
 import os
 import numpy as np
 import argparse
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
+from toyRunner import runToys
 
 parser = argparse.ArgumentParser("")
 parser.add_argument('-t', '--t',type=int, default=1, help='number of toys to run')
+parser.add_argument('--text2hdf5', action='store_true', help='build the fit input with text2hdf5_npinput.py instead of writing it directly')
+parser.add_argument('--toysPerJob', type=int, default=40, help='toys fitted by each combinetf job')
+parser.add_argument('--threads', type=int, default=3, help='threads per combinetf job')
+parser.add_argument('--cores', type=int, default=cpu_count(), help='cores available to all the jobs')
+parser.add_argument('--timeout', type=float, default=None, help='seconds after which a job is killed')
+parser.add_argument('--retries', type=int, default=1, help='times a failed job is run again')
+parser.add_argument('--store', type=str, default='', help='hdf5 file collecting the fit results (default FitRes/toys_<charge>.hdf5)')
 
 args = parser.parse_args()
 
@@ -16,25 +24,25 @@ toys = args.t
 charge = "WPlus"
 seeds = np.random.randint(100000, size=(toys))
 print(seeds)
-def runSingleToy(toy):
+def toyCommand(toy):
     # combinetf = 'combinetf.py --nThreads=3 --bootstrapData -t25 --seed {}  --yieldProtectionCutoff 100. --allowNegativePOI  {}.pkl_sparse.hdf5 -o FitRes/fit_{}_toy{}.root'.format(seeds[toy], charge,charge, toy)
-    combinetf = 'combinetf.py --nThreads=3 -t40 --bootstrapData --seed {}  --yieldProtectionCutoff 100. --allowNegativePOI  {}.pkl_sparse.hdf5 -o FitRes/fit_{}_toy{}.root'.format(seeds[toy], charge,charge, toy)
-    print('executing', combinetf)
-    os.system(combinetf)
+    return 'combinetf.py --nThreads={} -t{} --bootstrapData --seed {}  --yieldProtectionCutoff 100. --allowNegativePOI  {}.pkl_sparse.hdf5 -o FitRes/fit_{}_toy{}.root'.format(args.threads, args.toysPerJob, seeds[toy], charge,charge, toy)
 
 f = fitUtils(doSyst=True,channels =["{}_preVFP".format(charge),"{}_postVFP".format(charge)])
 f.fillProcessList()
-f.shapeFile()
+f.shapeFile(namedShapes=args.text2hdf5)
 f.maskedChannels()
 f.fillHelGroup()
 f.setPreconditionVec()
 f.fillSumGroup()
 f.fillHelMetaGroup()
-f.makeDatacard()    
-text2hd5f = 'text2hdf5_npinput.py --allowNegativeExpectation --sparse --maskedChan={}_preVFP_xsec --maskedChan={}_postVFP_xsec {}.pkl --out {}.pkl.root'.format(charge,charge,charge, charge)
-print('executing', text2hd5f) 
-os.system(text2hd5f)
+f.makeDatacard(pickleDatacard=args.text2hdf5)
+if args.text2hdf5:
+    text2hd5f = 'text2hdf5_npinput.py --allowNegativeExpectation --sparse --maskedChan={}_preVFP_xsec --maskedChan={}_postVFP_xsec {}.pkl --out {}.pkl.root'.format(charge,charge,charge, charge)
+    print('executing', text2hd5f) 
+    os.system(text2hd5f)
+else:
+    f.sparseInput('{}.pkl_sparse.hdf5'.format(charge))
 
 toy = [i for i in range(toys)]
-pool=Pool()
-pool.map(runSingleToy, toy)
+runToys([toyCommand(i) for i in toy], ['FitRes/fit_{}_toy{}.root'.format(charge, i) for i in toy], seeds, args.store if args.store else 'FitRes/toys_{}.hdf5'.format(charge), args.cores, args.threads, args.timeout, args.retries)
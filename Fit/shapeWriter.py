@@ -0,0 +1,82 @@
+import numpy as np
+import h5py
+
+# combine inputs written in a few large datasets: the signal processes are the
+# (y, qt, helicity) rows of packed/signal<variation>, chunked by row and filled
+# one (y, qt) hyperslab of the templates at a time. Each process shape is found
+# by name through the index group (name -> packed dataset, row); the per-process
+# virtual datasets, one HDF5 object per process and variation, are only written
+# on request for the tools that open the shapes by name (text2hdf5).
+
+def compressionFilter(compression):
+    # gzip is built into hdf5, lz4 and blosc need hdf5plugin to write and to read
+    if not isinstance(compression, str) or compression == "gzip":
+        return compression
+    import hdf5plugin
+    if compression == "lz4":
+        return hdf5plugin.LZ4()
+    if compression == "blosc":
+        return hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE)
+    raise ValueError("unknown compression {}, use gzip, lz4 or blosc".format(compression))
+
+class shapeWriter:
+    """Packed signal shapes of one channel.
+
+    bins[i] is the (y, qt, coeff) bin of procs[i], flip[i] marks the processes
+    stored with the opposite sign in the variations written with flip on.
+    """
+    def __init__(self, f, procs, bins, flip=None, compression="gzip", dtype='float64', namedShapes=False):
+        self.f = f
+        self.procs = procs
+        self.compression = compressionFilter(compression)
+        self.dtype = dtype
+        self.namedShapes = namedShapes
+        self.sign = np.where(np.asarray(flip if flip is not None else [False]*len(procs), dtype=bool), -1., 1.)
+        # (y, qt) -> (rows of packed, coeff of each row), rows in increasing order
+        self.cells = {}
+        for row, (iy, iqt, coeff) in enumerate(bins):
+            self.cells.setdefault((iy, iqt), []).append((row, coeff))
+        self.dsets = {}
+        self.names = []
+        self.packed = []
+        self.rows = []
+
+    def slabs(self):
+        # the (y, qt) bins to be written, one addSlab call each per variation
+        return list(self.cells)
+
+    def addSlab(self, variation, iy, iqt, slab, flip=False):
+        """Write slab[..., coeff], the (iy, iqt) hyperslab of the template, to the rows of its processes.
+
+        The shape of procs[i] is then available as procs[i]+variation.
+        """
+        rows, coeffs = (list(x) for x in zip(*self.cells[(iy, iqt)]))
+        block = np.moveaxis(np.asarray(slab), -1, 0).reshape(slab.shape[-1], -1)
+        block = np.array(block[coeffs], dtype=self.dtype)
+        if flip:
+            block *= self.sign[rows][:,np.newaxis]
+        if not variation in self.dsets:
+            path = 'packed/signal{}'.format(variation)
+            shape = (len(self.procs), block.shape[1])
+            self.dsets[variation] = self.f.create_dataset(path, shape, dtype=self.dtype, chunks=(1,shape[1]), compression=self.compression)
+            self.names.extend(proc+variation for proc in self.procs)
+            self.packed.extend([path]*len(self.procs))
+            self.rows.extend(range(len(self.procs)))
+        self.dsets[variation][rows,:] = block
+
+    def writeIndex(self):
+        self.f.create_dataset('index/names', data=np.array(self.names, dtype='S'))
+        self.f.create_dataset('index/packed', data=np.array(self.packed, dtype='S'))
+        self.f.create_dataset('index/rows', data=np.array(self.rows, dtype='int32'))
+        if self.namedShapes:
+            for name, path, row in zip(self.names, self.packed, self.rows):
+                dset = self.f[path]
+                layout = h5py.VirtualLayout(shape=(dset.shape[1],), dtype=self.dtype)
+                layout[:] = h5py.VirtualSource('.', path, shape=dset.shape)[row,:]
+                self.f.create_virtual_dataset(name, layout)
+
+def shapeIndex(f):
+    """name -> (packed dataset, row) for a file written by shapeWriter"""
+    names = [n.decode() for n in f['index/names'][:]]
+    packed = [p.decode() for p in f['index/packed'][:]]
+    return dict(zip(names, zip(packed, f['index/rows'][:])))
@@ -0,0 +1,233 @@
+import math
+import numpy as np
+import h5py
+from shapeWriter import shapeIndex
+
+# combinetf sparse input written straight from the datacard and the shape files,
+# with the layout of text2hdf5_npinput.py --sparse: norm[bin, proc] and
+# logk[norm entry, syst] (log kappa average in the first nsyst columns, half
+# difference in the last nsyst) as sparse tensors, plus the lists of names and
+# groups. Zero entries are dropped per process and per systematic as they are
+# computed, so the dense tensors are never built.
+
+logkepsilon = math.log(1e-3)
+
+def writeFlatInChunks(arr, h5group, outname, maxChunkBytes=1024**2):
+    arrflat = arr.reshape(-1)
+    esize = np.dtype(arrflat.dtype).itemsize
+    # empty datasets cannot use chunked storage or compression
+    if arrflat.size == 0:
+        chunksize = 1
+        chunks = None
+        compression = None
+    else:
+        chunksize = int(min(arrflat.size, max(1, math.floor(maxChunkBytes/esize))))
+        chunks = (chunksize,)
+        compression = "gzip"
+    h5dset = h5group.create_dataset(outname, arrflat.shape, chunks=chunks, dtype=arrflat.dtype, compression=compression)
+    for ielem in range(0, arrflat.size, chunksize):
+        aout = arrflat[ielem:ielem+chunksize]
+        if np.count_nonzero(aout):
+            h5dset[ielem:ielem+chunksize] = aout
+    h5dset.attrs['original_shape'] = np.array(arr.shape, dtype='int64')
+    return arrflat.size*esize
+
+def writeSparse(indices, values, dense_shape, h5group, outname, maxChunkBytes=1024**2):
+    outgroup = h5group.create_group(outname)
+    nbytes = writeFlatInChunks(indices, outgroup, "indices", maxChunkBytes)
+    nbytes += writeFlatInChunks(values, outgroup, "values", maxChunkBytes)
+    outgroup.attrs['dense_shape'] = np.array(dense_shape, dtype='int64')
+    return nbytes
+
+def writeNames(f, name, names):
+    dset = f.create_dataset(name, [len(names)], dtype=h5py.special_dtype(vlen=str), compression="gzip")
+    dset[...] = names
+
+def writeGroups(f, name, groups, members, idxname=None):
+    # groups: name -> list of members, stored as indices into members
+    names = []
+    idxs = []
+    for group, content in groups.items():
+        idx = [members.index(m) for m in content if m in members]
+        if len(idx) == 0:
+            continue
+        names.append(group)
+        idxs.append(np.array(sorted(idx), dtype='int32'))
+    writeNames(f, name, names)
+    dset = f.create_dataset(idxname if idxname else name[:-1]+'idxs', [len(names)], dtype=h5py.special_dtype(vlen=np.dtype('int32')), compression="gzip")
+    for i, idx in enumerate(idxs):
+        dset[i] = idx
+
+class sparseTensor:
+    def __init__(self, ndim, dtype='float64'):
+        self.indices = []
+        self.values = []
+        self.ndim = ndim
+        self.dtype = dtype
+        self.size = 0
+
+    def append(self, indices, values):
+        self.indices.append(indices)
+        self.values.append(np.asarray(values, dtype=self.dtype))
+        self.size += len(values)
+
+    def arrays(self, idxdtype):
+        if self.size == 0:
+            return np.zeros([0,self.ndim], dtype=idxdtype), np.zeros([0], dtype=self.dtype)
+        return np.concatenate(self.indices).astype(idxdtype), np.concatenate(self.values)
+
+def logKappa(norm, syst):
+    # as text2hdf5: log(syst/norm) where both have the same sign, a small
+    # fixed value elsewhere, and nothing where the nominal is empty
+    logk = np.where(np.equal(np.sign(norm*syst), 1), np.log(np.abs(syst)/np.where(norm == 0., 1., np.abs(norm))), logkepsilon)
+    return np.where(np.equal(norm, 0.), 0., logk)
+
+class shapeReader:
+    """Shapes of one channel by name: the signal shapes are rows of the packed
+    datasets of a shapeWriter file, found through its index group, the others
+    are plain datasets."""
+    def __init__(self, f):
+        self.f = f
+        self.index = shapeIndex(f) if 'index' in f else {}
+
+    def __contains__(self, name):
+        return name in self.index or name in self.f
+
+    def read(self, names):
+        # name -> flat shape, with one read per packed dataset for all the rows it holds
+        out = {}
+        packed = {}
+        for name in names:
+            if name in self.index:
+                path, row = self.index[name]
+                packed.setdefault(path, []).append((int(row), name))
+            else:
+                out[name] = self.f[name][...].ravel()
+        for path, entries in packed.items():
+            rows = sorted(set(row for row, _ in entries))
+            block = self.f[path][rows,:]
+            pos = {row: i for i, row in enumerate(rows)}
+            for row, name in entries:
+                out[name] = block[pos[row]]
+        return out
+
+def writeSparseInput(DC, systs, outputFile, maskedChans, shapeFiles, binByBinStat=True, chunkSize=4*1024**2):
+    """Write the combinetf input for DC, with the systematics of the systMap systs, to outputFile.
+
+    shapeFiles maps each channel of DC.bins to its shape file: '$PROCESS' and
+    '$PROCESS_$SYSTEMATIC{Up,Down}' shapes for the fitted channels, either
+    datasets or rows of the packed datasets listed in the index group, one
+    value per process for the masked ones.
+    """
+    dtype = 'float64'
+    signals = [p for p in DC.processes if p in DC.signals]
+    procs = signals + [p for p in DC.processes if not p in DC.signals]
+    nproc = len(procs)
+    couplings = systs.couplings()
+    types = systs.types
+    systs = systs.names
+    nsyst = len(systs)
+    systsnoconstraint = [name for name, stype in zip(systs, types) if 'NoConstraint' in stype]
+    chans = [c for c in DC.bins if not c in maskedChans] + [c for c in DC.bins if c in maskedChans]
+
+    norm = sparseTensor(2, dtype)
+    logk = sparseTensor(2, dtype)
+    data_obs = []
+    sumw2 = []
+    ibin = 0
+    for chan in chans:
+        fshape = h5py.File(shapeFiles[chan], mode='r')
+        shapes = shapeReader(fshape)
+        masked = chan in maskedChans
+        nbinschan = 1 if masked else fshape['data_obs'].size
+        present = [proc for proc in procs if proc in shapes]
+        nominals = shapes.read(present)
+        if not masked:
+            data_obs.append(fshape['data_obs'][...].ravel())
+            sumw2chan = np.zeros(nbinschan, dtype=dtype)
+            if binByBinStat:
+                for shape in shapes.read([proc+'_sumw2' for proc in present if proc+'_sumw2' in shapes]).values():
+                    sumw2chan += shape
+        entries = {}
+        coupled = {}
+        for iproc, proc in enumerate(procs):
+            if not proc in nominals:
+                continue
+            nominal = nominals[proc]
+            bins = np.nonzero(nominal)[0]
+            if len(bins) == 0:
+                continue
+            # position of the entries of this process in norm, addressed by logk
+            normidx = norm.size + np.arange(len(bins))
+            norm.append(np.stack([ibin+bins, np.full(len(bins), iproc)], axis=-1), nominal[bins])
+            entries[proc] = (bins, normidx, nominal[bins])
+            for isyst, kfac in zip(*couplings.get((chan, proc), ([], []))):
+                coupled.setdefault(isyst, []).append((proc, kfac))
+        # one pass per systematic, with the Up/Down shapes of all its processes read together
+        for isyst in sorted(coupled):
+            name = systs[isyst]
+            lnN = types[isyst].startswith('lnN')
+            if not lnN:
+                varied = shapes.read(['{}_{}{}'.format(proc, name, d) for proc, _ in coupled[isyst] for d in ['Up', 'Down']])
+            for proc, kfac in coupled[isyst]:
+                bins, normidx, nominal = entries[proc]
+                if lnN:
+                    logkavg = np.full(len(bins), math.log(kfac))
+                    logkhalfdiff = None
+                else:
+                    logkup = kfac*logKappa(nominal, varied['{}_{}Up'.format(proc, name)][bins])
+                    logkdown = -kfac*logKappa(nominal, varied['{}_{}Down'.format(proc, name)][bins])
+                    logkavg = 0.5*(logkup+logkdown)
+                    logkhalfdiff = 0.5*(logkup-logkdown)
+                for column, values in [(isyst, logkavg), (nsyst+isyst, logkhalfdiff)]:
+                    if values is None:
+                        continue
+                    nz = np.nonzero(values)[0]
+                    if len(nz) == 0:
+                        continue
+                    logk.append(np.stack([normidx[nz], np.full(len(nz), column)], axis=-1), values[nz])
+        if not masked:
+            sumw2.append(sumw2chan)
+        fshape.close()
+        ibin += nbinschan
+    nbinsfull = ibin
+    nbins = sum(len(d) for d in data_obs)
+
+    idxdtype = 'int64' if max(nbinsfull*nproc, norm.size*2*nsyst) >= 2**31 else 'int32'
+    norm_indices, norm_values = norm.arrays(idxdtype)
+    logk_indices, logk_values = logk.arrays(idxdtype)
+    # logk is filled systematic by systematic, store it in row-major order
+    order = np.lexsort((logk_indices[:,1], logk_indices[:,0]))
+    logk_indices, logk_values = logk_indices[order], logk_values[order]
+    print('sparse input: {} bins ({} masked), {} processes, {} systematics, {} norm and {} logk entries'.format(nbinsfull, nbinsfull-nbins, nproc, nsyst, norm.size, logk.size))
+
+    with h5py.File(outputFile, mode='w') as f:
+        writeNames(f, 'hprocs', procs)
+        writeNames(f, 'hsignals', signals)
+        writeNames(f, 'hsysts', systs)
+        writeNames(f, 'hsystsnoprofile', [])
+        writeNames(f, 'hsystsnoconstraint', systsnoconstraint)
+        writeGroups(f, 'hsystgroups', {k: list(v) for k, v in DC.groups.items()}, systs)
+        writeGroups(f, 'hchargegroups', {}, procs)
+        writeGroups(f, 'hpolgroups', {}, procs)
+        writeGroups(f, 'hhelgroups', getattr(DC, 'helGroups', {}), procs)
+        writeGroups(f, 'hsumgroups', getattr(DC, 'sumGroups', {}), procs, 'hsumgroupsidxs')
+        writeGroups(f, 'hchargemetagroups', {}, [])
+        writeGroups(f, 'hratiometagroups', {}, [])
+        sumgroups = [k for k in getattr(DC, 'sumGroups', {}) if any(p in procs for p in DC.sumGroups[k])]
+        writeGroups(f, 'hhelmetagroups', getattr(DC, 'helMetaGroups', {}), sumgroups)
+        writeGroups(f, 'hreggroups', {}, procs)
+        writeGroups(f, 'hnoigroups', getattr(DC, 'noiGroups', {}), systs)
+        writeNames(f, 'hmaskedchans', [c for c in chans if c in maskedChans])
+        writeNames(f, 'hpseudodatanames', [])
+
+        constraintweights = np.array([0. if s in systsnoconstraint else 1. for s in systs], dtype=dtype)
+        writeFlatInChunks(constraintweights, f, 'hconstraintweights', maxChunkBytes=chunkSize)
+        writeFlatInChunks(np.concatenate(data_obs).astype(dtype), f, 'hdata_obs', maxChunkBytes=chunkSize)
+        writeFlatInChunks(np.zeros([nbins,0], dtype=dtype), f, 'hpseudodata', maxChunkBytes=chunkSize)
+        writeFlatInChunks(np.concatenate(sumw2), f, 'hsumw2', maxChunkBytes=chunkSize)
+        writeSparse(norm_indices, norm_values, [nbinsfull, nproc], f, 'hnorm_sparse', maxChunkBytes=chunkSize)
+        writeSparse(logk_indices, logk_values, [norm.size, 2*nsyst], f, 'hlogk_sparse', maxChunkBytes=chunkSize)
+        if hasattr(DC, 'preconditioner'):
+            writeFlatInChunks(np.asarray(DC.preconditioner, dtype=dtype), f, 'hpreconditioner', maxChunkBytes=chunkSize)
+            writeFlatInChunks(np.asarray(DC.invpreconditioner, dtype=dtype), f, 'hinvpreconditioner', maxChunkBytes=chunkSize)
@@ -0,0 +1,64 @@
+import numpy as np
+
+class systMap:
+    """Non-zero couplings of the systematics, (syst, chan, proc) -> weight.
+
+    The couplings are kept as flat index and weight arrays; the combine
+    Datacard layout, one dense aux dict per systematic, is only built by
+    datacardSysts when a pickled datacard is needed.
+    """
+    def __init__(self, chans, procs):
+        self.chans = list(chans)
+        self.procs = list(procs)
+        self.names = []
+        self.types = []
+        self.isyst = []
+        self.ichan = []
+        self.iproc = []
+        self.weight = []
+
+    def add(self, name, type, procs, weight, chans=None):
+        # one systematic applied with the same weight to procs in chans (all by default)
+        if weight == 0.:
+            procs = []
+        chans = self.chans if chans is None else chans
+        isyst = len(self.names)
+        self.names.append(name)
+        self.types.append(type)
+        iproc = np.array([self.procs.index(p) for p in procs], dtype='int32')
+        for chan in chans:
+            self.isyst.append(np.full(len(iproc), isyst, dtype='int32'))
+            self.ichan.append(np.full(len(iproc), self.chans.index(chan), dtype='int32'))
+            self.iproc.append(iproc)
+            self.weight.append(np.full(len(iproc), weight, dtype='float64'))
+
+    def freeze(self):
+        # concatenate the blocks added so far into single arrays
+        for attr in ['isyst', 'ichan', 'iproc', 'weight']:
+            blocks = getattr(self, attr)
+            if isinstance(blocks, list):
+                setattr(self, attr, np.concatenate(blocks) if len(blocks) else np.zeros(0, dtype='float64' if attr == 'weight' else 'int32'))
+        return self
+
+    def couplings(self):
+        # (chan, proc) -> (syst indices, weights), in the order of the systematics
+        self.freeze()
+        order = np.lexsort((self.isyst, self.iproc, self.ichan))
+        keys = self.ichan[order].astype('int64')*len(self.procs) + self.iproc[order]
+        starts = np.flatnonzero(np.diff(keys, prepend=-1))
+        out = {}
+        for start, stop in zip(starts, np.append(starts[1:], len(order))):
+            idx = order[start:stop]
+            out[(self.chans[self.ichan[idx[0]]], self.procs[self.iproc[idx[0]]])] = (self.isyst[idx], self.weight[idx])
+        return out
+
+    def datacardSysts(self, bins):
+        # combine Datacard.systs: [(name, False, type, [], {bin: {proc: weight}})]
+        self.freeze()
+        systs = []
+        for isyst, (name, type) in enumerate(zip(self.names, self.types)):
+            aux = {b: {p: 0. for p in self.procs} for b in bins}
+            for i in np.flatnonzero(self.isyst == isyst):
+                aux[self.chans[self.ichan[i]]][self.procs[self.iproc[i]]] = float(self.weight[i])
+            systs.append((name, False, type, [], aux))
+        return systs
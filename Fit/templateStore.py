@@ -0,0 +1,111 @@
+import numpy as np
+import h5py
+from collections import OrderedDict
+
+# lazy access to the shapes files: the datasets stay open and only the hyperslabs
+# that are actually indexed are read, the most recently used ones being kept in
+# an LRU bounded in bytes
+
+def toKey(sel):
+    # slices are not hashable before python 3.12
+    return tuple((s.start, s.stop, s.step) if isinstance(s, slice) else s for s in sel)
+
+class templateStore:
+    def __init__(self, maxBytes=1<<30):
+        self.files = {}
+        self.maxBytes = maxBytes
+        self.cache = OrderedDict()
+        self.nbytes = 0
+
+    def open(self, chan, fileName):
+        self.files[chan] = h5py.File(fileName, mode='r')
+
+    def __getitem__(self, chan):
+        # raw h5py file, as returned by h5py.File
+        return self.files[chan]
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self.clear()
+
+    def clear(self):
+        self.cache.clear()
+        self.nbytes = 0
+
+    def read(self, chan, name, sel):
+        key = (chan, name, toKey(sel))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        arr = self.files[chan][name][sel]
+        arr = np.asarray(arr)
+        # cached blocks are shared between callers
+        arr.flags.writeable = False
+        self.cache[key] = arr
+        self.nbytes += arr.nbytes
+        while self.nbytes > self.maxBytes and len(self.cache) > 1:
+            _, old = self.cache.popitem(last=False)
+            self.nbytes -= old.nbytes
+        return arr
+
+    def histo(self, chan, name, limits={}, trailing=None):
+        return lazyHisto(self, chan, name, limits, trailing)
+
+class lazyHisto:
+    """Read-only view of dataset `name`, indexed like the numpy array it replaces.
+
+    limits maps an axis to the number of bins kept on it (e.g. {-3: ny, -2: nqt} for
+    the acceptance cut on the template), the other axes are kept whole. Integer
+    indices on the last `trailing` axes (by default the ones after the last limited
+    axis, e.g. the helicity coefficient) are applied in memory, so that
+    [..., iY, iQt, coeff] for every coeff is served by one (iY, iQt) hyperslab;
+    all the other integer indices are part of the hyperslab read from the file.
+    """
+    def __init__(self, store, chan, name, limits={}, trailing=None):
+        self.store = store
+        self.chan = chan
+        self.name = name
+        dset = store[chan][name]
+        self.ndim = dset.ndim
+        self.dtype = dset.dtype
+        self.limits = {axis % self.ndim: stop for axis, stop in limits.items()}
+        if trailing is None:
+            trailing = self.ndim-1-max(self.limits) if self.limits else 0
+        self.firstTrailing = self.ndim-trailing
+        self.shape = tuple(self.limits.get(axis, n) for axis, n in enumerate(dset.shape))
+
+    def expand(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if Ellipsis in key:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),)*(self.ndim-len(key)+1) + key[i+1:]
+        if len(key) > self.ndim:
+            raise IndexError("{}: too many indices for {} dimensions".format(self.name, self.ndim))
+        return key + (slice(None),)*(self.ndim-len(key))
+
+    def __getitem__(self, key):
+        sel = []
+        rest = []
+        for axis, k in enumerate(self.expand(key)):
+            n = self.shape[axis]
+            if isinstance(k, (int, np.integer)) and axis < self.firstTrailing:
+                if not -n <= k < n:
+                    raise IndexError("{}: index {} out of range for axis {} of size {}".format(self.name, k, axis, n))
+                sel.append(int(k) % n)
+            else:
+                sel.append(slice(0, n) if axis in self.limits else slice(None))
+                rest.append(k)
+        return self.store.read(self.chan, self.name, tuple(sel))[tuple(rest)]
+
+    def __array__(self, dtype=None, copy=None):
+        # the data is read from the file, there is no buffer that could be shared without a copy
+        # (the array may still be a read-only view of a cached block, copy=True detaches it)
+        if copy is False:
+            raise ValueError("{}: a lazy histogram cannot be converted to an array without a copy".format(self.name))
+        arr = self[...]
+        if dtype is not None:
+            arr = arr.astype(dtype, copy=False)
+        return arr.copy() if copy else arr
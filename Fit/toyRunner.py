@@ -0,0 +1,108 @@
+import os
+import time
+import shlex
+import signal
+import subprocess
+import numpy as np
+import h5py
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# toy fits run as combinetf subprocesses on a fixed core budget (workers x threads
+# per fit), with a timeout and retries each; the fitresults of every toy are
+# appended to one hdf5 store as soon as it completes, together with a record of
+# how it ran (seed, status, attempts, timing and resource use)
+
+statusCodes = {'ok': 0, 'failed': 1, 'timeout': 2, 'noresult': 3}
+
+def runCommand(cmd, timeout, logFile):
+    # returns (returncode or None on timeout, wall time, rusage of the child)
+    start = time.time()
+    with open(logFile, 'w') as log:
+        proc = subprocess.Popen(shlex.split(cmd), stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid != 0:
+            return os.waitstatus_to_exitcode(status), time.time()-start, rusage
+        if timeout is not None and time.time()-start > timeout:
+            os.killpg(proc.pid, signal.SIGKILL)
+            pid, status, rusage = os.wait4(proc.pid, 0)
+            return None, time.time()-start, rusage
+        time.sleep(0.5)
+
+def runToy(itoy, seed, command, outputFile, timeout, retries):
+    record = {'toy': itoy, 'seed': seed, 'attempts': 0, 'returncode': -1, 'wall': 0., 'utime': 0., 'stime': 0., 'maxrss': 0}
+    for attempt in range(retries+1):
+        if os.path.exists(outputFile):
+            os.remove(outputFile)
+        returncode, wall, rusage = runCommand(command, timeout, outputFile.replace('.root', '.log'))
+        record['attempts'] = attempt+1
+        record['wall'] += wall
+        record['utime'] += rusage.ru_utime
+        record['stime'] += rusage.ru_stime
+        record['maxrss'] = max(record['maxrss'], rusage.ru_maxrss)
+        if returncode is None:
+            record['status'] = 'timeout'
+            continue
+        record['returncode'] = returncode
+        if returncode != 0:
+            record['status'] = 'failed'
+        elif not os.path.exists(outputFile):
+            record['status'] = 'noresult'
+        else:
+            record['status'] = 'ok'
+            break
+    return record
+
+class toyStore:
+    """Columnar hdf5 store: fitresults/<branch> holds the fitresults tree of all
+    the toys, row by row, with fitresults/itoy the toy each row comes from, and
+    toys/<field> one record per toy."""
+    def __init__(self, fileName):
+        self.f = h5py.File(fileName, mode='w')
+
+    def append(self, group, columns):
+        for name, values in columns.items():
+            values = np.asarray(values)
+            path = '{}/{}'.format(group, name)
+            if not path in self.f:
+                self.f.create_dataset(path, shape=(0,)+values.shape[1:], maxshape=(None,)+values.shape[1:], dtype=values.dtype, chunks=True, compression='gzip')
+            dset = self.f[path]
+            n = dset.shape[0]
+            dset.resize(n+values.shape[0], axis=0)
+            dset[n:] = values
+        self.f.flush()
+
+    def addToy(self, record, results=None):
+        columns = {k: np.array([v]) for k, v in record.items() if k != 'status'}
+        columns['status'] = np.array([statusCodes[record['status']]], dtype='int32')
+        self.append('toys', columns)
+        if results is not None and len(results) > 0:
+            columns = {name: results[name] for name in results.dtype.names}
+            columns['itoy'] = np.full(len(results), record['toy'], dtype='int32')
+            self.append('fitresults', columns)
+
+    def close(self):
+        self.f.attrs['statusCodes'] = str(statusCodes)
+        self.f.close()
+
+def readFitResults(fileName):
+    from root_numpy import root2array
+    return root2array(fileName, 'fitresults')
+
+def runToys(commands, outputFiles, seeds, storeFile, cores, threads, timeout=None, retries=1, keepRoot=True):
+    """Run commands[i] (writing outputFiles[i]) for every toy, at most cores/threads at a time."""
+    workers = max(1, cores//threads)
+    print('running {} toys on {} workers x {} threads'.format(len(commands), workers, threads))
+    store = toyStore(storeFile)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(runToy, itoy, seed, command, outputFile, timeout, retries) for itoy, (seed, command, outputFile) in enumerate(zip(seeds, commands, outputFiles))]
+        for future in as_completed(futures):
+            record = future.result()
+            results = None
+            if record['status'] == 'ok':
+                results = readFitResults(outputFiles[record['toy']])
+                if not keepRoot:
+                    os.remove(outputFiles[record['toy']])
+            store.addToy(record, results)
+            print('toy {toy} seed {seed}: {status} after {attempts} attempt(s), {wall:.0f} s'.format(**record))
+    store.close()
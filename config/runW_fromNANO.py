@@ -22,7 +22,10 @@ sys.path.append('{}/nanotools'.format(FWKBASE))
 from nanoSequence import nanoSequence
 
 sys.path.append('{}/templateMaker/'.format(FWKBASE))
-from wSequence import wSelectionSequence, wSelectionHelWeightsSequence, wSelectionDifferentialSequence
+from wSequence import wSelectionSequence, wSelection, wDefinitions, wHistograms, wSelectionHelWeightsSequence, wSelectionDifferentialSequence, skimColumns
+from multiWeightHistograms import writeMultiWeightHistograms
+from skimCache import skimCache
+from partitioning import chunkTask, chunkFiles, runTasks, mergePartials
 
 ROOT.gROOT.ProcessLine("gErrorIgnoreLevel = 2001;")
 
@@ -33,14 +36,57 @@ SList=['DYJetsToMuMu_M50','DYJetsToTauTau_M50','WPlusJetsToTauNu','WMinusJetsToT
 # SList=[]
 eras = ["preVFP","postVFP"]
 
-def RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, helWeights=False):
+def getSkimCache(skimDir, sample, xsec, systType, sumw, era, files=None, flatSF=False):
+    config = {'sample': sample, 'xsec': xsec, 'systType': systType, 'sumw': sumw, 'era': era, 'columns': skimColumns, 'files': files, 'flatSF': flatSF}
+    libraries = ['{}/nanotools/bin/libNanoTools.so'.format(FWKBASE), '{}/templateMaker/bin/libAnalysisOnData.so'.format(FWKBASE)]
+    return skimCache(skimDir, sample, era, config, sequences=[nanoSequence, wSelection], libraries=libraries)
+
+def getSamples(era):
+    if era == 'postVFP': return samplespostVFP, sumwDictpostVFP
+    return samplespreVFP, sumwDictpreVFP
+
+def getFiles(inDir, direc):
+    files = []
+    for d in direc:
+        targetDir='{}/{}/'.format(inDir, d)
+        #for now  let's run on unmerged file.
+        for f in os.listdir(targetDir):#check the directory
+            if not f.endswith('.root'): continue
+            files.append(targetDir+f)
+    return files
+
+def toVector(files):
+    fvec=ROOT.vector('string')()
+    for f in files:
+        fvec.push_back(f)
+    return fvec
+
+def RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, helWeights=False, skim=None, outputName=None, flatSF=False):
     print("processing ", sample)
-    p = RDFtree(outputDir = outputDir, inputFile = fvec, outputFile="{}.root".format(sample if not helWeights else sample+'_helweights'), pretend=pretendJob)
+    if outputName is None:
+        outputName = sample if not helWeights else sample+'_helweights'
+    if skim is not None and skim.exists():
+        #selection already done, start from the skimmed 'defs' node
+        print("Reading skim: ", skim.path)
+        fskim = ROOT.vector('string')()
+        fskim.push_back(skim.path)
+        p = RDFtree(outputDir = outputDir, inputFile = fskim, outputFile="{}.root".format(outputName), pretend=pretendJob)
+        p.EventFilter(nodeToStart='input', nodeToEnd='defs', evfilter="1.", filtername="{:20s}".format("skim"))
+        wDefinitions(p, systType)
+        resultNode = wHistograms(p, systType)
+        if sample =="WPlusJetsToMuNu" or sample=='WMinusJetsToMuNu':
+            resultNode = wSelectionDifferentialSequence(resultNode,era,sample)
+        return resultNode
+
+    p = RDFtree(outputDir = outputDir, inputFile = fvec, outputFile="{}.root".format(outputName), pretend=pretendJob)
     postnano, endNode=nanoSequence(p, systType, sample, xsec, sumw, era)
     print("Post nano node name: ", endNode)
     #return postnano
     if not helWeights: 
-        resultNode = wSelectionSequence(postnano, systType, endNode, era)
+        wSelection(postnano, systType, endNode, era, flatSF)
+        if skim is not None: skim.snapshot(postnano, 'defs', skimColumns)
+        wDefinitions(postnano, systType)
+        resultNode = wHistograms(postnano, systType)
         # if sample =="WJetsToLNu_0J" or sample=='WJetsToLNu_1J' or sample=='WJetsToLNu_2J':
         if sample =="WPlusJetsToMuNu" or sample=='WMinusJetsToMuNu':
             resultNode = wSelectionDifferentialSequence(resultNode,era,sample)
@@ -48,6 +94,58 @@ def RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, h
     
     return resultNode
 
+def processChunk(task, opts):
+    #runs in its own process, see partitioning.runTasks
+    ROOT.ROOT.EnableImplicitMT(opts['threads'])
+    samples, sumwClippedDict = getSamples(task.era)
+    systType = samples[task.sample]['nsyst']
+    xsec = samples[task.sample]['xsec']
+    sumw = 1. if 'data' in task.sample else sumwClippedDict[task.sample]
+    skim = None
+    if opts['skim'] and not opts['helWeights']:
+        skim = getSkimCache(opts['skimDir'], task.name, xsec, systType, sumw, task.era, files=task.files, flatSF=opts['flatSF'])
+    p = RDFprocess(toVector(task.files), task.partialDir, task.sample, xsec, systType, sumw, task.era, False, opts['helWeights'], skim, outputName=task.name, flatSF=opts['flatSF'])
+    objList = []
+    RDFtreeDict = p.getObjects()
+    for node in RDFtreeDict:
+        objList.extend(RDFtreeDict[node])
+    if skim is not None: objList.extend(skim.getObjects())
+    ROOT.RDF.RunGraphs(objList)
+    p.gethdf5Output()
+    writeMultiWeightHistograms(p, task.partial)
+    if skim is not None: skim.commit()
+
+def runPartitioned(args):
+    #one task per chunk of files, rerunning skips the chunks already done
+    tasks = {}
+    for era in eras:
+        samples, _ = getSamples(era)
+        partialDir = '{}_{}/partials{}'.format(args.outputDir, era, '_helweights' if args.helWeights else '')
+        for sample in samples:
+            if args.helWeights:
+                if not 'WPlusJetsToMuNu' in sample and not 'WMinusJetsToMuNu' in sample: continue
+            checkS = sample in SList if len(SList) > 0 else True
+            if not checkS: continue
+            files = getFiles(args.inputDir+era, samples[sample]['dir'])
+            if len(files) == 0:
+                print("No files found for directory:", samples[sample], " SKIPPING processing")
+                continue
+            tasks[(era, sample)] = [chunkTask(era, sample, i, chunk, partialDir) for i, chunk in enumerate(chunkFiles(files, args.chunkSize))]
+
+    opts = {'threads': max(1, args.ncores // args.jobs), 'helWeights': args.helWeights, 'skim': args.skim, 'skimDir': args.skimDir, 'flatSF': args.flatSF}
+    start = time.time()
+    failed = runTasks(processChunk, [task for key in tasks for task in tasks[key]], args.jobs, args.lockTimeout, opts)
+
+    for (era, sample), chunks in tasks.items():
+        missing = [task.name for task in chunks if not task.done()]
+        if len(missing) > 0:
+            print(era, sample, "not merged, missing chunks:", missing)
+            continue
+        outputFile = '{}_{}/{}.hdf5'.format(args.outputDir, era, sample if not args.helWeights else sample+'_helweights')
+        mergePartials([task.partial for task in chunks], outputFile)
+        print(era, sample, "merged", len(chunks), "chunks into", outputFile)
+
+    print('all chunks processed in {} s, {} failed'.format(time.time()-start, len(failed)))
 
 def main():
     parser = argparse.ArgumentParser("")
@@ -57,9 +155,20 @@ def main():
     parser.add_argument('-i', '--inputDir',type=str, default='/scratchnvme/wmass/NANOJEC/', help="input dir name")
     parser.add_argument('-c', '--ncores',type=int, default=48, help="no. of cores")    
     parser.add_argument('-w', '--helWeights',type=bool, default=False, help="derive helicity weights for reweighting")    
+    parser.add_argument('-s', '--skim',type=bool, default=False, help="write/read skims of the selected events, reused while the selection is unchanged")
+    parser.add_argument('--skimDir',type=str, default='skimsW', help="skim dir name")
+    parser.add_argument('--chunkSize',type=int, default=0, help="files per task in partitioned mode, 0 runs all samples in a single event loop")
+    parser.add_argument('-j', '--jobs',type=int, default=4, help="tasks run in parallel in partitioned mode, sharing the ncores")
+    parser.add_argument('--flatSF',type=bool, default=False, help="SFs from the flattened lookup table (SF_ulFlat) instead of SF_ul")
+    parser.add_argument('--lockTimeout',type=float, default=24*3600, help="age (s) after which the lock of an unfinished chunk is considered stale")
 
     RDFtrees = {}
+    skims = {}
     args = parser.parse_args()
+    if args.chunkSize > 0:
+        if args.pretend or args.report:
+            parser.error("--pretend and --report are not supported in partitioned mode (--chunkSize > 0)")
+        return runPartitioned(args)
     for era in eras:
         pretendJob = args.pretend
         inDir = args.inputDir
@@ -75,6 +184,7 @@ def main():
             print("Running on full dataset")
         ROOT.ROOT.EnableImplicitMT(nCores)
         RDFtrees[era] = {}
+        skims[era] = {}
 
         samples = samplespreVFP
         # samples = wsignalNLO_preVFP
@@ -93,18 +203,8 @@ def main():
             if not checkS: continue
             direc = samples[sample]['dir']
             xsec = samples[sample]['xsec']
-            fvec=ROOT.vector('string')()
-            for d in direc:
-                targetDir='{}/{}/'.format(inDir, d)
-                # mergedDir=targetDir+'merged/'
-                # if os.path.isdir(mergedDir):
-                #     targetDir=mergedDir
-                #for now  let's run on unmerged file.
-                for f in os.listdir(targetDir):#check the directory
-                    if not f.endswith('.root'): continue
-                    inputFile=targetDir+f
-                    #print(f)
-                    fvec.push_back(inputFile)
+            files = getFiles(inDir, direc)
+            fvec=toVector(files)
             if fvec.empty():
                 print("No files found for directory:", samples[sample], " SKIPPING processing")
                 continue
@@ -112,7 +212,10 @@ def main():
             if not 'data' in sample:
                 sumw=sumwClippedDict[sample]
             print("Sample is: ", sample)
-            RDFtrees[era][sample] = RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, helWeights)
+            skims[era][sample] = None
+            if args.skim and not helWeights and not pretendJob:
+                skims[era][sample] = getSkimCache(args.skimDir, sample, xsec, systType, sumw, era, files=sorted(files), flatSF=args.flatSF)
+            RDFtrees[era][sample] = RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, helWeights, skims[era][sample], flatSF=args.flatSF)
 
     #now trigger all the event loops at the same time:
     objList = []
@@ -140,6 +243,7 @@ def main():
                 cutFlowreportDict[era][sample] = RDFtrees[era][sample].getCutFlowReport('defs')
             for node in RDFtreeDict:
                 objList.extend(RDFtreeDict[node])
+            if skims[era][sample] is not None: objList.extend(skims[era][sample].getObjects())
     print("end merging objects")
     #magic happens here
     start = time.time()
@@ -155,6 +259,8 @@ def main():
             checkS = sample in SList if len(SList) > 0 else True
             if not checkS: continue
             RDFtrees[era][sample].gethdf5Output()
+            if skims[era][sample] is not None: skims[era][sample].commit()
+            writeMultiWeightHistograms(RDFtrees[era][sample], '{}_{}/{}.hdf5'.format(args.outputDir, era, sample if not helWeights else sample+'_helweights'))
             if args.report: cutFlowreportDict[era][sample].Print()
             # RDFtrees[era][sample].saveGraph()
 
@@ -26,18 +26,36 @@ sys.path.append('{}/nanotools'.format(FWKBASE))
 from nanoSequence import nanoSequence
 
 sys.path.append('{}/templateMaker/'.format(FWKBASE))
-from dySequence import dySelectionSequence
+from dySequenceROOT import dySelection, dyHistograms, skimColumns
+sys.path.append('{}/templateMaker/python'.format(FWKBASE))
+from skimCache import skimCache
 
 ROOT.gROOT.ProcessLine("gErrorIgnoreLevel = 2001;")
 eras = ["preVFP","postVFP"]
 
-def RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob):
+def getSkimCache(skimDir, sample, xsec, systType, sumw, era, files=None, flatSF=False):
+    config = {'sample': sample, 'xsec': xsec, 'systType': systType, 'sumw': sumw, 'era': era, 'columns': skimColumns, 'files': files, 'flatSF': flatSF}
+    libraries = ['{}/nanotools/bin/libNanoTools.so'.format(FWKBASE), '{}/templateMaker/bin/libAnalysisOnData.so'.format(FWKBASE)]
+    return skimCache(skimDir, sample, era, config, sequences=[nanoSequence, dySelection], libraries=libraries)
+
+def RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, skim=None, flatSF=False):
     print("processing ", sample)
+    if skim is not None and skim.exists():
+        #selection already done, start from the skimmed 'defs' node
+        print("Reading skim: ", skim.path)
+        fskim = ROOT.vector('string')()
+        fskim.push_back(skim.path)
+        p = RDFtree(outputDir = outputDir, inputFile = fskim, outputFile="{}.root".format(sample), pretend=pretendJob)
+        p.EventFilter(nodeToStart='input', nodeToEnd='defs', evfilter="1.", filtername="{:20s}".format("skim"))
+        return dyHistograms(p, systType)
+
     p = RDFtree(outputDir = outputDir, inputFile = fvec, outputFile="{}.root".format(sample), pretend=pretendJob)
     postnano, endNode=nanoSequence(p, systType, sample, xsec, sumw, era)
     print("Post nano node name: ", endNode)
     #return postnano
-    resultNode=dySelectionSequence(postnano, xsec, systType, sumw, endNode, era)
+    dySelection(postnano, xsec, systType, sumw, endNode, era, flatSF)
+    if skim is not None: skim.snapshot(postnano, 'defs', skimColumns)
+    resultNode=dyHistograms(postnano, systType)
     return resultNode
 
 
@@ -47,11 +65,15 @@ def main():
     parser.add_argument('-r', '--report',type=bool, default=False, help="Prints the cut flow report for all named filters")
     parser.add_argument('-o', '--outputDir',type=str, default='outputDY', help="output dir name")
     parser.add_argument('-i', '--inputDir',type=str, default='/scratchnvme/wmass/NANOJEC/', help="input dir name")    
+    parser.add_argument('-s', '--skim',type=bool, default=False, help="write/read skims of the selected events, reused while the selection is unchanged")
+    parser.add_argument('--skimDir',type=str, default='skimsDY', help="skim dir name")
+    parser.add_argument('--flatSF',type=bool, default=False, help="SFs from the flattened lookup table (SF_ulFlat) instead of SF_ul")
 
     args = parser.parse_args()
     pretendJob = args.pretend
     inDir = args.inputDir
     RDFtrees = {}
+    skims = {}
     for era in eras:
         outputDir = args.outputDir + '_' + era
         ##Add era to input dir
@@ -62,6 +84,7 @@ def main():
             print("Running on full dataset")
         ROOT.ROOT.EnableImplicitMT(48)
         RDFtrees[era] = {}
+        skims[era] = {}
         samples = samplespreVFP
         sumwClippedDict=sumwDictpreVFP
         if era == 'postVFP': 
@@ -92,7 +115,10 @@ def main():
             sumw=1.
             if not 'data' in sample:
                 sumw=sumwClippedDict[sample]        
-            RDFtrees[era][sample] = RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob)
+            skims[era][sample] = None
+            if args.skim and not pretendJob:
+                skims[era][sample] = getSkimCache(args.skimDir, sample, xsec, systType, sumw, era, files=sorted(str(f) for f in fvec), flatSF=args.flatSF)
+            RDFtrees[era][sample] = RDFprocess(fvec, outputDir, sample, xsec, systType, sumw, era, pretendJob, skims[era][sample], flatSF=args.flatSF)
     #sys.exit(0)
     #now trigger all the event loops at the same time:
     objList = []
@@ -115,6 +141,7 @@ def main():
                 if args.report: cutFlowreportDict[sample] = RDFtrees[era][sample].getCutFlowReport()
                 for node in RDFtreeDict:
                     objList.extend(RDFtreeDict[node])
+                if skims[era][sample] is not None: objList.extend(skims[era][sample].getObjects())
     print("end merging objects")
     #magic happens here
     start = time.time()
@@ -128,6 +155,7 @@ def main():
             print(sample)
             #RDFtrees[sample].getOutput()
             RDFtrees[era][sample].gethdf5Output()
+            if skims[era][sample] is not None: skims[era][sample].commit()
             if args.report: cutFlowreportDict[sample].Print()
             #RDFtrees[sample].saveGraph()
 
@@ -2,21 +2,31 @@
 #define ISGOODLUMI_H
 
 #include "module.hpp"
-#include "json.hpp"
-#include <fstream>
-using json = nlohmann::json;
+#include <string>
+#include <vector>
+#include <utility>
+#include <unordered_map>
 
+// good lumi sections of the golden json, compiled once: for every run the [lo, hi]
+// ranges are sorted and merged, and a lumi section is found by binary search.
+// Consecutive events mostly share their lumi section, so every slot also keeps the
+// verdict of its last (run, lumi).
 class isGoodLumi : public Module {
 
 private:
-  json _datajson;
-public:
-  isGoodLumi(const std::string gjsonF) {
-    std::ifstream fin(gjsonF.c_str());
-    fin >> _datajson; 
-    fin.close();
+  struct alignas(64) lastLumi {
+    unsigned int run = 0;
+    unsigned int lumi = 0;
+    bool good = false;
+    bool valid = false;
   };
+
+  std::unordered_map<unsigned int, std::vector<std::pair<unsigned int, unsigned int>>> _ranges;
+  std::vector<lastLumi> _last;
+public:
+  isGoodLumi(const std::string gjsonF);
   ~isGoodLumi() {};
+  bool isGood(unsigned int run, unsigned int lumi) const;
   RNode run(RNode) override;
   
 };
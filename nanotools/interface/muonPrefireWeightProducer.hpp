@@ -2,30 +2,46 @@
 #define MUONPREFIREWEIGHTPRODUCER_H
 
 #include "module.hpp"
+#include "TFile.h"
+#include "TH2.h"
+#include<array>
 #include<string>
+#include<vector>
+
+// products of (1 - prefiring probability) over the muons, nominal and scaled by 1.11 (up), 0.89 (down)
+struct muonPrefireWeights {
+  float nominal = 1.;
+  float up = 1.;
+  float down = 1.;
+};
+
 class muonPrefireWeightProducer : public Module {
 private:
-  TFile* _wtfile;
-  TH2F* _hwt;
-  TH2F* _hHotspot;
+  // parametrisation per |eta| bin, flattened: {threshold, width, plateau} of bin i at 3*i
+  std::vector<double> _etaEdges;
+  std::vector<double> _params;
+  std::array<double, 3> _hotspot;
+
+  void fill(TH2F* hwt, TH2F* hHotspot);
+  double prefiringProbability(float eta, float pt, float phi) const;
 public:
 
   muonPrefireWeightProducer(TFile* wtfile, int era) {
-    _wtfile = wtfile;
+    TH2F* hwt = nullptr;
     if(era==1) {
-      _hwt = (TH2F*)(_wtfile->Get("L1prefiring_muonparam_2016BG"));
+      hwt = (TH2F*)(wtfile->Get("L1prefiring_muonparam_2016BG"));
       std::cout << "muonPrefireWeightProducer::Read histo muonPrefiring_preVFP" << std::endl;
     }
     else if(era==2) {
-      _hwt = (TH2F*)(_wtfile->Get("L1prefiring_muonparam_2016postVFP"));
+      hwt = (TH2F*)(wtfile->Get("L1prefiring_muonparam_2016postVFP"));
       std::cout << "muonPrefireWeightProducer::Read histo muonPrefiring_postVFP" << std::endl;
     }
     else 
       std::cout << "Wrong era code passed to muon prefire weight producer" << std::endl;
-    _hHotspot = (TH2F*)(_wtfile->Get("L1prefiring_muonparam_2016_hotspot"));
-    _hHotspot->SetDirectory(0);
+    fill(hwt, (TH2F*)(wtfile->Get("L1prefiring_muonparam_2016_hotspot")));
   };
   ~muonPrefireWeightProducer() {};
+  muonPrefireWeights weights(const RVec<float>& eta, const RVec<float>& pt, const RVec<float>& phi, const RVec<bool>& looseId) const;
   RNode run(RNode) override;
   
 };
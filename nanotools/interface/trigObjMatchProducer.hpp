@@ -2,12 +2,21 @@
 #define TRIGOBJECTMATCHPRODUCER_H
 
 #include "module.hpp"
+#include <vector>
 
+// Muon_hasTriggerMatch: deltaR < 0.3 to a muon trigger object of HLT_IsoMu(Tk)24, for all
+// the muons. The good trigger objects are collected once per event in per-slot buffers
+// and every muon is compared with them in squared deltaR, stopping at the first match.
 class trigObjMatchProducer : public Module {
 
+private:
+  std::vector<std::vector<float>> _goodEta;
+  std::vector<std::vector<float>> _goodPhi;
+
 public:
   trigObjMatchProducer() {};
   ~trigObjMatchProducer() {};
+  RVec<bool> match(unsigned int slot, const RVec<float> &Muon_eta, const RVec<float> &Muon_phi, const RVec<int> &TrigObj_id, const RVec<float> &TrigObj_pt, const RVec<float> &TrigObj_l1pt, const RVec<float> &TrigObj_l2pt, const RVec<int> &TrigObj_filterBits, const RVec<float> &TrigObj_eta, const RVec<float> &TrigObj_phi);
   RNode run(RNode) override;
   
 };
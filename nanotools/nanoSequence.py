@@ -27,7 +27,8 @@ ROOT.gSystem.Load('{}/nanotools/bin/libNanoTools.so'.format(FWKBASE))
 ROOT.gROOT.ProcessLine("gErrorIgnoreLevel = 2001;")
 
 #pass a RDFtree object
-def nanoSequence(rdftree, systType, sample, xsec, sumw, era):
+#puFromHistos: pileup weights derived from the MC and data profiles (cached in .puWeightCache) instead of the stored tables
+def nanoSequence(rdftree, systType, sample, xsec, sumw, era, puFromHistos=False):
     endNode="input" #this is to protect if no postnano sequence is run
     if systType == 0: #this is data
         endNode='postnano'
@@ -65,7 +66,8 @@ def nanoSequence(rdftree, systType, sample, xsec, sumw, era):
         #FOR ROOT HISTOS
         print(sumwClipSamples)
         print(sample,'clipping:',clip)
-        rdftree.branch(nodeToStart='input', nodeToEnd='postnano', modules=[ROOT.lumiWeight(xsec=xsec, sumw=sumw, targetLumi = luminosityN, clip=clip),ROOT.puWeightProducer(eraCode), ROOT.trigObjMatchProducer(),ROOT.muonPrefireWeightProducer(filemuPrefire, eraCode), ROOT.jmeProducer(era=eraCode)])
+        puWeight = ROOT.puWeightProducer(pufile_mc_UL2016, datapu, mcprofName, "pileup", False, True, True) if puFromHistos else ROOT.puWeightProducer(eraCode)
+        rdftree.branch(nodeToStart='input', nodeToEnd='postnano', modules=[ROOT.lumiWeight(xsec=xsec, sumw=sumw, targetLumi = luminosityN, clip=clip),puWeight, ROOT.trigObjMatchProducer(),ROOT.muonPrefireWeightProducer(filemuPrefire, eraCode), ROOT.jmeProducer(era=eraCode)])
         if systType == 2:#for signal MC
             rdftree.branch(nodeToStart='postnano', nodeToEnd='postnano', modules=[ROOT.genLeptonSelector(), ROOT.CSvariableProducer(), ROOT.genVProducer()])
     return rdftree,endNode
@@ -24,12 +24,9 @@ float deltaR2(float eta1, float phi1, float eta2, float phi2)
 
 float deltaPhi(float phi1, float phi2)
 {
+  // wrapped to [-pi, pi] by subtracting the nearest multiple of 2pi, no loops or branches
   float result = phi1 - phi2;
-  while (result > float(M_PI))
-    result -= float(2 * M_PI);
-  while (result <= -float(M_PI))
-    result += float(2 * M_PI);
-  return result;
+  return result - float(2 * M_PI) * std::nearbyint(result * float(0.5 / M_PI));
 }
 #endif
 
@@ -1,21 +1,58 @@
 #include "isGoodLumi.hpp"
-#include<string>
-RNode isGoodLumi::run(RNode d) {
+#include "json.hpp"
+#include <algorithm>
+#include <fstream>
+#include <string>
+using json = nlohmann::json;
+
+isGoodLumi::isGoodLumi(const std::string gjsonF) {
+  json datajson;
+  std::ifstream fin(gjsonF.c_str());
+  fin >> datajson;
+  fin.close();
+
+  for (auto& runL : datajson.items()) {//these are the runs
+    std::vector<std::pair<unsigned int, unsigned int>> lsBlocks;
+    for (auto& lsL : runL.value())//these are the lumi blocks
+      lsBlocks.emplace_back(lsL.at(0).get<unsigned int>(), lsL.at(1).get<unsigned int>());
+    std::sort(lsBlocks.begin(), lsBlocks.end());
+
+    // merge overlapping or adjacent blocks, so that they are disjoint and sorted by both edges
+    auto& merged = _ranges[std::stoul(runL.key())];
+    for (auto& ls : lsBlocks) {
+      if (!merged.empty() && ls.first <= merged.back().second + 1)
+	merged.back().second = std::max(merged.back().second, ls.second);
+      else
+	merged.push_back(ls);
+    }
+  }
+}
 
-  auto isGoodlumi = [this](unsigned int run, unsigned int lumi) {
-    std::string rkey = std::to_string(run);
-    // find a run
-    if (_datajson.find(rkey) != _datajson.end()) {//first check if run in json
-      for( auto& lsL : _datajson.at(rkey)) {//these are the lumi blocks
-	unsigned int low = lsL.at(0);
-	unsigned int up = lsL.at(1);
-	if(lumi >= low && lumi <=up)//Lumi is in range
-	  return true;//there is no else part since one has loop over all LS blocks in a Run	
-      }//lsb loop
-    }//if block 
+bool isGoodLumi::isGood(unsigned int run, unsigned int lumi) const {
+  auto it = _ranges.find(run);
+  if (it == _ranges.end())//run not in json
     return false;
+  const auto& blocks = it->second;
+  // last block starting at or before lumi
+  auto ls = std::upper_bound(blocks.begin(), blocks.end(), lumi, [](unsigned int l, const std::pair<unsigned int, unsigned int>& b) { return l < b.first; });
+  return ls != blocks.begin() && lumi <= std::prev(ls)->second;
+}
+
+RNode isGoodLumi::run(RNode d) {
+
+  _last.assign(d.GetNSlots(), lastLumi());
+
+  auto isGoodlumi = [this](unsigned int slot, unsigned int run, unsigned int lumi) {
+    lastLumi& last = _last[slot];
+    if (!last.valid || last.run != run || last.lumi != lumi) {//new lumi section for this slot
+      last.run = run;
+      last.lumi = lumi;
+      last.good = isGood(run, lumi);
+      last.valid = true;
+    }
+    return last.good;
   };
 
-  auto df = d.Define("isGoodLumi", isGoodlumi, {"run", "luminosityBlock"});
+  auto df = d.DefineSlot("isGoodLumi", isGoodlumi, {"run", "luminosityBlock"});
   return df;
 }
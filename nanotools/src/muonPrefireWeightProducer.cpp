@@ -1,57 +1,56 @@
 #include "muonPrefireWeightProducer.hpp"
 #include "functions.hpp"
+#include <algorithm>
+#include <cmath>
 
-RNode muonPrefireWeightProducer::run(RNode d) {
-  auto getMuonPrefiringSF = [this](const RVec<float>& eta, const RVec<float>& pt,
-				   const RVec<float>& phi) {
-    float sf = 1.0;
-    int nBins = _hwt->GetNbinsX();
-    int prefireBin = 0;
-    float prefiringProbability = 0.0;
-    for (unsigned int i = 0; i < eta.size(); ++i) {
-      //if (not looseId[i]) continue;
-      if (eta[i] > 1.24 and eta[i] < 1.6 and phi[i] > 2.44346 and phi[i] < 2.79253) {
-	prefiringProbability = _hHotspot->GetBinContent(1, 3)/(TMath::Exp( (pt[i] - _hHotspot->GetBinContent(1, 1)) / _hHotspot->GetBinContent(1, 2) ) + 1);
-      } else {
-	prefireBin = std::max(1, std::min(_hwt->GetXaxis()->FindFixBin(fabs(eta[i])), nBins));
-	prefiringProbability = _hwt->GetBinContent(prefireBin, 3)/(TMath::Exp( (pt[i] - _hwt->GetBinContent(prefireBin, 1)) / _hwt->GetBinContent(prefireBin, 2) ) + 1);
-    }
-      if (prefiringProbability < 0) prefiringProbability = 0.0;
-      else if (prefiringProbability > 1) prefiringProbability = 1.0;    
-      sf *= (1.0 - prefiringProbability);
-    }
-  return sf;  
-  
-  };
-  
-  auto getMuonPrefiringSFvariationSyst = [this](const RVec<float>& eta,
-						const RVec<float>& pt, const RVec<float>& phi) {
-    // should be called with nSystVar = 3 (at least, can codify more variations) representing nominal, Up, Down
-    RVec<float> res(2, 1.0); // initialize to 1
-    int nBins = _hwt->GetNbinsX();
-    int prefireBin = 0;
-    double prefiringProbability = 0.0;
-    for (unsigned int i = 0; i < eta.size(); ++i) {
-      if (eta[i] > 1.24 and eta[i] < 1.6 and phi[i] > 2.44346 and phi[i] < 2.79253) {
-	prefiringProbability = _hHotspot->GetBinContent(1, 3)/(TMath::Exp( (pt[i] - _hHotspot->GetBinContent(1, 1)) / _hHotspot->GetBinContent(1, 2) ) + 1);
-      } else {
-	prefireBin = std::max(1, std::min(_hwt->GetXaxis()->FindFixBin(fabs(eta[i])), nBins));
-	prefiringProbability = _hwt->GetBinContent(prefireBin, 3)/(TMath::Exp( (pt[i] - _hwt->GetBinContent(prefireBin, 1)) / _hwt->GetBinContent(prefireBin, 2) ) + 1);
-      }
-      if (prefiringProbability < 0) prefiringProbability = 0.0;
-      
-      //res[0] *= (1.0 - std::min(1.0, prefiringProbability));
-      res[0] *= (1.0 - std::min(1.0, 1.11*prefiringProbability));
-      res[1] *= (1.0 - std::min(1.0, 0.89*prefiringProbability));
+void muonPrefireWeightProducer::fill(TH2F* hwt, TH2F* hHotspot) {
+  // the histograms are only read here, the event loop works on the flat copies
+  int nBins = hwt->GetNbinsX();
+  _etaEdges.resize(nBins+1);
+  _params.resize(3*nBins);
+  for (int ibin = 1; ibin <= nBins; ++ibin) {
+    _etaEdges[ibin-1] = hwt->GetXaxis()->GetBinLowEdge(ibin);
+    for (int ipar = 0; ipar < 3; ++ipar)
+      _params[3*(ibin-1)+ipar] = hwt->GetBinContent(ibin, ipar+1);
+  }
+  _etaEdges[nBins] = hwt->GetXaxis()->GetBinUpEdge(nBins);
+  for (int ipar = 0; ipar < 3; ++ipar)
+    _hotspot[ipar] = hHotspot->GetBinContent(1, ipar+1);
+}
+
+double muonPrefireWeightProducer::prefiringProbability(float eta, float pt, float phi) const {
+  const double* par = _hotspot.data();
+  if (!(eta > 1.24 and eta < 1.6 and phi > 2.44346 and phi < 2.79253)) {
+    // |eta| bin clamped to the first/last bin
+    int nBins = _etaEdges.size()-1;
+    int prefireBin = std::upper_bound(_etaEdges.begin(), _etaEdges.end(), fabs(eta)) - _etaEdges.begin() - 1;
+    par = &_params[3*std::max(0, std::min(prefireBin, nBins-1))];
+  }
+  double prob = par[2]/(std::exp( (pt - par[0]) / par[1] ) + 1);
+  return std::max(prob, 0.);
+}
+
+muonPrefireWeights muonPrefireWeightProducer::weights(const RVec<float>& eta, const RVec<float>& pt, const RVec<float>& phi, const RVec<bool>& looseId) const {
+  muonPrefireWeights w;
+  for (unsigned int i = 0; i < eta.size(); ++i) {
+    if (not (pt[i] > 22 and looseId[i])) continue;
+    double prob = prefiringProbability(eta[i], pt[i], phi[i]);
+    w.nominal *= (1.0 - std::min(1.0, prob));
+    w.up *= (1.0 - std::min(1.0, 1.11*prob));
+    w.down *= (1.0 - std::min(1.0, 0.89*prob));
   }
-    return res;  
-  
+  return w;
+}
+
+RNode muonPrefireWeightProducer::run(RNode d) {
+  auto getMuonPrefiringWeights = [this](const RVec<float>& eta, const RVec<float>& pt,
+					const RVec<float>& phi, const RVec<bool>& looseId) {
+    return weights(eta, pt, phi, looseId);
   };
-  
-  auto d1 = d.Define("LooseMuonPt22_eta", "Muon_eta[Muon_pt > 22 && Muon_looseId]")
-             .Define("LooseMuonPt22_pt", "Muon_pt[Muon_pt > 22 && Muon_looseId]")
-             .Define("LooseMuonPt22_phi", "Muon_phi[Muon_pt > 22 && Muon_looseId]")
-             .Define("muprefireWeight", getMuonPrefiringSF, {"LooseMuonPt22_eta", "LooseMuonPt22_pt", "LooseMuonPt22_phi"})
-             .Define("muprefireWeightVars", getMuonPrefiringSFvariationSyst, {"LooseMuonPt22_eta", "LooseMuonPt22_pt", "LooseMuonPt22_phi"});
+
+  // muprefireWeightVars = {up, down}
+  auto d1 = d.Define("muprefireProducts", getMuonPrefiringWeights, {"Muon_eta", "Muon_pt", "Muon_phi", "Muon_looseId"})
+             .Define("muprefireWeight", [](const muonPrefireWeights& w) { return w.nominal; }, {"muprefireProducts"})
+             .Define("muprefireWeightVars", [](const muonPrefireWeights& w) { return RVec<float>({w.up, w.down}); }, {"muprefireProducts"});
   return d1;
 }
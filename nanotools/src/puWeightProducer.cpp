@@ -1,33 +1,98 @@
 #include "puWeightProducer.hpp"
+#include "TSystem.h"
+#include <algorithm>
+#include <fstream>
+#include <functional>
+#include <limits>
+#include <stdexcept>
 
 RNode puWeightProducer::run(RNode d)
 {
-  if(_fromHisto) return getfromHisto(d);
-  else  return getfromArray(d);
-}
-
-RNode puWeightProducer::getfromHisto(RNode d) {
-  auto getpuWeightNom = [this](float npu) {
-    int bin = std::max(1, std::min(_nompuwtH->GetNbinsX(), _nompuwtH->GetXaxis()->FindBin(npu)));
-    float puW = _nompuwtH->GetBinContent(bin);
-    return puW;
+  auto getpuWeightNom = [this](float nTrueInt) {
+    return weight(nTrueInt);
   };
   auto df = d.Define("puWeight", getpuWeightNom, {"Pileup_nTrueInt"});
   return df;
 }
 
-RNode puWeightProducer::getfromArray(RNode d) {
-  auto getpuWeightNom = [this](float nTrueInt) {
-    float puW = 1.;
-    if (nTrueInt < 100.0) {
-      if      (_era == 1) puW =  _pileupWeights_2016UL_preVFP[static_cast<int>(nTrueInt)];
-      else if (_era == 2) puW =  _pileupWeights_2016UL_postVFP[static_cast<int>(nTrueInt)];
-      else                puW = _pileupWeights_2016UL_all[static_cast<int>(nTrueInt)];
-    }
-    return puW;
-  };
-  auto df = d.Define("puWeight", getpuWeightNom, {"Pileup_nTrueInt"});
-  return df;
+float puWeightProducer::weight(float nTrueInt) const
+{
+  // clamped to the first/last entry of the table, written so that a NaN goes to the first
+  float pos = std::min(float(_table.size() - 1), std::max(0.f, (nTrueInt - _lo) * _invWidth));
+  return _table[static_cast<int>(pos)];
+}
+
+void puWeightProducer::fromArray(int era)
+{
+  const double *weights = _pileupWeights_2016UL_all;
+  if      (era == 1) weights = _pileupWeights_2016UL_preVFP;
+  else if (era == 2) weights = _pileupWeights_2016UL_postVFP;
+  // one weight per unit of nTrueInt in [0, 100), 1 above
+  _table.assign(weights, weights + 100);
+  _table.push_back(1.);
+  _lo = 0.;
+  _invWidth = 1.;
+}
+
+void puWeightProducer::fromHistos(TFile *puMC, TFile *puData, std::string hmcName, std::string hdataName, std::string cacheDir)
+{
+  // the cache is keyed by the pileup files (path, size, modification time), the histograms and the options
+  TString key = TString::Format("%s:%s:%s:%s:%d:%d", puMC->GetName(), puData->GetName(), hmcName.c_str(), hdataName.c_str(), _fixlargeW, _normtoArea);
+  for (const char *fileName : {puMC->GetName(), puData->GetName()}) {
+    FileStat_t st;
+    if (gSystem->GetPathInfo(fileName, st) == 0)
+      key += TString::Format(":%lld:%ld", st.fSize, st.fMtime);
+  }
+  TString cacheFile = TString::Format("%s/puWeights_%zx.txt", cacheDir.c_str(), std::hash<std::string>{}(key.Data()));
+  if (readCache(cacheFile)) {
+    std::cout << "puWeightProducer::Read weights from " << cacheFile << std::endl;
+    return;
+  }
+
+  TH1D *hmc = (TH1D *)puMC->Get(hmcName.c_str());
+  TH1D *hdata = (TH1D *)puData->Get(hdataName.c_str());
+  if (!hmc || !hdata)
+    throw std::runtime_error(("puWeightProducer: " + hmcName + " or " + hdataName + " not found").c_str());
+  TH1D *hw = ratio(hmc, hdata, "nom");
+  if (hw->GetXaxis()->IsVariableBinSize())
+    throw std::runtime_error("puWeightProducer: the pileup profiles must have a fixed binning");
+
+  // in range bins only, under- and overflow go to the first/last bin
+  _table.clear();
+  for (int ibin = 1; ibin <= hw->GetNbinsX(); ++ibin)
+    _table.push_back(hw->GetBinContent(ibin));
+  _lo = hw->GetXaxis()->GetXmin();
+  _invWidth = hw->GetNbinsX() / (hw->GetXaxis()->GetXmax() - hw->GetXaxis()->GetXmin());
+  delete hw;
+
+  writeCache(cacheFile);
+}
+
+bool puWeightProducer::readCache(TString cacheFile)
+{
+  std::ifstream fin(cacheFile.Data());
+  if (!fin.good())
+    return false;
+  size_t n = 0;
+  fin >> _lo >> _invWidth >> n;
+  _table.resize(n);
+  for (size_t i = 0; i < n; ++i)
+    fin >> _table[i];
+  return !fin.fail() && n > 0;
+}
+
+void puWeightProducer::writeCache(TString cacheFile) const
+{
+  gSystem->mkdir(gSystem->GetDirName(cacheFile), true);
+  // written aside and renamed, so that concurrent jobs never read a partial table
+  TString tmpFile = cacheFile + TString::Format(".%d", gSystem->GetPid());
+  std::ofstream fout(tmpFile.Data());
+  fout.precision(std::numeric_limits<float>::max_digits10);
+  fout << _lo << " " << _invWidth << " " << _table.size() << std::endl;
+  for (float w : _table)
+    fout << w << std::endl;
+  fout.close();
+  gSystem->Rename(tmpFile, cacheFile);
 }
 
 TH1D* puWeightProducer::ratio(TH1D* hmc, TH1D* hdata, TString tag) {
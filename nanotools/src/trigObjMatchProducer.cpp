@@ -1,44 +1,47 @@
 #include "trigObjMatchProducer.hpp"
 #include "functions.hpp"
 
+RVec<bool> trigObjMatchProducer::match(unsigned int slot, const RVec<float> &Muon_eta, const RVec<float> &Muon_phi, const RVec<int> &TrigObj_id, const RVec<float> &TrigObj_pt, const RVec<float> &TrigObj_l1pt, const RVec<float> &TrigObj_l2pt, const RVec<int> &TrigObj_filterBits, const RVec<float> &TrigObj_eta, const RVec<float> &TrigObj_phi) {
+  std::vector<float> &goodEta = _goodEta[slot];
+  std::vector<float> &goodPhi = _goodPhi[slot];
+  goodEta.clear();
+  goodPhi.clear();
+  for (unsigned int i = 0; i < TrigObj_id.size(); ++i)
+    {
+      if (TrigObj_id[i] != 13)
+	continue;
+      if (TrigObj_pt[i] < 24.)
+	continue;
+      if (TrigObj_l1pt[i] < 22.)
+	continue;
+      if (!((TrigObj_filterBits[i] & 8) || (TrigObj_l2pt[i] > 10. && (TrigObj_filterBits[i] & 2))))
+	continue;
+      goodEta.push_back(TrigObj_eta[i]);
+      goodPhi.push_back(TrigObj_phi[i]);
+    }
+
+  RVec<bool> muhasTrigm(Muon_eta.size(), false);
+  for (unsigned int imu = 0; imu < Muon_eta.size(); imu++) {
+    for (unsigned int jtrig = 0; jtrig < goodEta.size(); ++jtrig) {
+      if (deltaR2(Muon_eta[imu], Muon_phi[imu], goodEta[jtrig], goodPhi[jtrig]) < 0.09f) {//deltaR < 0.3
+	muhasTrigm[imu] = true;
+	break;
+      }//if
+    }//break from this when 1 match found
+  }
+  return muhasTrigm;
+}
+
 RNode trigObjMatchProducer::run(RNode d) {
 
-  auto goodMuonTriggerCandidate = [](const RVec<int> &TrigObj_id, const RVec<float> &TrigObj_pt, const RVec<float> &TrigObj_l1pt, const RVec<float> &TrigObj_l2pt, const RVec<int> &TrigObj_filterBits) {
-    RVec<bool> res(TrigObj_id.size(), false); // initialize to 0
-    for (unsigned int i = 0; i < res.size(); ++i)
-      {
-	if (TrigObj_id[i] != 13)
-	  continue;
-	if (TrigObj_pt[i] < 24.)
-	  continue;
-	if (TrigObj_l1pt[i] < 22.)
-	  continue;
-	if (!((TrigObj_filterBits[i] & 8) || (TrigObj_l2pt[i] > 10. && (TrigObj_filterBits[i] & 2))))
-	  continue;
-	res[i] = true;
-      }
-    return res;
-  };
-  
-  /*//incase we want to embed as a property of the muon obj
-  auto hasTriggerMatch = [](const RVec<float> mueta, const RVec<float> muphi, const RVec<float> &TrigObj_eta, const RVec<float> &TrigObj_phi) {
-    RVec<bool> muhasTrigm(mueta.size(), false);
-    for(unsigned int imu = 0; imu < mueta.size(); imu++) {
-      for (unsigned int jtrig = 0; jtrig < TrigObj_eta.size(); ++jtrig) {
-	if (deltaR(mueta[imu], muphi[imu], TrigObj_eta[jtrig], TrigObj_phi[jtrig]) < 0.3) {
-	  muhasTrigm[imu] = true;
-	  break;
-	}//if
-      }//break from this when 1 match found
-    }
-    return muhasTrigm;
+  _goodEta.assign(d.GetNSlots(), std::vector<float>());
+  _goodPhi.assign(d.GetNSlots(), std::vector<float>());
+
+  auto hasTriggerMatch = [this](unsigned int slot, const RVec<float> &Muon_eta, const RVec<float> &Muon_phi, const RVec<int> &TrigObj_id, const RVec<float> &TrigObj_pt, const RVec<float> &TrigObj_l1pt, const RVec<float> &TrigObj_l2pt, const RVec<int> &TrigObj_filterBits, const RVec<float> &TrigObj_eta, const RVec<float> &TrigObj_phi) {
+    return match(slot, Muon_eta, Muon_phi, TrigObj_id, TrigObj_pt, TrigObj_l1pt, TrigObj_l2pt, TrigObj_filterBits, TrigObj_eta, TrigObj_phi);
   };
 
-  */
-  auto d1 = d.Define("goodTrigObjs", goodMuonTriggerCandidate, {"TrigObj_id", "TrigObj_pt", "TrigObj_l1pt", "TrigObj_l2pt", "TrigObj_filterBits"})
-    .Define("goodTrigObjs_eta", "TrigObj_eta[goodTrigObjs]")
-    .Define("goodTrigObjs_phi", "TrigObj_phi[goodTrigObjs]");
-  //.Define("Muon_hasTriggerMatch", hasTriggerMatch, {"Muon_eta", "Muon_phi", "goodTrigObjs_eta", "goodTrigObjs_phi"});
+  auto d1 = d.DefineSlot("Muon_hasTriggerMatch", hasTriggerMatch, {"Muon_eta", "Muon_phi", "TrigObj_id", "TrigObj_pt", "TrigObj_l1pt", "TrigObj_l2pt", "TrigObj_filterBits", "TrigObj_eta", "TrigObj_phi"});
 
   return d1;
 }
@@ -21,8 +21,18 @@ ROOT.gSystem.Load('{}/templateMaker/bin/libAnalysisOnData.so'.format(FWKBASE))
 ROOT.gROOT.ProcessLine("gErrorIgnoreLevel = 2001;")
 
 
+# columns of the 'defs' node kept in the skims, see skimCache
+skimColumns = "^(Mu(1|2)_.*|dimuon(Mass|Pt|Y)|nPV|lumiweight|puWeight.*|muprefireWeight.*|SF.*|totalWeight|MET_T1.*)$"
+
 #Build the template building sequenc
-def dySelectionSequence(p, xsec, systType, sumwClipped, nodetoStart, era):
+def dySelectionSequence(p, xsec, systType, sumwClipped, nodetoStart, era, flatSF=False):
+    dySelection(p, xsec, systType, sumwClipped, nodetoStart, era, flatSF)
+    return dyHistograms(p, systType)
+
+#event selection and weights up to the 'defs' node, this is what goes in the skims
+#flatSF: SFs from the flattened lookup table (SF_ulFlat) instead of SF_ul, same columns
+def dySelection(p, xsec, systType, sumwClipped, nodetoStart, era, flatSF=False):
+    SFmodule = ROOT.SF_ulFlat if flatSF else ROOT.SF_ul
     print(ptBins)
     print(zmassBins)
     luminosityN = lumi_total2016
@@ -40,25 +50,19 @@ def dySelectionSequence(p, xsec, systType, sumwClipped, nodetoStart, era):
     p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="60. < dimuonMass && dimuonMass < 120.", filtername="{:20s}".format("mZ range"))
     p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Mu1_hasTriggerMatch", filtername="{:20s}".format("+ve mu trig matched"))
     
+    if systType != 0: #this is mc
+        print("Sample will be normalized to {}/fb".format(luminosityN))
+        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.lumiWeight(xsec=xsec, sumwclipped=sumwClipped, targetLumi = luminosityN), SFmodule(fileSFul, isZ=True, era=era)])
+    return p
+
+def dyHistograms(p, systType):
+    nom = ROOT.vector('string')()
+    nom.push_back("")
     if systType == 0: #this is data
         weight = 'float(1)'
-        nom = ROOT.vector('string')()
-        nom.push_back("")
         p.branch(nodeToStart='defs', nodeToEnd='muonHistos', modules=[ROOT.zHistosROOT(weight, nom,"Nom", False)])#4th argument needed for Data
         return p
-    elif systType == 1:
-        print("Sample will be normalized to {}/fb".format(luminosityN))
-        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.lumiWeight(xsec=xsec, sumwclipped=sumwClipped, targetLumi = luminosityN), ROOT.SF_ul(fileSFul, isZ=True, era=era)])
-        weight = 'float(lumiweight*puWeight*SF*muprefireWeight)'
-        nom = ROOT.vector('string')()
-        nom.push_back("")
-        p.branch(nodeToStart='defs', nodeToEnd='muonHistos', modules=[ROOT.zHistosROOT(weight, nom,"Nom")])
-        return p
     else:
-        print("Sample will be normalized to {}/fb".format(luminosityN))
-        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.lumiWeight(xsec=xsec, sumwclipped=sumwClipped, targetLumi = luminosityN), ROOT.SF_ul(fileSFul, isZ=True, era=era)])
         weight = 'float(lumiweight*puWeight*SF*muprefireWeight)'
-        nom = ROOT.vector('string')()
-        nom.push_back("")
         p.branch(nodeToStart='defs', nodeToEnd='muonHistos', modules=[ROOT.zHistosROOT(weight, nom,"Nom")])
         return p
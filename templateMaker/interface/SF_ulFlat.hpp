@@ -0,0 +1,104 @@
+#ifndef SF_ULFLAT_H
+#define SF_ULFLAT_H
+
+#include "module.hpp"
+#include "genBinIndexProducer.hpp"
+#include "TFile.h"
+#include "TH2.h"
+#include "TString.h"
+#include <array>
+#include <utility>
+#include <vector>
+#include <iostream>
+
+// same columns as SF_ul, but all the SF histograms are copied at construction in one
+// flat table (contents and errors, one block of nEta*nPt bins per histogram) and the
+// (eta, pt) bin is looked up once per muon and binning, instead of once per histogram
+class SF_ulFlat : public Module
+{
+
+public:
+  // trigger_plus/minus, iso/antiiso and their alt versions are adjacent, so that the
+  // charge and the isolation select a table by index arithmetic
+  enum table
+  {
+    reco,
+    tracking,
+    idip,
+    trigger_plus,
+    trigger_minus,
+    iso,
+    antiiso,
+    iso_notrig,
+    effisomc,
+    effisodata,
+    reco_alt,
+    tracking_alt,
+    idip_alt,
+    trigger_plus_alt,
+    trigger_minus_alt,
+    iso_alt,
+    antiiso_alt,
+    nTables
+  };
+  typedef std::array<int, nTables> binIndices;
+
+private:
+  // distinct (eta, pt) binnings of the tables, usually a single one
+  std::vector<std::pair<std::vector<double>, std::vector<double>>> _binnings;
+  std::vector<binLookup> _etaAxes;
+  std::vector<binLookup> _ptAxes;
+  std::array<int, nTables> _axes;
+  std::array<int, nTables> _offsets;
+  std::vector<float> _val;
+  std::vector<float> _err;
+
+  bool _isZ;
+  // this is only relevant for Z studies
+  int _prefCharge;
+
+  void fill(table t, TFile *SF, const TString &name);
+  binIndices bins(float eta, float pt) const;
+  RVec<float> allSF(float pt, float eta, int charge, float iso) const;
+  float SFZ(float pt1, float eta1, int charge1, float pt2, float eta2) const;
+
+public:
+  SF_ulFlat(TFile *SF, bool isZ = false, std::string era = "preVFP", int prefCharge = 1)
+  {
+    _isZ = isZ;
+    TString tag = "BtoH"; // for all 2016
+    if (era == "preVFP")
+      tag = "BtoF";
+    else if (era == "postVFP")
+      tag = "GtoH";
+    TString version = "nominal";
+
+    std::cout << "SF tag is " << tag << std::endl;
+    fill(reco, SF, "SF2D_" + version + "_reco_" + tag + "_both");
+    fill(tracking, SF, "SF2D_" + version + "_tracking_" + tag + "_both");
+    fill(idip, SF, "SF2D_" + version + "_idip_" + tag + "_both");
+    fill(trigger_plus, SF, "SF2D_" + version + "_trigger_" + tag + "_plus");
+    fill(trigger_minus, SF, "SF2D_" + version + "_trigger_" + tag + "_minus");
+    fill(iso, SF, "SF2D_" + version + "_iso_" + tag + "_both");
+    fill(antiiso, SF, "SF2D_" + version + "_antiiso_" + tag + "_both");
+    fill(iso_notrig, SF, "SF2D_" + version + "_isonotrig_" + tag + "_both");
+    fill(effisomc, SF, "effMC_iso_" + tag + "_both");
+    fill(effisodata, SF, "effData_iso_" + tag + "_both");
+
+    version = "dataAltSig";
+    fill(reco_alt, SF, "SF2D_" + version + "_reco_" + tag + "_both");
+    fill(tracking_alt, SF, "SF2D_" + version + "_tracking_" + tag + "_both");
+    fill(idip_alt, SF, "SF2D_" + version + "_idip_" + tag + "_both");
+    fill(trigger_plus_alt, SF, "SF2D_" + version + "_trigger_" + tag + "_plus");
+    fill(trigger_minus_alt, SF, "SF2D_" + version + "_trigger_" + tag + "_minus");
+    fill(iso_alt, SF, "SF2D_" + version + "_iso_" + tag + "_both");
+    fill(antiiso_alt, SF, "SF2D_" + version + "_antiiso_" + tag + "_both");
+
+    _prefCharge = prefCharge;
+  };
+  ~SF_ulFlat(){};
+
+  RNode run(RNode) override;
+};
+
+#endif
@@ -0,0 +1,49 @@
+#ifndef GENBININDEXPRODUCER_H
+#define GENBININDEXPRODUCER_H
+
+#include "module.hpp"
+#include <vector>
+
+// bin lookup on a fixed set of edges, with a fast path for uniform binnings;
+// find() clamps the index to [0, nbins-1] (the upper edge goes to the last bin),
+// index() returns -1 out of range, as TH1::FindBin puts the upper edge in the overflow
+class binLookup
+{
+
+private:
+  std::vector<double> _edges;
+  bool _uniform;
+  double _lo;
+  double _invWidth;
+
+public:
+  binLookup(){};
+  binLookup(const std::vector<double> &edges);
+  ~binLookup(){};
+
+  int nbins() const { return _edges.size() - 1; };
+  int find(float x) const;
+  int index(float x) const;
+};
+
+class genBinIndexProducer : public Module
+{
+
+private:
+  binLookup _yBins;
+  binLookup _qtBins;
+  binLookup _cosThetaBins;
+
+public:
+  genBinIndexProducer(const std::vector<double> &yBins, const std::vector<double> &qtBins, const std::vector<double> &cosThetaBins)
+  {
+    _yBins = binLookup(yBins);
+    _qtBins = binLookup(qtBins);
+    _cosThetaBins = binLookup(cosThetaBins);
+  };
+  ~genBinIndexProducer(){};
+
+  RNode run(RNode) override;
+};
+
+#endif
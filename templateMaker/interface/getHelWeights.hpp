@@ -0,0 +1,40 @@
+#ifndef GETHELWEIGHTS_H
+#define GETHELWEIGHTS_H
+
+#include "module.hpp"
+#include <string>
+#include <vector>
+
+class getHelWeights : public Module
+{
+
+private:
+  // angular coefficients per (y, qt) bin, flattened as [y][qt][coeff][var]
+  std::vector<double> _coeffs;
+  // total cross section per (y, qt) bin, flattened as [y][qt][var]
+  std::vector<double> _totxsecs;
+  unsigned int _nqt;
+
+  std::string _syst;
+  unsigned int _nvar;
+
+  // per-slot work buffers, reused across events
+  std::vector<std::vector<double>> _norm;
+  std::vector<std::vector<float>> _weights;
+  std::vector<unsigned int> _offset;
+
+  static const unsigned int _ncoeff = 9;
+
+  void fill(unsigned int slot, int iy, int iqt, const RVec<float> &harms, const float *systWeights);
+
+public:
+  // xsecs and totxsecs are the flattened 'xsecs<syst>' and 'totxsecs<syst>' tables of the
+  // helicity weights file, syst is "" for the nominal or e.g. "LHEPdfWeight";
+  // the edges must match the ones used by genBinIndexProducer
+  getHelWeights(const std::vector<double> &xsecs, const std::vector<double> &totxsecs, const std::vector<double> &yBins, const std::vector<double> &qtBins, std::string syst = "");
+  ~getHelWeights(){};
+
+  RNode run(RNode) override;
+};
+
+#endif
@@ -0,0 +1,264 @@
+#ifndef MULTIWEIGHTHISTO_H
+#define MULTIWEIGHTHISTO_H
+
+#include "module.hpp"
+#include "genBinIndexProducer.hpp"
+#include "ROOT/RDF/ActionHelpers.hxx"
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <string>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+template <std::size_t>
+using floatColumn = float;
+
+// sums of weights and of squared weights, flattened as [bin][i][j]
+struct factorisedHisto
+{
+  std::vector<double> sumw;
+  std::vector<double> sumw2;
+};
+
+// global bin of a set of float columns, -1 if any of them is out of range
+template <typename Seq>
+class binLocator;
+
+template <std::size_t... I>
+class binLocator<std::index_sequence<I...>>
+{
+
+private:
+  std::vector<binLookup> _axes;
+
+public:
+  binLocator(const std::vector<std::vector<double>> &bins)
+  {
+    for (auto &edges : bins)
+      _axes.emplace_back(edges);
+  };
+
+  int operator()(floatColumn<I>... vals) const
+  {
+    const float x[] = {vals...};
+    int bin = 0;
+    for (unsigned int iaxis = 0; iaxis < _axes.size(); iaxis++)
+    {
+      int ibin = _axes[iaxis].index(x[iaxis]);
+      if (ibin < 0)
+        return -1;
+      bin = bin * _axes[iaxis].nbins() + ibin;
+    }
+    return bin;
+  };
+};
+
+// [bin][weight] accumulators of the multi-weight actions: each slot fills a buffer
+// of its own, a full copy of the histogram when the copies of all the slots fit in
+// memory, otherwise a partial one holding a limited number of bins, which is added
+// to the result (under a lock per group of bins) whenever it runs out of rows
+class multiWeightBuffers
+{
+
+private:
+  struct slotBuffer
+  {
+    std::vector<double> sumw;
+    std::vector<double> sumw2;
+    // bin -> row of the partial buffer, and back
+    std::unordered_map<int, unsigned int> rows;
+    std::vector<int> bins;
+  };
+
+  unsigned int _nbins;
+  unsigned int _nweights;
+  unsigned int _nrows;
+  bool _partial;
+  bool _sumw2;
+
+  std::shared_ptr<factorisedHisto> _result;
+  std::vector<slotBuffer> _slots;
+  std::unique_ptr<std::mutex[]> _locks;
+
+  std::size_t offset(unsigned int slot, int bin);
+  void flush(unsigned int slot);
+
+public:
+  multiWeightBuffers(unsigned int nbins, unsigned int nweights, unsigned int nslots, bool sumw2);
+  multiWeightBuffers(multiWeightBuffers &&) = default;
+  multiWeightBuffers(const multiWeightBuffers &) = delete;
+  ~multiWeightBuffers(){};
+
+  std::shared_ptr<factorisedHisto> result() const { return _result; };
+  void init(unsigned int slot);
+  void finalize();
+
+  void fill(unsigned int slot, int bin, double weight, const RVec<float> &w);
+  void fill(unsigned int slot, int bin, double weight, const RVec<float> &v1, const RVec<float> &v2);
+};
+
+// columns: {bin index, weights vector, scalar weights...}
+class multiWeightHistoHelper : public ROOT::Detail::RDF::RActionImpl<multiWeightHistoHelper>
+{
+
+private:
+  multiWeightBuffers _buffers;
+
+public:
+  using Result_t = factorisedHisto;
+
+  multiWeightHistoHelper(multiWeightBuffers &&buffers) : _buffers(std::move(buffers)){};
+  multiWeightHistoHelper(multiWeightHistoHelper &&) = default;
+  multiWeightHistoHelper(const multiWeightHistoHelper &) = delete;
+
+  std::shared_ptr<factorisedHisto> GetResultPtr() const { return _buffers.result(); };
+  void Initialize(){};
+  void InitTask(TTreeReader *, unsigned int slot) { _buffers.init(slot); };
+  void Finalize() { _buffers.finalize(); };
+  std::string GetActionName() { return "multiWeightHisto"; };
+
+  template <typename... Vals>
+  void Exec(unsigned int slot, int bin, const RVec<float> &w, Vals... vals)
+  {
+    if (bin < 0)
+      return;
+    _buffers.fill(slot, bin, (1. * ... * double(vals)), w);
+  };
+};
+
+// columns: {bin index, v1, v2, scalar weights...}, entries are v1[i]*v2[j]
+class outerProductHistoHelper : public ROOT::Detail::RDF::RActionImpl<outerProductHistoHelper>
+{
+
+private:
+  multiWeightBuffers _buffers;
+
+public:
+  using Result_t = factorisedHisto;
+
+  outerProductHistoHelper(multiWeightBuffers &&buffers) : _buffers(std::move(buffers)){};
+  outerProductHistoHelper(outerProductHistoHelper &&) = default;
+  outerProductHistoHelper(const outerProductHistoHelper &) = delete;
+
+  std::shared_ptr<factorisedHisto> GetResultPtr() const { return _buffers.result(); };
+  void Initialize(){};
+  void InitTask(TTreeReader *, unsigned int slot) { _buffers.init(slot); };
+  void Finalize() { _buffers.finalize(); };
+  std::string GetActionName() { return "outerProductHisto"; };
+
+  template <typename... Vals>
+  void Exec(unsigned int slot, int bin, const RVec<float> &v1, const RVec<float> &v2, Vals... vals)
+  {
+    if (bin < 0)
+      return;
+    _buffers.fill(slot, bin, (1. * ... * double(vals)), v1, v2);
+  };
+};
+
+// defines the global bin index of the given columns, so that all the
+// histograms filled on a node with the same binning share one bin search
+class defineBinIndex : public Module
+{
+
+private:
+  std::string _name;
+  std::vector<std::vector<double>> _bins;
+  std::vector<std::string> _columns;
+
+  template <std::size_t N>
+  RNode defineN(RNode d)
+  {
+    if (_columns.size() == N)
+      return d.Define(_name, binLocator<std::make_index_sequence<N>>(_bins), _columns);
+    return defineN<N - 1>(d);
+  };
+
+public:
+  defineBinIndex(std::string name, std::vector<std::vector<double>> bins, std::vector<std::string> columns)
+  {
+    _name = name;
+    _bins = bins;
+    _columns = columns;
+  };
+  ~defineBinIndex(){};
+
+  RNode run(RNode) override;
+};
+
+template <>
+inline RNode defineBinIndex::defineN<0>(RNode)
+{
+  throw std::runtime_error("defineBinIndex: unsupported number of columns");
+}
+
+// histogram with one entry per element of a weight vector (v2 empty) or of the
+// outer product v1 x v2, filled from a bin index column defined by defineBinIndex
+class multiWeightHisto : public Module
+{
+
+private:
+  std::string _binColumn;
+  unsigned int _nbins;
+  std::vector<std::string> _weights;
+  std::string _v1;
+  std::string _v2;
+  unsigned int _n1;
+  unsigned int _n2;
+  bool _sumw2;
+
+  ROOT::RDF::RResultPtr<factorisedHisto> _result;
+
+  multiWeightBuffers buffers(RNode d) { return multiWeightBuffers(_nbins, _n1 * _n2, d.GetNSlots(), _sumw2); };
+
+  template <std::size_t... I>
+  ROOT::RDF::RResultPtr<factorisedHisto> book(RNode d, std::index_sequence<I...>)
+  {
+    std::vector<std::string> columns = {_binColumn, _v1};
+    if (_v2.empty())
+    {
+      columns.insert(columns.end(), _weights.begin(), _weights.end());
+      return d.Book<int, RVec<float>, floatColumn<I>...>(multiWeightHistoHelper(buffers(d)), columns);
+    }
+    columns.push_back(_v2);
+    columns.insert(columns.end(), _weights.begin(), _weights.end());
+    return d.Book<int, RVec<float>, RVec<float>, floatColumn<I>...>(outerProductHistoHelper(buffers(d)), columns);
+  };
+
+  template <std::size_t N>
+  ROOT::RDF::RResultPtr<factorisedHisto> bookN(RNode d)
+  {
+    if (_weights.size() == N)
+      return book(d, std::make_index_sequence<N>{});
+    return bookN<N - 1>(d);
+  };
+
+public:
+  // weights: scalar weight columns (float), v1/v2: weight vectors of size n1 and n2
+  multiWeightHisto(std::string binColumn, unsigned int nbins, std::vector<std::string> weights, std::string v1, unsigned int n1, std::string v2 = "", unsigned int n2 = 1, bool sumw2 = true)
+  {
+    _binColumn = binColumn;
+    _nbins = nbins;
+    _weights = weights;
+    _v1 = v1;
+    _n1 = n1;
+    _v2 = v2;
+    _n2 = v2.empty() ? 1 : n2;
+    _sumw2 = sumw2;
+  };
+  ~multiWeightHisto(){};
+
+  RNode run(RNode) override;
+  const factorisedHisto &getResult() { return *_result; };
+};
+
+template <>
+inline ROOT::RDF::RResultPtr<factorisedHisto> multiWeightHisto::bookN<0>(RNode d)
+{
+  if (!_weights.empty())
+    throw std::runtime_error("multiWeightHisto: unsupported number of weight columns");
+  return book(d, std::make_index_sequence<0>{});
+}
+
+#endif
@@ -0,0 +1,61 @@
+#ifndef OUTERPRODUCT_H
+#define OUTERPRODUCT_H
+
+#include "module.hpp"
+#include <string>
+#include <vector>
+
+// out[i*n2+j] = v1[i]*v2[j], out must hold n1*n2 elements
+inline void outerProductInto(const float *v1, unsigned int n1, const float *v2, unsigned int n2, float *out)
+{
+  for (unsigned int i = 0; i < n1; i++)
+  {
+    const float e1 = v1[i];
+    float *row = out + i * n2;
+    for (unsigned int j = 0; j < n2; j++)
+      row[j] = e1 * v2[j];
+  }
+}
+
+// callable for DefineSlot: the product is written into a per-slot buffer
+// that is allocated once and reused for every event, the returned RVec is a
+// non-owning view of it and is only valid for the current event
+class outerProduct
+{
+
+private:
+  std::vector<std::vector<float>> _buffers;
+
+public:
+  outerProduct(unsigned int nslots = 1, unsigned int size = 0)
+  {
+    _buffers.resize(nslots, std::vector<float>(size));
+  };
+  ~outerProduct(){};
+
+  RVec<float> operator()(unsigned int slot, const RVec<float> &v1, const RVec<float> &v2);
+};
+
+class defineOuterProduct : public Module
+{
+
+private:
+  std::string _name;
+  std::string _v1;
+  std::string _v2;
+  unsigned int _size;
+
+public:
+  defineOuterProduct(std::string name, std::string v1, std::string v2, unsigned int size = 0)
+  {
+    _name = name;
+    _v1 = v1;
+    _v2 = v2;
+    _size = size;
+  };
+  ~defineOuterProduct(){};
+
+  RNode run(RNode) override;
+};
+
+#endif
@@ -0,0 +1,81 @@
+from module import *
+import h5py
+import numpy as np
+import binning
+
+class getHelWeights(module):
+
+    def __init__(self, helwtFile, syst = ""):
+        self.helwtFile=helwtFile
+        self.syst = syst
+        pass
+
+    def toVector(self, arr):
+        # one copy of the (C ordered) table into the vector storage
+        vec = ROOT.std.vector('double')(arr.size)
+        if arr.size > 0:
+            np.frombuffer(vec.data(), dtype='float64', count=vec.size())[:] = np.ravel(arr)
+        return vec
+
+    def run(self,d):
+        suffix = "" if self.syst == "" else "_"+self.syst
+
+        # tables are read once here and handed to the compiled module,
+        # which owns them for the whole event loop
+        f = h5py.File(self.helwtFile, mode='r')
+        htot = f['totxsecs'+suffix][:]
+        h = f['xsecs'+suffix][:]
+        yBins = f['edges_totxsecs_0'][:]
+        qtBins = f['edges_totxsecs_1'][:]
+        f.close()
+        if not (np.allclose(yBins, binning.yBins) and np.allclose(qtBins, binning.qtBins)):
+            raise ValueError("{}: y/qt edges differ from the ones used for iy_preFSR/iqt_preFSR".format(self.helwtFile))
+
+        # keep a reference: the C++ module must outlive the RDF graph
+        self.helWeights = ROOT.getHelWeights(self.toVector(h), self.toVector(htot), self.toVector(yBins), self.toVector(qtBins), self.syst)
+        self.d = self.helWeights.run(ROOT.RDF.AsRNode(d))
+        return self.d
+
+    def getTH1(self):
+
+        return self.myTH1
+
+    def getTH2(self):
+
+        return self.myTH2
+
+    def getTH3(self):
+
+        return self.myTH3
+
+    def getTHN(self):
+
+        return self.myTHN
+
+    def getGroupTH1(self):
+
+        return self.myTH1Group
+
+    def getGroupTH2(self):
+
+        return self.myTH2Group
+
+    def getGroupTH3(self):
+
+        return self.myTH3Group
+
+    def getGroupTHN(self):
+
+        return self.myTHNGroup
+
+    def reset(self):
+
+        self.myTH1 = []
+        self.myTH2 = []
+        self.myTH3 = []
+        self.myTHN = []
+
+        self.myTH1Group = []
+        self.myTH2Group = []
+        self.myTH3Group = []
+        self.myTHNGroup = []
@@ -31,15 +31,9 @@ class getMassWeightsWminus(module):
                     s_hat = np.power(genMass,2)
                     weights[i] = (np.power(s_hat - m0*m0,2) + np.power(gamma*m0,2)) / (np.power(s_hat - newmass*newmass,2) + np.power(gamma*newmass,2))
                 return weights
-            @ROOT.Numba.Declare(["RVec<float>", "RVec<float>"], "RVec<float>")
-            def vecMultiplication_Wminus(v1, v2):
-                products = np.zeros((v1.shape[0],v2.shape[0]),dtype='float32')
-                for i in range(products.shape[0]):
-                  for j in range(products.shape[1]):
-                    products[i,j] = v1[i]*v2[j]
-                return products.ravel()
         self.d = d
-        self.d = self.d.Define("massWeights","Numba::getMassWeights_Wminus(MEParamWeight)").Define("helmassweights","Numba::vecMultiplication_Wminus(helWeights,massWeights)")
+        self.d = self.d.Define("massWeights","Numba::getMassWeights_Wminus(MEParamWeight)")
+        self.d = ROOT.defineOuterProduct("helmassweights", "helWeights", "massWeights", 9*2).run(ROOT.RDF.AsRNode(self.d))
         return self.d
 
     def getTH1(self):
@@ -1,5 +1,4 @@
-from getHelWeightsWplus import getHelWeightsWplus
-from getHelWeightsWminus import getHelWeightsWminus
+from getHelWeights import getHelWeights
 
 from reweightyqtWplus import reweightyqtWplus
 from reweightyqtWminus import reweightyqtWminus
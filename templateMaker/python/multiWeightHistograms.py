@@ -0,0 +1,52 @@
+import ROOT
+import h5py
+import numpy as np
+
+# multiWeightHisto modules booked on each RDFtree, written out after the event loop
+fillers = {}
+# bin index columns already defined, keyed by (RDFtree, node, axis columns, bins)
+binIndices = {}
+
+def toVector(values, typ='double'):
+    vec = ROOT.std.vector(typ)()
+    for x in values:
+        vec.push_back(x)
+    return vec
+
+def binIndexColumn(p, node, bins, axes):
+    # one bin search per event for all the histograms sharing node and binning
+    key = (p, node, tuple(axes), tuple(tuple(edges) for edges in bins))
+    if not key in binIndices:
+        name = 'binIndex_{}'.format(len(binIndices))
+        vbins = ROOT.std.vector(ROOT.std.vector('double'))()
+        for edges in bins:
+            vbins.push_back(toVector(edges))
+        p.branch(nodeToStart=node, nodeToEnd=node, modules=[ROOT.defineBinIndex(name, vbins, toVector(axes, 'string'))])
+        binIndices[key] = name
+    return binIndices[key]
+
+def multiWeightHistogram(p, node, histoname, bins, columns, weights, sumw2=True):
+    # same as p.Histogram(..., sample=(vector, n)) for weights=[(vector, n)], while for
+    # weights=[(v1, n1), (v2, n2)] the outer product v1 x v2 is accumulated directly
+    # instead of being defined as a column; columns are the axes followed by the scalar weights
+    axes, scalars = columns[:len(bins)], columns[len(bins):]
+    nbins = int(np.prod([len(edges)-1 for edges in bins]))
+    (v1, n1), (v2, n2) = weights[0], weights[1] if len(weights) > 1 else ("", 1)
+    filler = ROOT.multiWeightHisto(binIndexColumn(p, node, bins, axes), nbins, toVector(scalars, 'string'), v1, n1, v2, n2, sumw2)
+    p.branch(nodeToStart=node, nodeToEnd=node, modules=[filler])
+    fillers.setdefault(p, []).append((histoname, bins, n1*n2, filler))
+    return p
+
+def writeMultiWeightHistograms(p, outputFile):
+    # same layout as the RDFtree hdf5 output: histoname, histoname_sumw2 and edges_histoname_i
+    if not p in fillers: return
+    f = h5py.File(outputFile, mode='a')
+    for histoname, bins, nsample, filler in fillers[p]:
+        shape = tuple(len(edges)-1 for edges in bins) + (nsample,)
+        result = filler.getResult()
+        for name, vec in [(histoname, result.sumw), (histoname+'_sumw2', result.sumw2)]:
+            if vec.size() == 0: continue
+            f.create_dataset(name, data=np.frombuffer(vec.data(), dtype='float64', count=vec.size()).reshape(shape))
+        for i, edges in enumerate(bins):
+            f.create_dataset('edges_{}_{}'.format(histoname, i), data=np.array(edges))
+    f.close()
@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import uuid
+import socket
+import subprocess
+import h5py
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# partitioned processing of the sample file lists: each chunk of files is an
+# independent task writing its own partial hdf5 output, so that a failed job only
+# loses the chunks that were running. Tasks are claimed through lock files, so
+# several drivers sharing the output filesystem split the work among themselves.
+# A running task keeps touching its lock (heartbeat), so a lock is only stale when
+# its job died.
+
+class chunkTask:
+    def __init__(self, era, sample, ichunk, files, partialDir):
+        self.era = era
+        self.sample = sample
+        self.ichunk = ichunk
+        self.files = files
+        self.partialDir = partialDir
+        self.name = '{}_chunk{:04d}'.format(sample, ichunk)
+        self.partial = '{}/{}.hdf5'.format(partialDir, self.name)
+        self.doneMarker = '{}/{}.done'.format(partialDir, self.name)
+        self.lock = '{}/{}.lock'.format(partialDir, self.name)
+        self.owner = None
+
+    def done(self):
+        return os.path.exists(self.doneMarker)
+
+    def claim(self, lockTimeout):
+        # atomic on a shared filesystem, locks not touched for lockTimeout (s) belong to dead jobs
+        os.makedirs(self.partialDir, exist_ok=True)
+        if self.stale(lockTimeout):
+            self.takeOver(lockTimeout)
+        self.owner = '{} {} {}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        try:
+            fd = os.open(self.lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.owner+'\n')
+        return True
+
+    def stale(self, lockTimeout, lock=None):
+        try:
+            return time.time() - os.path.getmtime(lock or self.lock) > lockTimeout
+        except FileNotFoundError:
+            return False
+
+    def takeOver(self, lockTimeout):
+        # the stale lock is renamed to a name of our own, which only one of the jobs finding
+        # it stale can do; a lock found fresh once moved was just created by another job
+        # (after the stale one was taken over), so it is put back
+        moved = '{}.stale.{}'.format(self.lock, uuid.uuid4().hex)
+        try:
+            os.rename(self.lock, moved)
+        except FileNotFoundError:
+            return
+        if not self.stale(lockTimeout, moved):
+            try:
+                os.link(moved, self.lock)
+            except FileExistsError:
+                pass
+        os.remove(moved)
+
+    def owns(self):
+        try:
+            with open(self.lock) as f:
+                return f.read().strip() == self.owner
+        except FileNotFoundError:
+            return False
+
+    def heartbeat(self, interval):
+        # touches the lock every interval (s) from a separate process, the event loop holds the GIL
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), 'heartbeat', self.lock, self.owner, str(interval), str(os.getpid())])
+
+    def release(self):
+        if self.owns():
+            os.remove(self.lock)
+
+    def markDone(self):
+        with open(self.doneMarker, 'w') as f:
+            f.write('\n'.join(self.files)+'\n')
+        self.release()
+
+def chunkFiles(files, chunkSize):
+    files = sorted(files)
+    return [files[i:i+chunkSize] for i in range(0, len(files), chunkSize)]
+
+def runTask(worker, task, lockTimeout, *args):
+    if task.done() or not task.claim(lockTimeout):
+        return task, False
+    heartbeat = task.heartbeat(min(lockTimeout/4., 600.))
+    try:
+        worker(task, *args)
+    except:
+        task.release()
+        raise
+    finally:
+        heartbeat.terminate()
+        heartbeat.wait()
+    task.markDone()
+    return task, True
+
+def runTasks(worker, tasks, njobs, lockTimeout, *args):
+    # worker(task, *args) runs in a fresh process: ROOT does not survive a fork
+    # once the interpreter and the thread pool are initialised
+    failed = []
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=njobs, mp_context=ctx) as pool:
+        futures = {pool.submit(runTask, worker, task, lockTimeout, *args): task for task in tasks if not task.done()}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                _, processed = future.result()
+                print(task.era, task.name, 'done' if processed else 'claimed by another job')
+            except Exception as e:
+                print(task.era, task.name, 'FAILED:', e)
+                failed.append(task)
+    return failed
+
+def mergePartials(partials, outputFile, blockSize=1<<27):
+    # sum the histograms of the partial outputs, the edges are copied from the first one having them;
+    # large datasets are summed in blocks along the first axis to bound the memory.
+    # A dataset missing from some partials (e.g. nothing booked for it in that chunk)
+    # counts as zero there
+    tmpFile = outputFile + '.tmp'
+    fins = [h5py.File(partial, mode='r') for partial in partials]
+    names = []
+    for fin in fins:
+        names.extend(name for name in fin if not name in names)
+    fout = h5py.File(tmpFile, mode='w')
+    for name in names:
+        having = [fin for fin in fins if name in fin]
+        dset = having[0][name]
+        if name.startswith('edges_') or dset.ndim == 0:
+            fout.create_dataset(name, data=dset[...])
+            continue
+        if len(having) < len(fins):
+            print("WARNING: {} missing from {} of {} partials, taken as zero there".format(name, len(fins)-len(having), len(fins)))
+        out = fout.create_dataset(name, shape=dset.shape, dtype=dset.dtype)
+        rowSize = max(1, dset.size // max(1, dset.shape[0]) * dset.dtype.itemsize)
+        step = max(1, blockSize // rowSize)
+        for start in range(0, dset.shape[0], step):
+            sl = slice(start, min(start+step, dset.shape[0]))
+            acc = np.zeros((sl.stop-sl.start,)+dset.shape[1:], dtype=dset.dtype)
+            for fin in having:
+                acc += fin[name][sl]
+            out[sl] = acc
+    fout.close()
+    for fin in fins:
+        fin.close()
+    os.replace(tmpFile, outputFile)
+
+def heartbeat(lock, owner, interval, parentPid):
+    # while the parent is alive and still owns the lock
+    while os.getppid() == parentPid:
+        try:
+            with open(lock) as f:
+                if f.read().strip() != owner:
+                    return
+            os.utime(lock)
+        except FileNotFoundError:
+            return
+        time.sleep(interval)
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'heartbeat':
+        heartbeat(sys.argv[2], sys.argv[3], float(sys.argv[4]), int(sys.argv[5]))
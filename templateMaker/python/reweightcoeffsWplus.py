@@ -1,5 +1,6 @@
 from module import *
 import h5py
+import binning
 import numpy as np
 import matplotlib.pyplot as plt
 import mplhep as hep
@@ -41,25 +42,29 @@ class reweightcoeffsWplus(module):
         fcoeffs = ROOT.TFile.Open(self.getnInfputFile)
         
         hists_aMC = []
+        edges_aMC = []
         for i in range(5):
-            tmp = hist2array(fcoeffs.Get('angularCoefficients/harmonicsA{}_nom_nom'.format(i)))
+            tmp, edges = hist2array(fcoeffs.Get('angularCoefficients/harmonicsA{}_nom_nom'.format(i)), return_edges=True)
             hists_aMC.append(tmp)
+            edges_aMC.append(edges)
 
         coeffs_aMC_stack = np.stack(hists_aMC,axis=-1)
+        # the tables are indexed with iy_preFSR/iqt_preFSR from genBinIndexProducer
+        nBins = (len(binning.yBins)-1, len(binning.qtBins)-1)
+        if coeffs_powheg.shape[:2] != nBins or coeffs_aMC_stack.shape[:2] != nBins:
+            raise ValueError("reweightcoeffsWplus: coefficient tables of shape {}/{} do not match the y/qt binning {}".format(coeffs_powheg.shape[:2], coeffs_aMC_stack.shape[:2], nBins))
+        edgesList = [(f['edges_xsecs_0'][:], f['edges_xsecs_1'][:]) for f in (f_preVFP, f_postVFP)] + [edges[:2] for edges in edges_aMC]
+        for yEdges, qtEdges in edgesList:
+            if not (np.shape(yEdges) == np.shape(binning.yBins) and np.allclose(yEdges, binning.yBins) and np.shape(qtEdges) == np.shape(binning.qtBins) and np.allclose(qtEdges, binning.qtBins)):
+                raise ValueError("reweightcoeffsWplus: y/qt edges differ from the ones used for iy_preFSR/iqt_preFSR")
         coeffs_aMC = np.copy(coeffs_powheg)
         coeffs_aMC[...,4]=coeffs_aMC_stack[...,4]
         # print(coeffs_powheg[...,0], 'powheg')
         # print(coeffs_aMC[...,0], 'aMC')
 
-        yBins = f_preVFP['edges_xsecs_0'][:]
-        qtBins = f_preVFP['edges_xsecs_1'][:]
-
         if self.era =="preVFP":
-            @ROOT.Numba.Declare(["float", "float", "RVec<float>"], "float")
-            def getNormRatio_Wplus(y, pt,harms):
-                biny = np.digitize(np.array([y]), yBins)[0]-1
-                binpt = np.digitize(np.array([pt]), qtBins)[0]-1
-    
+            @ROOT.Numba.Declare(["int", "int", "RVec<float>"], "float")
+            def getNormRatio_Wplus(biny, binpt,harms):
                 norm_aMC =harms[-1] #1+cos^2 theta
                 norm_powheg =harms[-1] #1+cos^2 theta
                 for i in range(coeffs_aMC.shape[0]):
@@ -67,7 +72,7 @@ class reweightcoeffsWplus(module):
                     norm_powheg += coeffs_powheg[biny,binpt,i]*harms[i]
                 return norm_aMC/norm_powheg
         self.d = d
-        self.d = self.d.Define("coeffsweight", "Numba::getNormRatio_Wplus(Vrap_preFSR_abs, Vpt_preFSR,harmonicsVec)")
+        self.d = self.d.Define("coeffsweight", "Numba::getNormRatio_Wplus(iy_preFSR, iqt_preFSR,harmonicsVec)")
         # data=self.d.AsNumpy(columns=["coeffsweight","Vrap_preFSR_abs", "Vpt_preFSR"])
         # print(np.isinf(data["coeffsweight"]).any(),np.isinf(data["Vrap_preFSR_abs"]).any(),np.isinf(data["Vpt_preFSR"]).any())
         # idx=np.where(np.isinf(data["coeffsweight"]))
@@ -1,5 +1,6 @@
 from module import *
 import h5py
+import binning
 import numpy as np
 import matplotlib
 matplotlib.use('pdf')
@@ -49,27 +50,32 @@ class reweightycostheta(module):
         plt.clf()
 
         h = costheta_aMC/costheta_powheg
+        # the table is indexed with iy_preFSR/icostheta from genBinIndexProducer
+        nBins = (len(binning.yBins)-1, len(binning.cosThetaBins)-1)
+        if h.shape != nBins:
+            raise ValueError("reweightycostheta: y/costheta table of shape {} does not match the binning {}".format(h.shape, nBins))
+        for fcos in (f, f0J, f1J, f2J):
+            yEdges = fcos['edges_costheta_0'][:]
+            cosThetaEdges = fcos['edges_costheta_1'][:]
+            if not (np.shape(yEdges) == np.shape(binning.yBins) and np.allclose(yEdges, binning.yBins) and np.shape(cosThetaEdges) == np.shape(binning.cosThetaBins) and np.allclose(cosThetaEdges, binning.cosThetaBins)):
+                raise ValueError("reweightycostheta: {}: y/costheta edges differ from the ones used for iy_preFSR/icostheta".format(fcos.filename))
         # print(h)
         if self.era =="preVFP":
-            @ROOT.Numba.Declare(["float","float"], "float")
-            def getWeight_preVFP(y,costheta):
-                biny = np.digitize(np.array([y]), yBins)[0]-1
-                bincostheta = np.digitize(np.array([costheta]), cosThetaBins)[0]-1
+            @ROOT.Numba.Declare(["int","int","float","float"], "float")
+            def getWeight_preVFP(biny,bincostheta,y,costheta):
                 if not (y==4.717765 and costheta==1.):
                     return h[biny,bincostheta]
                 else: return 1.
             self.d = d
-            self.d = self.d.Define("ycosthetaweight", "Numba::getWeight_preVFP(Vrap_preFSR_abs,CStheta_preFSR)")#.Filter("ycosthetaweight>2.")
+            self.d = self.d.Define("ycosthetaweight", "Numba::getWeight_preVFP(iy_preFSR,icostheta,Vrap_preFSR_abs,CStheta_preFSR)")#.Filter("ycosthetaweight>2.")
         else:
-            @ROOT.Numba.Declare(["float","float"], "float")
-            def getWeight_postVFP(y,costheta):
-                biny = np.digitize(np.array([y]), yBins)[0]-1
-                bincostheta = np.digitize(np.array([costheta]), cosThetaBins)[0]-1
+            @ROOT.Numba.Declare(["int","int","float","float"], "float")
+            def getWeight_postVFP(biny,bincostheta,y,costheta):
                 if not (y==4.717765 and costheta==1.):
                     return h[biny,bincostheta]
                 else: return 1.
             self.d = d
-            self.d = self.d.Define("ycosthetaweight", "Numba::getWeight_postVFP(Vrap_preFSR_abs,CStheta_preFSR)")#.Filter("ycosthetaweight>2.")
+            self.d = self.d.Define("ycosthetaweight", "Numba::getWeight_postVFP(iy_preFSR,icostheta,Vrap_preFSR_abs,CStheta_preFSR)")#.Filter("ycosthetaweight>2.")
         # node = self.d.AsNumpy()
         # print('getWeight({},{}) = {}'.format(node['Vrap_preFSR_abs'],node['CStheta_preFSR'], node['ycosthetaweight']))
 
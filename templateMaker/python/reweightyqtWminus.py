@@ -1,5 +1,6 @@
 from module import *
 import h5py
+import binning
 import numpy as np
 import matplotlib.pyplot as plt
 import mplhep as hep
@@ -23,31 +24,31 @@ class reweightyqtWminus(module):
         fin = h5py.File(file_in, mode='r+')
         
         qt_powheg = fin['qtycostheta'][:]
-        qt_aMC = hist2array(f.Get('angularCoefficients_Wminus/YqTcT'))
+        qt_aMC, edges_aMC = hist2array(f.Get('angularCoefficients_Wminus/YqTcT'), return_edges=True)
         if self.era =="preVFP": qt_aMC*=19.514702645/35.9
         else: qt_aMC*=16.810812618/35.9
 
         h=np.sum(qt_aMC,axis=-1)/np.sum(qt_powheg,axis=-1)
-        
-        yBins = fin['edges_qtycostheta_0'][:]
-        qtBins = fin['edges_qtycostheta_1'][:]
+        # the table is indexed with iy_preFSR/iqt_preFSR from genBinIndexProducer
+        nBins = (len(binning.yBins)-1, len(binning.qtBins)-1)
+        if h.shape != nBins:
+            raise ValueError("reweightyqtWminus: y/qt table of shape {} does not match the binning {}".format(h.shape, nBins))
+        for yEdges, qtEdges in [(fin['edges_qtycostheta_0'][:], fin['edges_qtycostheta_1'][:]), edges_aMC[:2]]:
+            if not (np.shape(yEdges) == np.shape(binning.yBins) and np.allclose(yEdges, binning.yBins) and np.shape(qtEdges) == np.shape(binning.qtBins) and np.allclose(qtEdges, binning.qtBins)):
+                raise ValueError("reweightyqtWminus: y/qt edges differ from the ones used for iy_preFSR/iqt_preFSR")
 
         if self.era =="preVFP":
-            @ROOT.Numba.Declare(["float","float"], "float")
-            def getWeightqt_preVFP_Wminus(y,pt):
-                biny = np.digitize(np.array([y]), yBins)[0]-1
-                binpt = np.digitize(np.array([pt]), qtBins)[0]-1
+            @ROOT.Numba.Declare(["int","int"], "float")
+            def getWeightqt_preVFP_Wminus(biny,binpt):
                 return h[biny,binpt]
             self.d = d
-            self.d = self.d.Define("yqtweight", "Numba::getWeightqt_preVFP_Wminus(Vrap_preFSR_abs, Vpt_preFSR)")
+            self.d = self.d.Define("yqtweight", "Numba::getWeightqt_preVFP_Wminus(iy_preFSR, iqt_preFSR)")
         else:
-            @ROOT.Numba.Declare(["float","float"], "float")
-            def getWeightqt_postVFP_Wminus(y,pt):
-                biny = np.digitize(np.array([y]), yBins)[0]-1
-                binpt = np.digitize(np.array([pt]), qtBins)[0]-1
+            @ROOT.Numba.Declare(["int","int"], "float")
+            def getWeightqt_postVFP_Wminus(biny,binpt):
                 return h[biny,binpt]
             self.d = d
-            self.d = self.d.Define("yqtweight", "Numba::getWeightqt_postVFP_Wminus(Vrap_preFSR_abs, Vpt_preFSR)")
+            self.d = self.d.Define("yqtweight", "Numba::getWeightqt_postVFP_Wminus(iy_preFSR, iqt_preFSR)")
 
             # data=self.d.AsNumpy(columns=["yqtweight","Vrap_preFSR_abs", "Vpt_preFSR"])
             # print(np.isinf(data["yqtweight"]).any(),np.isinf(data["Vrap_preFSR_abs"]).any(),np.isinf(data["Vpt_preFSR"]).any())
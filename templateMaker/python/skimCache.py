@@ -0,0 +1,47 @@
+import os
+import json
+import inspect
+import hashlib
+from snapshotSkim import snapshotSkim
+
+class skimCache:
+    # snapshot of the selected events of a sample at a given node, reused as long
+    # as the selection producing it is unchanged. The key hashes the selection
+    # config, the source of the python sequences and the compiled libraries.
+    def __init__(self, skimDir, sample, era, config, sequences=[], libraries=[]):
+        self.skimDir = skimDir
+        self.sample = sample
+        self.era = era
+        self.key = self.selectionKey(config, sequences, libraries)
+        self.path = '{}/{}/{}_{}.root'.format(skimDir, era, sample, self.key)
+        self.tmpPath = self.path + '.tmp'
+        self.module = None
+
+    def selectionKey(self, config, sequences, libraries):
+        h = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode())
+        for seq in sequences:
+            h.update(inspect.getsource(seq).encode())
+        for lib in libraries:
+            if not os.path.exists(lib): continue
+            with open(lib, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+        return h.hexdigest()[:16]
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def snapshot(self, p, node, columns):
+        # written to a temporary file, renamed by commit() once the event loop is over
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.module = snapshotSkim(self.tmpPath, columns)
+        p.branch(nodeToStart=node, nodeToEnd=node, modules=[self.module])
+        return p
+
+    def getObjects(self):
+        # results to run in the event loop, so that the skim is written even if nothing else is booked
+        return self.module.getObjects() if self.module is not None else []
+
+    def commit(self):
+        if os.path.exists(self.tmpPath):
+            os.replace(self.tmpPath, self.path)
@@ -0,0 +1,69 @@
+from module import *
+
+class snapshotSkim(module):
+
+    def __init__(self, outputFile, columns, treeName="Events"):
+        self.outputFile = outputFile
+        self.columns = columns
+        self.treeName = treeName
+        self.snapshot = None
+        pass
+
+    def run(self,d):
+        # lazy, so that it is written in the same event loop as the histograms
+        opts = ROOT.RDF.RSnapshotOptions()
+        opts.fLazy = True
+        opts.fCompressionAlgorithm = ROOT.RCompressionSetting.EAlgorithm.kLZ4
+        opts.fCompressionLevel = 4
+        # keep a reference: the snapshot is lost if the result goes out of scope
+        self.snapshot = d.Snapshot(self.treeName, self.outputFile, self.columns, opts)
+        self.d = d
+        return self.d
+
+    def getObjects(self):
+        # the lazy snapshot, to be passed to RunGraphs: it is not booked through the histogram lists
+        return [self.snapshot] if self.snapshot is not None else []
+
+    def getTH1(self):
+
+        return self.myTH1
+
+    def getTH2(self):
+
+        return self.myTH2
+
+    def getTH3(self):
+
+        return self.myTH3
+
+    def getTHN(self):
+
+        return self.myTHN
+
+    def getGroupTH1(self):
+
+        return self.myTH1Group
+
+    def getGroupTH2(self):
+
+        return self.myTH2Group
+
+    def getGroupTH3(self):
+
+        return self.myTH3Group
+
+    def getGroupTHN(self):
+
+        return self.myTHNGroup
+
+    def reset(self):
+
+        self.myTH1 = []
+        self.myTH2 = []
+        self.myTH3 = []
+        self.myTHN = []
+
+        self.myTH1Group = []
+        self.myTH2Group = []
+        self.myTH3Group = []
+        self.myTHNGroup = []
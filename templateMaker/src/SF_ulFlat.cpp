@@ -0,0 +1,139 @@
+#include "interface/SF_ulFlat.hpp"
+#include <algorithm>
+#include <cmath>
+#include <stdexcept>
+
+void SF_ulFlat::fill(table t, TFile *SF, const TString &name)
+{
+  TH2 *h = (TH2 *)SF->Get(name);
+  if (!h)
+    throw std::runtime_error(("SF_ulFlat: " + name + " not found in " + SF->GetName()).Data());
+
+  int nEta = h->GetNbinsX();
+  int nPt = h->GetNbinsY();
+  std::vector<double> etaEdges(nEta + 1);
+  std::vector<double> ptEdges(nPt + 1);
+  for (int i = 0; i <= nEta; i++)
+    etaEdges[i] = h->GetXaxis()->GetBinLowEdge(i + 1);
+  for (int j = 0; j <= nPt; j++)
+    ptEdges[j] = h->GetYaxis()->GetBinLowEdge(j + 1);
+
+  // tables with the same binning share the bin lookup
+  int axis = std::find(_binnings.begin(), _binnings.end(), std::make_pair(etaEdges, ptEdges)) - _binnings.begin();
+  if (axis == int(_binnings.size()))
+  {
+    _binnings.push_back(std::make_pair(etaEdges, ptEdges));
+    _etaAxes.push_back(binLookup(etaEdges));
+    _ptAxes.push_back(binLookup(ptEdges));
+  }
+  _axes[t] = axis;
+  _offsets[t] = _val.size();
+
+  // bin (ieta, ipt) of the table at _offsets[t] + ieta*nPt + ipt
+  for (int i = 1; i <= nEta; i++)
+  {
+    for (int j = 1; j <= nPt; j++)
+    {
+      _val.push_back(h->GetBinContent(i, j));
+      _err.push_back(h->GetBinError(i, j));
+    }
+  }
+}
+
+SF_ulFlat::binIndices SF_ulFlat::bins(float eta, float pt) const
+{
+  // same clamping to the first/last bin as getValFromTH2
+  std::array<int, nTables> axisBins;
+  for (unsigned int a = 0; a < _etaAxes.size(); a++)
+    axisBins[a] = _etaAxes[a].find(eta) * _ptAxes[a].nbins() + _ptAxes[a].find(pt);
+
+  binIndices idx;
+  for (int t = 0; t < nTables; t++)
+    idx[t] = _offsets[t] + axisBins[_axes[t]];
+  return idx;
+}
+
+RVec<float> SF_ulFlat::allSF(float pt, float eta, int charge, float iso) const
+{
+  // {SF, SFSystvar, SFStatvar[0..3]} as computed by SF_ul, from a single bin lookup
+  const binIndices idx = bins(eta, pt);
+  const int isolated = iso < 0.15;
+  const int trig = charge > 0 ? 0 : 1; // trigger_plus/trigger_minus
+  const int isoSel = 1 - isolated;     // iso/antiiso
+  auto val = [&](int t)
+  { return _val[idx[t]]; };
+  auto relErr2 = [&](int t)
+  {
+    float r = _err[idx[t]] / _val[idx[t]];
+    return r * r;
+  };
+
+  float nomSF = val(reco) * val(tracking) * val(idip) * val(trigger_plus + trig) * val(iso + isoSel);
+  float altSF = val(reco_alt) * val(tracking_alt) * val(idip_alt) * val(trigger_plus_alt + trig) * val(iso_alt + isoSel);
+
+  // everything but iso
+  float stat = std::sqrt(relErr2(reco) + relErr2(tracking) + relErr2(idip) + relErr2(trigger_plus + trig));
+
+  // iso, from the data and MC efficiencies: the anti-isolated region varies with the inefficiency
+  const float sign = isolated ? 1. : -1.;
+  float effData = isolated ? val(effisodata) : 1 - val(effisodata);
+  float effMC = isolated ? val(effisomc) : 1 - val(effisomc);
+  float rData = _err[idx[effisodata]] / effData;
+  float rMC = _err[idx[effisomc]] / effMC;
+  float statIso = sign * std::sqrt(rData * rData + rMC * rMC);
+
+  RVec<float> sf(6);
+  sf[0] = nomSF;
+  sf[1] = altSF / nomSF;
+  sf[2] = nomSF * (1 - stat);
+  sf[3] = nomSF * (1 + stat);
+  sf[4] = nomSF * (1 + statIso);
+  sf[5] = nomSF * (1 - statIso);
+  return sf;
+}
+
+float SF_ulFlat::SFZ(float pt1, float eta1, int charge1, float pt2, float eta2) const
+{
+  // all the SFs for the trigger matched muon, tracking and ID (and iso without trigger) for the other
+  const binIndices idx1 = bins(eta1, pt1);
+  const binIndices idx2 = bins(eta2, pt2);
+  const int trig = charge1 > 0 ? 0 : 1;
+
+  float sf = _val[idx1[tracking]] * _val[idx1[idip]] * _val[idx1[iso]] * _val[idx1[trigger_plus + trig]];
+  sf *= _val[idx2[tracking]] * _val[idx2[idip]] * _val[idx2[iso_notrig]];
+  return sf;
+}
+
+RNode SF_ulFlat::run(RNode d)
+{
+  if (_isZ)
+  {
+    auto defineSFZ = [this](float pt1, float eta1, int charge1, bool istrigMatched1, float pt2, float eta2, int charge2)
+    {
+      return SFZ(pt1, eta1, charge1, pt2, eta2);
+    };
+    auto d1 = d.Define("SF", defineSFZ, {"Mu1_pt", "Mu1_eta", "Mu1_charge", "Mu1_hasTriggerMatch", "Mu2_pt", "Mu2_eta", "Mu2_charge"})
+                  .Define("totalWeight", [](float lumi, float pu, float sf)
+                          { return lumi * pu * sf; },
+                          {"lumiweight", "puWeight", "SF"});
+    return d1;
+  }
+  else
+  {
+    auto defineAllSF = [this](float pt1, float eta1, float charge1, float iso1)
+    {
+      return allSF(pt1, eta1, charge1 > 0 ? 1 : -1, iso1);
+    };
+    auto d1 = d.Define("muSFvars", defineAllSF, {"Mu1_pt", "Mu1_eta", "Mu1_charge", "Mu1_relIso"})
+                  .Define("SF", [](const RVec<float> &sf)
+                          { return sf[0]; },
+                          {"muSFvars"})
+                  .Define("SFSystvar", [](const RVec<float> &sf)
+                          { return sf[1]; },
+                          {"muSFvars"})
+                  .Define("SFStatvar", [](const RVec<float> &sf)
+                          { return RVec<float>(sf.begin() + 2, sf.end()); },
+                          {"muSFvars"});
+    return d1;
+  }
+}
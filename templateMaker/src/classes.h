@@ -3,6 +3,7 @@
 #include "genDefinitions.hpp"
 #include "recoDefinitions.hpp"
 #include "getACValues.hpp"
+#include "getHelWeights.hpp"
 #include "getMassWeights.hpp"
 #include "getWeights.hpp"
 #include "recoWeightDefinitions.hpp"
@@ -10,6 +11,7 @@
 #include "lumiWeight.hpp"
 #include "getZmass.hpp"
 #include "SF_ul.hpp"
+#include "SF_ulFlat.hpp"
 #include "SFprod.hpp"
 #include "zSelection.hpp"
 #include "zVetoMuons.hpp"
@@ -17,4 +19,7 @@
 #include "genLeptonSelector.hpp"
 #include "CSvariableProducer.hpp"
 #include "genVProducer.hpp"
+#include "genBinIndexProducer.hpp"
+#include "outerProduct.hpp"
+#include "multiWeightHisto.hpp"
 #include "trigObjMatchProducer.hpp"
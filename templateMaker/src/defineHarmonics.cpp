@@ -1,5 +1,6 @@
 #include "interface/defineHarmonics.hpp"
 #include "interface/functions.hpp"
+#include "interface/outerProduct.hpp"
 
 RNode defineHarmonics::run(RNode d)
 {
@@ -35,8 +36,8 @@ RNode defineHarmonics::run(RNode d)
 
   auto d1 = d.Define("harmonicsVec", getHarmonicsVec, {"CStheta_preFSR", "CSphi_preFSR"})
                 // .Define("harmonicsVec_BWmassWeights", vecMultiplication, {"harmonicsVec", "BWmassWeights"})
-                .Define("harmonicsVec_LHEPdfWeight", vecMultiplication, {"harmonicsVec", "LHEPdfWeight"})
-                .Define("harmonicsVec_LHEScaleWeight", vecMultiplication, {"harmonicsVec", "LHEScaleWeight"})
+                .DefineSlot("harmonicsVec_LHEPdfWeight", outerProduct(d.GetNSlots(), 9 * 103), {"harmonicsVec", "LHEPdfWeight"})
+                .DefineSlot("harmonicsVec_LHEScaleWeight", outerProduct(d.GetNSlots(), 9 * 9), {"harmonicsVec", "LHEScaleWeight"})
                 .Define("DeltaPhi", deltaPhi, {"CSphi_preFSR","Vphi_preFSR"});
   return d1;
 }
\ No newline at end of file
@@ -1,5 +1,6 @@
 #ifndef FUNCTIONS_H
 #include "interface/functions.hpp"
+#include "interface/outerProduct.hpp"
 #include "TMath.h"
 
 float getFromIdx(ROOT::VecOps::RVec<float> vec, int index){
@@ -79,19 +80,16 @@ float deltaR2(float eta1, float phi1, float eta2, float phi2)
 
 float deltaPhi(float phi1, float phi2)
 {
+  // wrapped to [-pi, pi] by subtracting the nearest multiple of 2pi, no loops or branches
   float result = phi1 - phi2;
-  while (result > float(M_PI))
-    result -= float(2 * M_PI);
-  while (result <= -float(M_PI))
-    result += float(2 * M_PI);
-  return result;
+  return result - float(2 * M_PI) * std::nearbyint(result * float(0.5 / M_PI));
 }
 
 bool hasTriggerMatch(const float mueta, const float muphi, const RVec<float> &TrigObj_eta, const RVec<float> &TrigObj_phi) {
   bool muhasTrigm = false;
   for (unsigned int jtrig = 0; jtrig < TrigObj_eta.size(); ++jtrig)
   {
-    if (deltaR(mueta, muphi, TrigObj_eta[jtrig], TrigObj_phi[jtrig]) < 0.3)
+    if (deltaR2(mueta, muphi, TrigObj_eta[jtrig], TrigObj_phi[jtrig]) < 0.09f) //deltaR < 0.3
     {
       muhasTrigm = true;
       break;
@@ -127,13 +125,8 @@ float getValFromTH1(const TH1 &h, const float &x)
 
 ROOT::VecOps::RVec<float> vecMultiplication(const ROOT::VecOps::RVec<float> &v1, const ROOT::VecOps::RVec<float> &v2)
 {
-  ROOT::VecOps::RVec<float> products;
-
-  products.reserve(v1.size() * v2.size());
-  for (auto e1 : v1)
-    for (auto e2 : v2)
-      products.push_back(e1 * e2);
-
+  ROOT::VecOps::RVec<float> products(v1.size() * v2.size());
+  outerProductInto(v1.data(), v1.size(), v2.data(), v2.size(), products.data());
   return products;
 }
 
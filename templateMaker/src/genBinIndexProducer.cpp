@@ -0,0 +1,59 @@
+#include "interface/genBinIndexProducer.hpp"
+#include <algorithm>
+
+binLookup::binLookup(const std::vector<double> &edges)
+{
+  _edges = edges;
+  _lo = _edges.front();
+  double width = (_edges.back() - _edges.front()) / nbins();
+  _invWidth = 1. / width;
+
+  _uniform = true;
+  for (unsigned int i = 1; i < _edges.size(); i++)
+  {
+    if (std::abs(_edges[i] - _edges[i - 1] - width) > 1e-6 * width)
+    {
+      _uniform = false;
+      break;
+    }
+  }
+}
+
+int binLookup::find(float x) const
+{
+  // the upper edge belongs to the last bin (e.g. costheta == 1), not to the overflow
+  if (x == _edges.back())
+    return nbins() - 1;
+  if (_uniform)
+  {
+    // clamp before the conversion so that far out-of-range values stay well defined
+    double pos = (x - _lo) * _invWidth;
+    if (!(pos >= 0.))
+      return 0;
+    return std::min(nbins() - 1, int(std::min(pos, double(nbins()))));
+  }
+  int bin = std::upper_bound(_edges.begin(), _edges.end(), x) - _edges.begin() - 1;
+  return std::max(0, std::min(nbins() - 1, bin));
+}
+
+int binLookup::index(float x) const
+{
+  if (!(x >= _edges.front() && x < _edges.back()))
+    return -1;
+  return find(x);
+}
+
+RNode genBinIndexProducer::run(RNode d)
+{
+  // bin indices of the preFSR boson kinematics, shared by all the reweighting modules
+  auto d1 = d.Define("iy_preFSR", [this](float y)
+                     { return _yBins.find(y); },
+                     {"Vrap_preFSR_abs"})
+                .Define("iqt_preFSR", [this](float qt)
+                        { return _qtBins.find(qt); },
+                        {"Vpt_preFSR"})
+                .Define("icostheta", [this](float costheta)
+                        { return _cosThetaBins.find(costheta); },
+                        {"CStheta_preFSR"});
+  return d1;
+}
@@ -0,0 +1,122 @@
+#include "interface/getHelWeights.hpp"
+#include "interface/outerProduct.hpp"
+#include "TMath.h"
+
+getHelWeights::getHelWeights(const std::vector<double> &xsecs, const std::vector<double> &totxsecs, const std::vector<double> &yBins, const std::vector<double> &qtBins, std::string syst)
+{
+  _nqt = qtBins.size() - 1;
+  _syst = syst;
+
+  const unsigned int nbins = (yBins.size() - 1) * _nqt;
+  _nvar = totxsecs.size() / nbins;
+
+  // convert the unrolled cross sections to angular coefficients once, as done in
+  // https://arxiv.org/pdf/1609.02536.pdf, and rescale them to the harmonics normalisation
+  const double factors[_ncoeff][2] = {{20. / 3., 1. / 10}, {5., 0.}, {20., 0.}, {4., 0.}, {4., 0.}, {5., 0.}, {5., 0.}, {4., 0.}, {1., 0.}};
+  const double factors_hel[_ncoeff] = {2., 2. * TMath::Sqrt(2), 4., 4. * TMath::Sqrt(2), 2., 2., 2. * TMath::Sqrt(2), 4. * TMath::Sqrt(2), 1.};
+
+  _totxsecs = totxsecs;
+  _coeffs.resize(xsecs.size());
+  for (unsigned int ibin = 0; ibin < nbins; ibin++)
+  {
+    for (unsigned int i = 0; i < _ncoeff; i++)
+    {
+      for (unsigned int j = 0; j < _nvar; j++)
+      {
+        unsigned int idx = (ibin * _ncoeff + i) * _nvar + j;
+        _coeffs[idx] = (xsecs[idx] / _totxsecs[ibin * _nvar + j] + factors[i][1]) * factors[i][0] / factors_hel[i];
+      }
+    }
+  }
+}
+
+void getHelWeights::fill(unsigned int slot, int iy, int iqt, const RVec<float> &harms, const float *systWeights)
+{
+  const double fact = 3. / (16. * TMath::Pi());
+
+  const unsigned int ibin = iy * _nqt + iqt;
+  const double *coeffs = &_coeffs[ibin * _ncoeff * _nvar];
+  const double *totMap = &_totxsecs[ibin * _nvar];
+
+  double *norm = _norm[slot].data();
+  float *weights = _weights[slot].data();
+  _offset[slot] = ibin * _ncoeff * _nvar;
+
+  // norm = 3/16pi * totxsec * (PUL + sum_i A_i P_i), for each variation
+  for (unsigned int j = 0; j < _nvar; j++)
+    norm[j] = harms[_ncoeff - 1];
+  for (unsigned int i = 0; i < _ncoeff - 1; i++)
+    for (unsigned int j = 0; j < _nvar; j++)
+      norm[j] += coeffs[i * _nvar + j] * harms[i];
+  for (unsigned int j = 0; j < _nvar; j++)
+    norm[j] *= fact * totMap[j] * (systWeights ? systWeights[j] : 1.);
+
+  for (unsigned int i = 0; i < _ncoeff; i++)
+  {
+    for (unsigned int j = 0; j < _nvar; j++)
+    {
+      double coeff = i != _ncoeff - 1 ? coeffs[i * _nvar + j] : 1.;
+      double harm = harms[i] * (systWeights ? systWeights[j] : 1.);
+      weights[i * _nvar + j] = norm[j] != 0. ? fact * totMap[j] * coeff * harm / norm[j] : 0.;
+    }
+  }
+}
+
+RNode getHelWeights::run(RNode d)
+{
+  const unsigned int nslots = d.GetNSlots();
+  if (_norm.size() < nslots)
+  {
+    _norm.resize(nslots, std::vector<double>(_nvar));
+    _weights.resize(nslots, std::vector<float>(_ncoeff * _nvar));
+    _offset.resize(nslots, 0);
+  }
+
+  // the columns below are non-owning views of the per-slot buffers and of the
+  // coefficient table, filled once per event by the helWeights column
+  const std::string suffix = _syst.empty() ? "" : "_" + _syst;
+
+  auto getHelWeightsNom = [this](unsigned int slot, int iy, int iqt, const RVec<float> &harms)
+  {
+    fill(slot, iy, iqt, harms, nullptr);
+    return RVec<float>(_weights[slot].data(), _weights[slot].size());
+  };
+
+  auto getHelWeightsSyst = [this](unsigned int slot, int iy, int iqt, const RVec<float> &harms, const RVec<float> &systWeights)
+  {
+    fill(slot, iy, iqt, harms, systWeights.data());
+    return RVec<float>(_weights[slot].data(), _weights[slot].size());
+  };
+
+  auto getAngCoeffVec = [this](unsigned int slot, const RVec<float> &)
+  {
+    return RVec<double>(&_coeffs[_offset[slot]], _ncoeff * _nvar);
+  };
+
+  if (_syst.empty())
+  {
+    auto getNorm = [this](unsigned int slot, const RVec<float> &)
+    {
+      return float(_norm[slot][0]);
+    };
+
+    auto d1 = d.DefineSlot("helWeights", getHelWeightsNom, {"iy_preFSR", "iqt_preFSR", "harmonicsVec"})
+                  .DefineSlot("AngCoeffVec", getAngCoeffVec, {"helWeights"})
+                  .DefineSlot("norm", getNorm, {"helWeights"})
+                  // sized on the first event of each slot from the lengths of helWeights and of the variations
+                  .DefineSlot("SFStatvar_helweights", outerProduct(nslots), {"helWeights", "SFStatvar"})
+                  .DefineSlot("muprefireWeightVars_helweights", outerProduct(nslots), {"helWeights", "muprefireWeightVars"});
+    return d1;
+  }
+
+  auto getNorm = [this](unsigned int slot, const RVec<float> &)
+  {
+    return RVec<double>(_norm[slot].data(), _nvar);
+  };
+
+  auto d1 = d.DefineSlot("helWeights" + suffix, getHelWeightsSyst, {"iy_preFSR", "iqt_preFSR", "harmonicsVec", _syst})
+                .DefineSlot("AngCoeffVec" + suffix, getAngCoeffVec, {"helWeights" + suffix})
+                .DefineSlot("norm" + suffix, getNorm, {"helWeights" + suffix})
+                .Define("nhelWeights" + suffix, "helWeights" + suffix + ".size()");
+  return d1;
+}
@@ -1,5 +1,6 @@
 #include "interface/getMassWeights.hpp"
 #include "interface/functions.hpp"
+#include "interface/outerProduct.hpp"
 
 RNode getMassWeights::run(RNode d)
 {
@@ -26,6 +27,6 @@ RNode getMassWeights::run(RNode d)
     return v;
   };
 
-  auto d1 = d.Define("BWmassWeights", getBWVec, {"Vmass_preFSR"}).Define("helBWweights", vecMultiplication, {"helWeights", "BWmassWeights"});
+  auto d1 = d.Define("BWmassWeights", getBWVec, {"Vmass_preFSR"}).DefineSlot("helBWweights", outerProduct(d.GetNSlots(), 9 * 2), {"helWeights", "BWmassWeights"});
   return d1;
 }
\ No newline at end of file
@@ -0,0 +1,150 @@
+#include "interface/multiWeightHisto.hpp"
+#include <algorithm>
+
+namespace
+{
+  // memory for the buffers of all the slots together, above which they only hold part of the bins
+  const double maxSlotBufferBytes = 4e9;
+  // the partial buffers are added to the result under one lock per group of bins
+  const unsigned int nLocks = 256;
+}
+
+multiWeightBuffers::multiWeightBuffers(unsigned int nbins, unsigned int nweights, unsigned int nslots, bool sumw2)
+{
+  _nbins = nbins;
+  _nweights = nweights;
+  _sumw2 = sumw2;
+  _result = std::make_shared<factorisedHisto>();
+  _result->sumw.assign(std::size_t(_nbins) * _nweights, 0.);
+  if (_sumw2)
+    _result->sumw2.assign(std::size_t(_nbins) * _nweights, 0.);
+
+  const double rowBytes = double(_nweights) * sizeof(double) * (_sumw2 ? 2 : 1);
+  const double maxRows = std::max(1., maxSlotBufferBytes / (rowBytes * std::max(1u, nslots)));
+  _partial = maxRows < _nbins;
+  _nrows = _partial ? (unsigned int)maxRows : _nbins;
+  // only allocated for the slots that actually process entries
+  _slots.resize(nslots);
+  _locks.reset(new std::mutex[nLocks]);
+}
+
+void multiWeightBuffers::init(unsigned int slot)
+{
+  slotBuffer &buffer = _slots[slot];
+  if (!buffer.sumw.empty())
+    return;
+  buffer.sumw.assign(std::size_t(_nrows) * _nweights, 0.);
+  if (_sumw2)
+    buffer.sumw2.assign(std::size_t(_nrows) * _nweights, 0.);
+  if (_partial)
+  {
+    buffer.rows.reserve(_nrows);
+    buffer.bins.reserve(_nrows);
+  }
+}
+
+std::size_t multiWeightBuffers::offset(unsigned int slot, int bin)
+{
+  // start of the row of bin in the buffer of slot, taking a new row if needed
+  if (!_partial)
+    return std::size_t(bin) * _nweights;
+  slotBuffer &buffer = _slots[slot];
+  auto it = buffer.rows.find(bin);
+  if (it != buffer.rows.end())
+    return std::size_t(it->second) * _nweights;
+  if (buffer.bins.size() == _nrows)
+    flush(slot);
+  const unsigned int row = buffer.bins.size();
+  buffer.rows.emplace(bin, row);
+  buffer.bins.push_back(bin);
+  const std::size_t start = std::size_t(row) * _nweights;
+  std::fill_n(buffer.sumw.begin() + start, _nweights, 0.);
+  if (_sumw2)
+    std::fill_n(buffer.sumw2.begin() + start, _nweights, 0.);
+  return start;
+}
+
+void multiWeightBuffers::flush(unsigned int slot)
+{
+  // add the rows of slot to the result and release them
+  slotBuffer &buffer = _slots[slot];
+  const unsigned int nrows = _partial ? buffer.bins.size() : _nrows;
+  for (unsigned int row = 0; row < nrows; row++)
+  {
+    const std::size_t bin = _partial ? buffer.bins[row] : row;
+    const double *sumw = &buffer.sumw[std::size_t(row) * _nweights];
+    const double *sumw2 = _sumw2 ? &buffer.sumw2[std::size_t(row) * _nweights] : nullptr;
+    std::lock_guard<std::mutex> lock(_locks[bin % nLocks]);
+    double *resw = &_result->sumw[bin * _nweights];
+    for (unsigned int k = 0; k < _nweights; k++)
+      resw[k] += sumw[k];
+    if (_sumw2)
+    {
+      double *resw2 = &_result->sumw2[bin * _nweights];
+      for (unsigned int k = 0; k < _nweights; k++)
+        resw2[k] += sumw2[k];
+    }
+  }
+  buffer.rows.clear();
+  buffer.bins.clear();
+}
+
+void multiWeightBuffers::finalize()
+{
+  for (unsigned int slot = 0; slot < _slots.size(); slot++)
+  {
+    if (_slots[slot].sumw.empty())
+      continue;
+    flush(slot);
+    _slots[slot] = slotBuffer();
+  }
+}
+
+void multiWeightBuffers::fill(unsigned int slot, int bin, double weight, const RVec<float> &w)
+{
+  const unsigned int n = std::min<unsigned int>(_nweights, w.size());
+  const std::size_t start = offset(slot, bin);
+
+  double *sumw = &_slots[slot].sumw[start];
+  for (unsigned int k = 0; k < n; k++)
+    sumw[k] += weight * w[k];
+  if (_sumw2)
+  {
+    double *sumw2 = &_slots[slot].sumw2[start];
+    for (unsigned int k = 0; k < n; k++)
+      sumw2[k] += (weight * w[k]) * (weight * w[k]);
+  }
+}
+
+void multiWeightBuffers::fill(unsigned int slot, int bin, double weight, const RVec<float> &v1, const RVec<float> &v2)
+{
+  // _nweights = n1*n2 with n2 the stride of the inner (systematic) index
+  const unsigned int n2 = v2.size();
+  const unsigned int n1 = std::min<unsigned int>(v1.size(), n2 ? _nweights / n2 : 0);
+  const std::size_t start = offset(slot, bin);
+
+  for (unsigned int i = 0; i < n1; i++)
+  {
+    const double w1 = weight * v1[i];
+    double *sumw = &_slots[slot].sumw[start + i * n2];
+    for (unsigned int j = 0; j < n2; j++)
+      sumw[j] += w1 * v2[j];
+    if (_sumw2)
+    {
+      double *sumw2 = &_slots[slot].sumw2[start + i * n2];
+      for (unsigned int j = 0; j < n2; j++)
+        sumw2[j] += (w1 * v2[j]) * (w1 * v2[j]);
+    }
+  }
+}
+
+RNode defineBinIndex::run(RNode d)
+{
+  return defineN<10>(d);
+}
+
+RNode multiWeightHisto::run(RNode d)
+{
+  _result = bookN<8>(d);
+  return d;
+}
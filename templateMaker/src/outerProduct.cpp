@@ -0,0 +1,19 @@
+#include "interface/outerProduct.hpp"
+
+RVec<float> outerProduct::operator()(unsigned int slot, const RVec<float> &v1, const RVec<float> &v2)
+{
+  std::vector<float> &buffer = _buffers[slot];
+  const unsigned int size = v1.size() * v2.size();
+  // only grows if the vector sizes change between events
+  if (buffer.size() < size)
+    buffer.resize(size);
+
+  outerProductInto(v1.data(), v1.size(), v2.data(), v2.size(), buffer.data());
+  return RVec<float>(buffer.data(), size);
+}
+
+RNode defineOuterProduct::run(RNode d)
+{
+  auto d1 = d.DefineSlot(_name, outerProduct(d.GetNSlots(), _size), {_v1, _v2});
+  return d1;
+}
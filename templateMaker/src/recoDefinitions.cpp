@@ -17,7 +17,7 @@ RNode recoDefinitions::run(RNode d)
                     .Define("Mu1_pt", "Muon_pt[goodMuons][0]")
                     .Define("Mu1_sip3d", "Muon_sip3d[goodMuons][0]")
                     .Define("Mu1_dxy", "Muon_dxy[goodMuons][0]")
-                    .Define("Mu1_hasTriggerMatch", hasTriggerMatch, {"Mu1_eta", "Mu1_phi", "goodTrigObjs_eta", "goodTrigObjs_phi"});
+                    .Define("Mu1_hasTriggerMatch", "Muon_hasTriggerMatch[goodMuons][0]");
 
     return d1;
 }
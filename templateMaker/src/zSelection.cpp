@@ -12,18 +12,6 @@ RNode zSelection::run(RNode d) {
     return (mu1P + mu2P);
   };
 
-  auto hasTriggerMatch = [](const float mueta, const float muphi, const RVec<float> &TrigObj_eta, const RVec<float> &TrigObj_phi) {
-   bool muhasTrigm = false;
-   for (unsigned int jtrig = 0; jtrig < TrigObj_eta.size(); ++jtrig) {
-     if (deltaR(mueta, muphi, TrigObj_eta[jtrig], TrigObj_phi[jtrig]) < 0.3) {
-       muhasTrigm = true;
-       break;
-     }//if
-   }
-   
-   return muhasTrigm;
-  };
-
   //.Define("Mu2_hasTriggerMatch", "Muon_hasTriggerMatch[prefIdx[1]]")
 
   auto d1 = d.Define("Mu1_eta", "Muon_eta[goodMuons && Muon_charge>0][0]")
@@ -31,7 +19,7 @@ RNode zSelection::run(RNode d) {
     .Define("Mu1_charge", "Muon_charge[goodMuons && Muon_charge>0][0]")
     .Define("Mu1_relIso", "Muon_pfRelIso04_all[goodMuons && Muon_charge>0][0]")
     .Define("Mu1_pt", "Muon_pt[goodMuons && Muon_charge>0][0]")
-    .Define("Mu1_hasTriggerMatch", hasTriggerMatch, {"Mu1_eta", "Mu1_phi", "goodTrigObjs_eta", "goodTrigObjs_phi"})
+    .Define("Mu1_hasTriggerMatch", "Muon_hasTriggerMatch[goodMuons && Muon_charge>0][0]")
     .Define("Mu2_eta", "Muon_eta[goodMuons && Muon_charge<0][0]")
     .Define("Mu2_phi", "Muon_phi[goodMuons && Muon_charge<0][0]")
     .Define("Mu2_charge", "Muon_charge[goodMuons && Muon_charge<0][0]")
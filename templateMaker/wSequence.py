@@ -15,12 +15,24 @@ from externals import fileSFul, fileSFPogTrk, weightFoldersrc
 
 sys.path.append('{}/templateMaker/python'.format(FWKBASE))
 from getReweightModules import *
+from multiWeightHistograms import multiWeightHistogram
 ROOT.gSystem.Load('{}/templateMaker/bin/libAnalysisOnData.so'.format(FWKBASE))
 ROOT.gROOT.ProcessLine("gErrorIgnoreLevel = 2001;")
 
 
+# columns of the 'defs' node kept in the skims, see skimCache
+skimColumns = "^(Mu1_.*|MT.*|lumiweight|puWeight.*|muprefireWeight.*|SF.*|(V|Mu).*_preFSR.*|CS(theta|phi)_preFSR|LHEPdfWeight|LHEScaleWeight|MEParamWeight)$"
+
 #Build the template building sequenc
-def wSelectionSequence(p, systType, nodetoStart, era):
+def wSelectionSequence(p, systType, nodetoStart, era, flatSF=False):
+    wSelection(p, systType, nodetoStart, era, flatSF)
+    wDefinitions(p, systType)
+    return wHistograms(p, systType)
+
+#event selection up to the 'defs' node, this is what goes in the skims
+#flatSF: SFs from the flattened lookup table (SF_ulFlat) instead of SF_ul, same columns
+def wSelection(p, systType, nodetoStart, era, flatSF=False):
+    SFmodule = ROOT.SF_ulFlat if flatSF else ROOT.SF_ul
     p.EventFilter(nodeToStart=nodetoStart, nodeToEnd='defs', evfilter="1.", filtername="{:20s}".format("true"))
     p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="(HLT_IsoMu24 ||  HLT_IsoTkMu24)", filtername="{:20s}".format("Pass HLT"))
     
@@ -36,11 +48,10 @@ def wSelectionSequence(p, systType, nodetoStart, era):
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Mu1_hasTriggerMatch", filtername="{:20s}".format("mu1 trig matched"))
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Flag_globalSuperTightHalo2016Filter && Flag_EcalDeadCellTriggerPrimitiveFilter && Flag_goodVertices && Flag_HBHENoiseIsoFilter && Flag_HBHENoiseFilter && Flag_BadPFMuonFilter", filtername="{:20s}".format("eventFilters"))
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(vetoElectrons) == 0;", filtername="{:20s}".format("vetoelectrons"))
-        p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso"], types = ['float']*5,node='defs',histoname=ROOT.string('data_obs'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-        
+
     elif systType < 2: #this is MC with no PDF variations
         #falling back to old lumi weight computation
-        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.recoDefinitions(True, False), ROOT.mtDefinitions(True,ptprefix="MET_T1comp_pt", phiprefix="MET_T1comp_phi"), ROOT.SF_ul(fileSFul,isZ=False,era=era)])
+        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.recoDefinitions(True, False), ROOT.mtDefinitions(True,ptprefix="MET_T1comp_pt", phiprefix="MET_T1comp_phi"), SFmodule(fileSFul,isZ=False,era=era)])
         
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(vetoMuons)==1", filtername="{:20s}".format("vetomuon"))
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(goodMuons)==1", filtername="{:20s}".format("onemuon"))
@@ -51,20 +62,8 @@ def wSelectionSequence(p, systType, nodetoStart, era):
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Flag_globalSuperTightHalo2016Filter && Flag_EcalDeadCellTriggerPrimitiveFilter && Flag_goodVertices && Flag_HBHENoiseIsoFilter && Flag_HBHENoiseFilter && Flag_BadPFMuonFilter", filtername="{:20s}".format("eventFilters"))
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(vetoElectrons) == 0;", filtername="{:20s}".format("vetoelectrons"))
 
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight","SFSystvar"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_SFSystvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight"], types = ['float']*8,node='defs',histoname=ROOT.string('ewk_SFStatvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], sample=("SFStatvar",4))
-        # #prefire variations
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso","lumiweight","puWeight","SF"], types = ['float']*8,node='defs',histoname=ROOT.string('ewk_prefireVar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], sample=("muprefireWeightVars",2))
-        # #jec variations
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_jesTotalUp","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_jesTotalUp'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_jesTotalDown","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_jesTotalDown'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_unclustEnUp","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_unclustEnUp'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_unclustEnDown","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_unclustEnDown'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
-
     else:
-        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.defineHarmonics(),ROOT.recoDefinitions(True, False), ROOT.mtDefinitions(True,ptprefix="MET_T1comp_pt", phiprefix="MET_T1comp_phi"), ROOT.SF_ul(fileSFul,isZ=False,era=era)])
+        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.recoDefinitions(True, False), ROOT.mtDefinitions(True,ptprefix="MET_T1comp_pt", phiprefix="MET_T1comp_phi"), SFmodule(fileSFul,isZ=False,era=era)])
         
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(vetoMuons)==1", filtername="{:20s}".format("vetomuon"))
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(goodMuons)==1", filtername="{:20s}".format("onemuon"))
@@ -75,8 +74,32 @@ def wSelectionSequence(p, systType, nodetoStart, era):
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Flag_globalSuperTightHalo2016Filter && Flag_EcalDeadCellTriggerPrimitiveFilter && Flag_goodVertices && Flag_HBHENoiseIsoFilter && Flag_HBHENoiseFilter && Flag_BadPFMuonFilter", filtername="{:20s}".format("eventFilters"))
         p.EventFilter(nodeToStart='defs', nodeToEnd='defs', evfilter="Sum(vetoElectrons) == 0;", filtername="{:20s}".format("vetoelectrons"))
 
-        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins])
+    return p
 
+#gen-level definitions, cheap enough to be recomputed on top of a skim
+def wDefinitions(p, systType):
+    if systType == 2:
+        p.branch(nodeToStart = 'defs', nodeToEnd = 'defs', modules = [ROOT.defineHarmonics(),ROOT.genBinIndexProducer(yBins, qtBins, cosThetaBins)])
+    return p
+
+def wHistograms(p, systType):
+    if systType == 0: #this is data
+        p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso"], types = ['float']*5,node='defs',histoname=ROOT.string('data_obs'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+    elif systType < 2: #this is MC with no PDF variations
+        pass
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight","SFSystvar"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_SFSystvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight"], types = ['float']*8,node='defs',histoname=ROOT.string('ewk_SFStatvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], sample=("SFStatvar",4))
+        # #prefire variations
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso","lumiweight","puWeight","SF"], types = ['float']*8,node='defs',histoname=ROOT.string('ewk_prefireVar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], sample=("muprefireWeightVars",2))
+        # #jec variations
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_jesTotalUp","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_jesTotalUp'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_jesTotalDown","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_jesTotalDown'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_unclustEnUp","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_unclustEnUp'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_unclustEnDown","Mu1_relIso","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_unclustEnDown'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
+    else:
+        pass
+        # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins])
         # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight","SFSystvar"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_SFSystvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], variations = [])
         # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight"], types = ['float']*8,node='defs',histoname=ROOT.string('ewk_SFStatvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], sample=("SFStatvar",4))
         # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*9,node='defs',histoname=ROOT.string('ewk_LHEPdfWeight'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins], sample=("LHEPdfWeight",103))
@@ -91,6 +114,7 @@ def wSelectionSequence(p, systType, nodetoStart, era):
 
     return p
 
+
 def wSelectionHelWeightsSequence(p, nodetoStart,era):
     # here get angular coefficients
     p.branch(nodeToStart=nodetoStart, nodeToEnd='defs', modules=[ROOT.defineHarmonics()])
@@ -102,10 +126,10 @@ def wSelectionHelWeightsSequence(p, nodetoStart,era):
     # p.Histogram(columns = ["Vrap_preFSR_abs","Vpt_preFSR","lumiweight","yqtweight","coeffsweight"], types = ['float']*5,node='defs',histoname=ROOT.string("totxsecs"),bins=[yBins,qtBins])
     
     # pdf variations
-    p.Histogram(columns = ["Vrap_preFSR_abs","Vpt_preFSR","lumiweight"], types = ['float']*3,node='defs',histoname=ROOT.string("xsecs_LHEPdfWeight"),bins=[yBins,qtBins], sample=('harmonicsVec_LHEPdfWeight',9*103))
+    multiWeightHistogram(p, node='defs', histoname="xsecs_LHEPdfWeight", bins=[yBins,qtBins], columns=["Vrap_preFSR_abs","Vpt_preFSR","lumiweight"], weights=[('harmonicsVec',9),('LHEPdfWeight',103)])
     p.Histogram(columns = ["Vrap_preFSR_abs","Vpt_preFSR","lumiweight"], types = ['float']*3,node='defs',histoname=ROOT.string("totxsecs_LHEPdfWeight"),bins=[yBins,qtBins], sample=("LHEPdfWeight",103))
     # scale variations
-    p.Histogram(columns = ["Vrap_preFSR_abs","Vpt_preFSR","lumiweight"], types = ['float']*3,node='defs',histoname=ROOT.string("xsecs_LHEScaleWeight"),bins=[yBins,qtBins], sample=('harmonicsVec_LHEScaleWeight',9*9))
+    multiWeightHistogram(p, node='defs', histoname="xsecs_LHEScaleWeight", bins=[yBins,qtBins], columns=["Vrap_preFSR_abs","Vpt_preFSR","lumiweight"], weights=[('harmonicsVec',9),('LHEScaleWeight',9)])
     p.Histogram(columns = ["Vrap_preFSR_abs","Vpt_preFSR","lumiweight"], types = ['float']*3,node='defs',histoname=ROOT.string("totxsecs_LHEScaleWeight"),bins=[yBins,qtBins], sample=("LHEScaleWeight",9))
     return p
 
@@ -125,7 +149,7 @@ def wSelectionDifferentialSequence(p,era,sample):
         charge=1
         genCoeff='{}/genInput_v7_syst_Wplus.root'.format(weightFoldersrc)
         helWeightFile='{}/outputW_sroychow_{}/{}JetsToMuNu_helweights.hdf5'.format(weightFoldersrc, era, chargeStr)
-        mods=[getHelWeightsWplus(era=era, helwtFile=helWeightFile, syst=""), \
+        mods=[getHelWeights(helwtFile=helWeightFile), \
               reweightcoeffsWplus(era=era,helWtsrcdir=weightFoldersrc, geninputF=genCoeff), \
               reweightyqtWplus(era=era, inFilehelwt=helWeightFile, genInfoFile=genInfo), \
               getMassWeightsWplus(era=era)]
@@ -134,7 +158,7 @@ def wSelectionDifferentialSequence(p,era,sample):
         charge=-1
         genCoeff='{}/genInput_v7_syst_Wminus.root'.format(weightFoldersrc)
         helWeightFile='{}/outputW_sroychow_{}/{}JetsToMuNu_helweights.hdf5'.format(weightFoldersrc, era, chargeStr)
-        mods=[getHelWeightsWminus(era=era, helwtFile=helWeightFile, syst=""), \
+        mods=[getHelWeights(helwtFile=helWeightFile), \
               reweightyqtWminus(era=era, inFilehelwt=helWeightFile, genInfoFile=genInfo),
               reweightcoeffsWminus(era=era,helWtsrcdir=weightFoldersrc, geninputF=genCoeff),
               getMassWeightsWminus(era=era)]
@@ -142,7 +166,7 @@ def wSelectionDifferentialSequence(p,era,sample):
     p.branch(nodeToStart='defs', nodeToEnd='templates', modules=mods)
     p.EventFilter(nodeToStart='templates', nodeToEnd='nominal', evfilter="Vrap_preFSR_abs<2.4 && Vpt_preFSR<60.", filtername="{:20s}".format("signal templ"))
     # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*11,node='nominal',histoname=ROOT.string('signalTemplates'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], sample=("helWeights",9))
-    p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*11,node='nominal',histoname=ROOT.string('signalTemplates_mass_10'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], sample=("helmassweights",9*2))
+    multiWeightHistogram(p, node='nominal', histoname='signalTemplates_mass_10', bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], weights=[("helWeights",9),("massWeights",2)])
     # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SFSystvar"], types = ['float']*11,node='nominal',histoname=ROOT.string('signalTemplates_SFSystvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], sample=("helWeights",9))
     # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight"], types = ['float']*10,node='nominal',histoname=ROOT.string('signalTemplates_SFStatvar'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], sample=("SFStatvar_helweights",9*4))
     # #prefire variations
@@ -175,22 +199,16 @@ def wSelectionDifferentialSequence(p,era,sample):
     # p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT_unclustEnDown","Mu1_relIso","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*10,node='lowacc',histoname=ROOT.string('lowacc_unclustEnDown'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,qtBins_syst])
 
     # pdf-scale uncertainties for full templates
-    if 'WPlus' in sample:
-        helWeightFile='{}/powheg_acc_{}/{}JetsToMuNu_helweights.hdf5'.format(weightFoldersrc, era, chargeStr)
-        mods=[getHelWeightsWplus(era=era, helwtFile=helWeightFile, syst="LHEPdfWeight")]
-    else:
-        helWeightFile='{}/powheg_acc_{}/{}JetsToMuNu_helweights.hdf5'.format(weightFoldersrc, era, chargeStr)
-        mods=[getHelWeightsWminus(era=era, helwtFile=helWeightFile, syst="LHEPdfWeight")]
-    #p.branch(nodeToStart='defs', nodeToEnd='LHEPdfWeight', modules=mods)
-    #p.EventFilter(nodeToStart='LHEPdfWeight', nodeToEnd='LHEPdfWeight', evfilter="Vrap_preFSR_abs<2.4 && Vpt_preFSR<60.", filtername="{:20s}".format("signal templ"))
-    #p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*11,node='LHEPdfWeight',histoname=ROOT.string('signalTemplates_LHEPdfWeight'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], sample=("helWeights_LHEPdfWeight",9*103))
-
-    if 'WPlus' in sample:
-        helWeightFile='{}/powheg_acc_{}/{}JetsToMuNu_helweights.hdf5'.format(helWeightsrc, era, chargeStr)
-        mods=[getHelWeightsWplus(era=era, helwtFile=helWeightFile, syst="LHEScaleWeight")]
-    else:
-        helWeightFile='{}/powheg_acc_{}/{}JetsToMuNu_helweights.hdf5'.format(helWeightsrc, era, chargeStr)
-        mods=[getHelWeightsWminus(era=era, helwtFile=helWeightFile, syst="LHEScaleWeight")]
+    helWeightFile='{}/powheg_acc_{}/{}JetsToMuNu_helweights.hdf5'.format(weightFoldersrc, era, chargeStr)
+    mods=[getHelWeights(helwtFile=helWeightFile, syst="LHEPdfWeight")]
+    p.branch(nodeToStart='defs', nodeToEnd='LHEPdfWeight', modules=mods)
+    p.EventFilter(nodeToStart='LHEPdfWeight', nodeToEnd='LHEPdfWeight', evfilter="Vrap_preFSR_abs<2.4 && Vpt_preFSR<60.", filtername="{:20s}".format("signal templ"))
+    # 9*103 weights per bin of the 7D templates: filled by multiWeightHisto, whose per-slot
+    # buffers only hold part of the bins at a time at this size, without the sum of squares
+    multiWeightHistogram(p, node='LHEPdfWeight', histoname='signalTemplates_LHEPdfWeight', bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], weights=[("helWeights_LHEPdfWeight",9*103)], sumw2=False)
+
+    helWeightFile='{}/powheg_acc_{}/{}JetsToMuNu_helweights.hdf5'.format(helWeightsrc, era, chargeStr)
+    mods=[getHelWeights(helwtFile=helWeightFile, syst="LHEScaleWeight")]
     
     #p.branch(nodeToStart='defs', nodeToEnd='LHEScaleWeight', modules=mods)
     #p.Histogram(columns = ["Mu1_eta","Mu1_pt","Mu1_charge","MT","Mu1_relIso", "Vrap_preFSR_abs","Vpt_preFSR","lumiweight","puWeight","muprefireWeight","SF"], types = ['float']*11,node='LHEScaleWeight',histoname=ROOT.string('signalTemplates_LHEScaleWeight'),bins = [etaBins,ptBins,chargeBins,mTBins,isoBins,yBins,qtBins], sample=("helWeights_LHEScaleWeight",9*9))